@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
 # sign_manifest.py -- calcula/valida HMAC-SHA512 para manifest.json
-import json, hmac, hashlib, sys, os
+# Modo batch: sign_manifest.py batch sign|verify [rutas|globs|-] [--workers N] [--processes]
+#   - procesa muchos manifests en paralelo, escritura atómica, salida JSON lines con tiempos
+#   - sign no reescribe el archivo si el HMAC del payload no cambió
+#   - sign/verify de un solo manifest no cargan el pool (concurrent.futures solo en batch)
+import json, hmac, hashlib, sys, os, time
 from pathlib import Path
 
 MANIFEST = Path('manifest.json')
 ROT_KEY = os.environ.get('ROT_KEY') or "CAMBIAR_POR_KEY_SEGURA"  # usar Vault/EKV en prod
 
+def payload_hmac(m):
+    b = json.dumps({k: v for k, v in m.items() if k != 'hmac'}, sort_keys=True).encode('utf-8')
+    return hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
+
+def atomic_write(path: Path, text: str):
+    tmp = path.with_name(".%s.%d.tmp" % (path.name, os.getpid()))
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
 def sign(manifest_path=MANIFEST):
     m = json.loads(manifest_path.read_text(encoding='utf-8'))
-    if 'hmac' in m: m.pop('hmac')
-    b = json.dumps(m, sort_keys=True).encode('utf-8')
-    h = hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
+    h = payload_hmac(m)
     m['hmac'] = h
-    manifest_path.write_text(json.dumps(m, indent=2), encoding='utf-8')
+    atomic_write(manifest_path, json.dumps(m, indent=2))
     print("Manifest firmado:", h)
 
 def verify(manifest_path=MANIFEST):
@@ -21,18 +32,101 @@ def verify(manifest_path=MANIFEST):
     if not h:
         print("No hmac")
         return False
-    m.pop('hmac')
-    b = json.dumps(m, sort_keys=True).encode('utf-8')
-    calc = hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
-    ok = calc == h
+    ok = hmac.compare_digest(payload_hmac(m), h)
     print("Verificación:", ok)
     return ok
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: sign_manifest.py sign|verify")
-        sys.exit(2)
-    if sys.argv[1] == 'sign':
+# ---------- batch ----------
+def sign_one(path):
+    t0 = time.perf_counter()
+    res = {"path": str(path), "op": "sign"}
+    try:
+        p = Path(path)
+        m = json.loads(p.read_text(encoding='utf-8'))
+        h = payload_hmac(m)
+        res["skipped"] = m.get('hmac') == h  # payload sin cambios: no reescribir
+        if not res["skipped"]:
+            m['hmac'] = h
+            atomic_write(p, json.dumps(m, indent=2))
+        res.update(ok=True, hmac=h)
+    except Exception as e:
+        res.update(ok=False, error=str(e))
+    res["ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    return res
+
+def verify_one(path):
+    t0 = time.perf_counter()
+    res = {"path": str(path), "op": "verify"}
+    try:
+        p = Path(path)
+        with open(p, "rb") as f:
+            magic = f.read(4)
+        if magic == b"RMB1":
+            import manifest_bin
+            res["ok"] = manifest_bin.BinManifest(p).verify(ROT_KEY)
+        else:
+            m = json.loads(p.read_text(encoding='utf-8'))
+            h = m.get('hmac')
+            res["ok"] = bool(h) and hmac.compare_digest(payload_hmac(m), h)
+            if not h:
+                res["error"] = "no hmac"
+    except Exception as e:
+        res.update(ok=False, error=str(e))
+    res["ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    return res
+
+def expand_paths(args):
+    # rutas, globs (** recursivo) o "-" para leer rutas de stdin
+    import glob
+    seen = set()
+    for a in args:
+        if a == "-":
+            items = (l.strip() for l in sys.stdin)
+        elif glob.has_magic(a):
+            items = sorted(glob.glob(a, recursive=True))
+        else:
+            items = [a]
+        for p in items:
+            if p and p not in seen:
+                seen.add(p)
+                yield p
+
+def batch(op, args, workers=None, processes=False):
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+    fn = sign_one if op == "sign" else verify_one
+    paths = list(expand_paths(args or [str(MANIFEST)]))
+    pool_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    t0 = time.perf_counter()
+    failed = 0
+    with pool_cls(max_workers=workers or min(32, (os.cpu_count() or 1) * 2)) as ex:
+        for fut in as_completed([ex.submit(fn, p) for p in paths]):
+            r = fut.result()
+            failed += not r["ok"]
+            sys.stdout.write(json.dumps(r) + "\n")
+            sys.stdout.flush()
+    print(json.dumps({"op": op, "total": len(paths), "failed": failed,
+                      "ms": round((time.perf_counter() - t0) * 1000, 3)}), file=sys.stderr)
+    return failed == 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 1:
+        print("Uso: sign_manifest.py sign|verify | batch sign|verify [rutas|globs|-] [--workers N] [--processes]")
+        return 2
+    if argv[0] == 'batch':
+        import argparse
+        ap = argparse.ArgumentParser(prog="sign_manifest.py batch")
+        ap.add_argument("op", choices=["sign", "verify"])
+        ap.add_argument("paths", nargs="*")
+        ap.add_argument("--workers", type=int)
+        ap.add_argument("--processes", action="store_true")
+        a = ap.parse_args(argv[1:])
+        return 0 if batch(a.op, a.paths, a.workers, a.processes) else 1
+    if argv[0] == 'sign':
         sign()
     else:
         verify()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
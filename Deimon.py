@@ -6,15 +6,22 @@ Daemon de monitorización y respuesta segura (Vanguardia Titán).
 - Monitorea endpoints (sentinel, ia, posts, governance).
 - Si detecta anomalías: crea snapshot forense, firma, notifica y (opcional) invoca
   acciones de contención que requieren aprobación humana.
+- Poll condicional: If-None-Match con el ETag anterior (304 -> nada que parsear) y, en las
+  colecciones (posts, sentinel), parámetro since con el cursor X-Cursor de la respuesta anterior.
+  Cada endpoint mantiene una vista local fusionada por id; los chequeos de anomalías solo miran
+  los registros nuevos o cambiados. Un cuerpo idéntico al anterior tampoco se parsea.
+  Para pruebas y medidas: fake_watched_api.py y bench_monitor.py.
+- Notificaciones por notifier.py: hilo emisor, un solo envío por incidente, dedup por fingerprint
+  de las alertas (notify_cooldown), límite por webhook (notify_rate) y spool de reintentos en disco.
 Requisitos:
   pip install requests python-dateutil
   gpg (opcional) para firmar snapshots
 """
 from __future__ import annotations
-import requests, os, time, json, hashlib, tarfile, subprocess
+import os, time, json, hashlib
 from datetime import datetime, timezone
-from dateutil import parser as dateparser
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+import metrics
 
 # ---------- CONFIG ----------
 CONFIG = {
@@ -28,13 +35,24 @@ CONFIG = {
         "governance": "/api/governance/status",
     },
     "notify_webhook": None,  # ejemplo: "https://hooks.slack.com/services/XXX/YYY/ZZZ"
+    "notify_spool": "./notify_spool",  # envíos pendientes/reintentos (sobreviven a un reinicio)
+    "notify_cooldown": 600,  # segundos sin repetir un incidente con las mismas alertas
+    "notify_rate": 6,        # envíos por minuto al webhook
     "gpg_sign_key": None,    # ejemplo: "admin@example.com" (opcional)
     "revocation_hook": None, # script/webhook para revocar claves/sesiones (debe requerir auth)
     "max_post_rate": 20,     # umbral simple: posts por 20s para alerta
+    "conditional_fetch": True,  # ETag/If-None-Match y cursor since en las colecciones
+    "collections": {         # endpoints con lista de registros: items (None = la respuesta es la lista), id, parámetro del cursor
+        "posts": {"items": None, "key": "id", "cursor": "since"},
+        "sentinel": {"items": "resultado", "key": "id", "cursor": "since"},
+    },
 }
 # ---------- /CONFIG ----------
 
-os.makedirs(CONFIG["forensics_dir"], exist_ok=True)
+_session = None
+_views: Dict[str, Dict[str, Any]] = {}     # endpoint -> etag, digest, cursor, data, records
+_recent_posts: Dict[Any, datetime] = {}    # id -> fecha de los posts nuevos dentro de la ventana de tasa
+_notifier = None
 
 def now_ts():
     return datetime.now(timezone.utc).isoformat()
@@ -48,13 +66,21 @@ def sha256_of_file(path):
             h.update(chunk)
     return h.hexdigest()
 
-def notify(message: str, payload: Dict[str, Any]|None=None):
+def notifier():
+    global _notifier
+    if _notifier is None:
+        import notifier as _n
+        _notifier = _n.Notifier([CONFIG["notify_webhook"]], CONFIG["notify_spool"], CONFIG["notify_cooldown"],
+                                CONFIG["notify_rate"]).start()
+    return _notifier
+
+def notify(message: str, payload: Dict[str, Any]|None=None, incident=None):
+    """Nunca bloquea: con incident el mensaje se suma al envío del incidente; si no, se encola solo."""
     print(f"[NOTIFY] {message}")
-    if CONFIG["notify_webhook"]:
-        try:
-            requests.post(CONFIG["notify_webhook"], json={"text": message, "meta": payload or {}})
-        except Exception as e:
-            print("Notify failed:", e)
+    if incident is not None:
+        incident.add(message, payload)
+    elif CONFIG["notify_webhook"]:
+        notifier().notify(message, payload)
 
 def save_forensic_snapshot(name_prefix: str, data_map: Dict[str, Any]):
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
@@ -75,6 +101,7 @@ def save_forensic_snapshot(name_prefix: str, data_map: Dict[str, Any]):
         json.dump(meta, f, indent=2)
     # Tar and sha256
     tar_path = os.path.join(CONFIG["forensics_dir"], base + ".tar.gz")
+    import tarfile  # solo al generar un snapshot forense
     with tarfile.open(tar_path, "w:gz") as tar:
         tar.add(folder, arcname=os.path.basename(folder))
     sha = sha256_of_file(tar_path)
@@ -83,6 +110,7 @@ def save_forensic_snapshot(name_prefix: str, data_map: Dict[str, Any]):
     # Optional GPG sign
     if CONFIG["gpg_sign_key"]:
         try:
+            import subprocess
             subprocess.run(["gpg", "--batch", "--yes", "-u", CONFIG["gpg_sign_key"],
                             "--output", tar_path + ".sig", "--detach-sign", tar_path],
                            check=True)
@@ -91,6 +119,7 @@ def save_forensic_snapshot(name_prefix: str, data_map: Dict[str, Any]):
     return {"folder": folder, "tar": tar_path, "sha256": sha}
 
 def call_endpoint(path: str, method="GET", token=None):
+    import requests  # requests/dateutil se cargan al primer uso, no al importar
     url = CONFIG["base_url"].rstrip("/") + path
     headers = {}
     if token: headers["Authorization"] = "Bearer " + token
@@ -105,77 +134,179 @@ def call_endpoint(path: str, method="GET", token=None):
         print(f"Endpoint call failed {path}: {e}")
         return {"ok": False, "error": str(e)}
 
-def basic_anomaly_checks(snapshot: Dict[str, Any]) -> Dict[str,Any]:
-    alerts = []
+def session():
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()  # keep-alive entre polls
+    return _session
+
+def record_key(rec, key: str):
+    if isinstance(rec, dict) and rec.get(key) is not None:
+        return rec[key]
+    return hashlib.blake2b(json.dumps(rec, sort_keys=True, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+def fetch_endpoint(name: str, path: str, token=None) -> Tuple[Any, List[Any]]:
+    """(vista local del endpoint, registros nuevos o cambiados desde el poll anterior).
+    En endpoints que no son colecciones, "nuevos" es [respuesta] si cambió y [] si no."""
+    view = _views.setdefault(name, {"etag": None, "digest": None, "cursor": None, "data": None, "records": None})
+    coll = CONFIG["collections"].get(name)
+    url = CONFIG["base_url"].rstrip("/") + path
+    headers, params = {}, {}
+    if token: headers["Authorization"] = "Bearer " + token
+    if CONFIG["conditional_fetch"] and view["data"] is not None:
+        if view["etag"]:
+            headers["If-None-Match"] = view["etag"]
+        if coll and view["cursor"] is not None:
+            params[coll["cursor"]] = view["cursor"]
+    try:
+        r = session().get(url, headers=headers, params=params, timeout=10)
+        if r.status_code == 304:
+            metrics.counter("monitor_not_modified_total", "Respuestas 304 del poll").inc(endpoint=name)
+            return view["data"], []
+        r.raise_for_status()
+        body = r.content
+    except Exception as e:
+        print(f"Endpoint call failed {path}: {e}")
+        return {"ok": False, "error": str(e)}, []
+    metrics.add_bytes("fetch", len(body))
+    digest = hashlib.blake2b(body, digest_size=16).digest()
+    etag = r.headers.get("ETag")
+    if digest == view["digest"] and view["data"] is not None:
+        view["etag"] = etag
+        return view["data"], []  # mismo cuerpo (servidor sin ETag): no se parsea
+    # etag, digest y cursor solo se guardan tras parsear y fusionar: con un cuerpo roto el poll
+    # siguiente no manda If-None-Match/?since= de una respuesta que nunca se aplicó
+    try:
+        data = json.loads(body)
+        items = data if coll and coll["items"] is None else \
+            (data.get(coll["items"]) if coll and isinstance(data, dict) else None)
+        if isinstance(items, list):
+            # con X-Cursor la respuesta a ?since= es un delta y se fusiona; sin él es la colección entera
+            cursor = r.headers.get("X-Cursor") if CONFIG["conditional_fetch"] else None
+            old = view["records"] or {}
+            records = dict(old) if cursor is not None and params and view["records"] is not None else {}
+            new = []
+            for rec in items:
+                k = record_key(rec, coll["key"])
+                if old.get(k) != rec:
+                    new.append(rec)
+                records[k] = rec
+            merged = list(records.values())
+            merged = merged if coll["items"] is None else dict(data, **{coll["items"]: merged})
+    except Exception as e:
+        print(f"Endpoint response invalid {path}: {e}")
+        return {"ok": False, "error": str(e)}, []
+    view["etag"], view["digest"] = etag, digest
+    if not isinstance(items, list):
+        changed = data != view["data"]
+        view["data"], view["records"], view["cursor"] = data, None, None
+        return data, [data] if changed else []
+    view["data"], view["records"], view["cursor"] = merged, records, cursor
+    return merged, new
+
+def basic_anomaly_checks(snapshot: Dict[str, Any], new: Dict[str, List[Any]] | None = None) -> Dict[str,Any]:
+    """new (de fetch_endpoint) limita los chequeos a lo nuevo; sin new se revisa el snapshot entero.
+    keys: una clave estructurada por alerta (qué registro o qué chequeo, sin conteos) para el dedup."""
+    alerts, keys = [], []
     # sentinel: check integrity flags
     sent = snapshot.get("sentinel")
     if sent and "resultado" in sent:
-        for rec in sent["resultado"]:
+        for rec in (new["sentinel"] if new is not None else sent["resultado"]):
             if not rec.get("integridad_valida", True):
                 alerts.append(f"Integridad rota: {rec.get('id')} {rec.get('nombre')}")
+                rid = rec.get("id") if rec.get("id") is not None else rec.get("nombre")
+                keys.append("integrity:%s" % (rid if rid is not None else json.dumps(rec, sort_keys=True, default=str)))
     # posts: sudden surge
     posts = snapshot.get("posts")
     if posts is not None:
         # count posts in last poll window
+        from dateutil import parser as dateparser
         now = datetime.utcnow()
-        recent = 0
-        for p in posts:
+        window = CONFIG["poll_interval"]*3
+        if new is None:
+            _recent_posts.clear()
+        # solo se parsea la fecha de los posts nuevos; los anteriores ya están en _recent_posts
+        for p in (new["posts"] if new is not None else posts):
             try:
                 t = dateparser.parse(p.get("fecha"))
-                delta = (now - t).total_seconds()
-                if delta <= CONFIG["poll_interval"]*3:
-                    recent += 1
+                if (now - t).total_seconds() <= window:
+                    _recent_posts[record_key(p, "id")] = t
             except Exception:
                 pass
+        for k, t in list(_recent_posts.items()):
+            if (now - t).total_seconds() > window:
+                del _recent_posts[k]
+        recent = len(_recent_posts)
         if recent >= CONFIG["max_post_rate"]:
             alerts.append(f"Alerta alta tasa de posts: {recent} posts recientes")
+            keys.append("post_rate")
     # governance: suspicious (no votes allowed? depends)
     gov = snapshot.get("governance")
-    if gov and (gov.get("favor",0) + gov.get("contra",0)) > 1000:
+    if gov and (new is None or new.get("governance")) and (gov.get("favor",0) + gov.get("contra",0)) > 1000:
         alerts.append("Conteo de votos inusualmente alto")
-    return {"alerts": alerts}
+        keys.append("votes")
+    return {"alerts": alerts, "keys": keys}
 
-def request_containment_approval(forensic):
+def request_containment_approval(forensic, incident=None):
     # Crea una solicitud y notifica al equipo; retorno booleano: approved?
     msg = f"Solicitud de contención generada. Snapshot: {forensic['tar']}, sha256: {forensic['sha256']}. Aprobación requerida."
-    notify(msg, {"forensic": forensic})
+    notify(msg, {"forensic": forensic}, incident)
     # Aquí: implementación real debería crear ticket y esperar multi-approvals.
     # En este daemon devolvemos False (no ejecutar acciones destructivas automáticamente).
     return False
 
-def take_safe_actions(snapshot):
+def take_safe_actions(snapshot, incident=None):
     # Ejemplo: llamar a revocation hook (no destructivo) si configurado
     if CONFIG["revocation_hook"]:
         try:
+            import requests
             requests.post(CONFIG["revocation_hook"], json={"reason":"anomaly_detected", "timestamp": now_ts() }, timeout=8)
-            notify("Invocado revocation_hook para rotación de sesiones")
+            notify("Invocado revocation_hook para rotación de sesiones", incident=incident)
         except Exception as e:
             print("Revocation hook failed:", e)
 
+def poll_once():
+    snapshot, new = {}, {}
+    with metrics.timer("fetch"):
+        for k, path in CONFIG["watch_endpoints"].items():
+            snapshot[k], new[k] = fetch_endpoint(k, path)
+    # Analysis
+    with metrics.timer("analyze"):
+        result = basic_anomaly_checks(snapshot, new)
+    if result["alerts"]:
+        metrics.counter("monitor_alerts_total", "Alertas detectadas").inc(len(result["alerts"]))
+        print("[ALERTS]", result["alerts"])
+        forensic = save_forensic_snapshot("incident", snapshot)
+        # un solo envío con todos los mensajes del incidente; si las mismas alertas (por clave: el
+        # mismo registro, no solo el mismo texto) ya se notificaron dentro de notify_cooldown, no se
+        # envía (se cuenta como repetición)
+        import notifier as _n
+        incident = notifier().incident(_n.fingerprint(result["keys"]), "; ".join(result["alerts"])) \
+            if CONFIG["notify_webhook"] else None
+        notify("Alerta detectada: " + "; ".join(result["alerts"]), {"forensic": forensic}, incident)
+        # safe actions (rotate sessions via hook)
+        take_safe_actions(snapshot, incident)
+        # request human approval for strong actions
+        approved = request_containment_approval(forensic, incident)
+        if approved:
+            # If approved by humans elsewhere, implement destructive actions here (NOT automatic)
+            notify("Aprobación recibida: ejecutar acciones de contención avanzadas", incident=incident)
+        else:
+            notify("No hay aprobación: manteniendo acciones seguras y preservando evidencia", incident=incident)
+        if incident is not None:
+            incident.close()
+    else:
+        print(".", end="", flush=True)
+
 def monitor_loop():
+    os.makedirs(CONFIG["forensics_dir"], exist_ok=True)
+    metrics.init("monitor")
     print("Monitor daemon started. Polling:", CONFIG["poll_interval"], "s")
     while True:
         try:
-            snapshot = {}
-            for k, path in CONFIG["watch_endpoints"].items():
-                snapshot[k] = call_endpoint(path)
-            # Analysis
-            result = basic_anomaly_checks(snapshot)
-            if result["alerts"]:
-                print("[ALERTS]", result["alerts"])
-                forensic = save_forensic_snapshot("incident", snapshot)
-                notified = notify("Alerta detectada: " + "; ".join(result["alerts"]), {"forensic": forensic})
-                # safe actions (rotate sessions via hook)
-                take_safe_actions(snapshot)
-                # request human approval for strong actions
-                approved = request_containment_approval(forensic)
-                if approved:
-                    # If approved by humans elsewhere, implement destructive actions here (NOT automatic)
-                    notify("Aprobación recibida: ejecutar acciones de contención avanzadas")
-                else:
-                    notify("No hay aprobación: manteniendo acciones seguras y preservando evidencia")
-            else:
-                print(".", end="", flush=True)
+            with metrics.cycle("monitor_poll"):
+                poll_once()
         except Exception as e:
             print("Monitor error:", e)
         time.sleep(CONFIG["poll_interval"])
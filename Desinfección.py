@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 # scanner_orchestrator.py - análisis básico: ClamAV + YARA + VirusTotal (opcional)
+# Los reportes (todos, limpios o no) van a QUARANTINE_DIR/scan_reports.db por lotes (scan_reports.py);
+# consultas: scan_reports.py --db QUARANTINE_DIR/scan_reports.db query --hash H | --verdict flagged | --since T
 import os, hashlib, shutil, subprocess, json
 from datetime import datetime
+import scan_reports
 
 WATCH_DIR = "/ruta/a/entradas"
 QUARANTINE_DIR = "/ruta/a/quarantine"
@@ -34,7 +37,7 @@ def virustotal_lookup(path):
         return r.json()
     return None
 
-def process_file(path):
+def process_file(path, reports=None):
     print(f"[{datetime.now().isoformat()}] Procesando {path}")
     h = sha256(path)
     findings = {}
@@ -49,14 +52,19 @@ def process_file(path):
         dest = os.path.join(QUARANTINE_DIR, basename + "." + h[:8])
         shutil.move(path, dest)
         findings['quarantined_to'] = dest
-    # guardar evidencia
-    with open(os.path.join(QUARANTINE_DIR, f"report_{h[:8]}.json"), "w") as f:
-        json.dump(findings, f, indent=2, default=str)
+    # guardar evidencia (reports: scan_reports.ReportWriter; sin él, un JSON por archivo como antes)
+    if reports is not None:
+        reports.add(findings, path=os.path.abspath(path))
+    else:
+        with open(os.path.join(QUARANTINE_DIR, f"report_{h}.json"), "w") as f:
+            json.dump(findings, f, indent=2, default=str)
     return findings
 
 if __name__ == "__main__":
     os.makedirs(QUARANTINE_DIR, exist_ok=True)
-    for fname in os.listdir(WATCH_DIR):
-        full = os.path.join(WATCH_DIR, fname)
-        if os.path.isfile(full):
-            print(process_file(full))
+    store = scan_reports.ScanStore(os.path.join(QUARANTINE_DIR, "scan_reports.db"))
+    with scan_reports.ReportWriter(store) as reports:
+        for fname in os.listdir(WATCH_DIR):
+            full = os.path.join(WATCH_DIR, fname)
+            if os.path.isfile(full):
+                print(process_file(full, reports))
@@ -1,46 +1,135 @@
 #!/usr/bin/env python3
 # loader_server.py
-from flask import Flask, send_file, abort
-import os, json, hmac, hashlib
+# unrotate.py se importa una vez y corre en proceso; solo se re-ejecuta cuando cambia el manifest
+# con asset-map.json (asset_build.py) resuelve nombres lógicos y sirve la variante .br/.gz que acepte el cliente
+from flask import Flask, send_file, abort, jsonify, request
+import os, json, hmac, hashlib, threading
 from pathlib import Path
-import tempfile
-import shutil
-import subprocess
+import merkle_manifest, metrics, asset_build, generations
 
 BASE = Path(__file__).parent.resolve()
 ROTATED = BASE / "rotated"
 MANIFEST = ROTATED / "manifest.json"
+MERKLE = ROTATED / "manifest.merkle.json"
 ROT_KEY = os.environ.get("ROT_KEY")
 UNROT_DIR = BASE / "unrot_temp"
+OUT = BASE / "unrotated_out"
 
 app = Flask(__name__)
+_merkle_cache = {"mtime": None, "mm": None, "levels": {}, "root": None}  # levels: caché de prove() del mm cargado
+_unrot_cache = {"stamp": None, "hmac": None, "result": None}
+_unrot_lock = threading.Lock()
+
+def load_merkle():
+    # cachea el manifest Merkle mientras no cambie en disco
+    if not MERKLE.exists():
+        return None
+    mtime = MERKLE.stat().st_mtime_ns
+    if _merkle_cache["mtime"] != mtime:
+        # root: generación del manifest leído; sus entradas se resuelven en ella
+        root = generations.manifest_root(MERKLE)
+        _merkle_cache["levels"] = {}
+        _merkle_cache["mm"] = merkle_manifest.load(root / MERKLE.name if root else MERKLE)
+        _merkle_cache["root"] = root
+        _merkle_cache["mtime"] = mtime
+    return _merkle_cache["mm"]
+
+def verify_entry(fname):
+    # prueba de inclusión O(log n) + sha512 del archivo rotado servido
+    mm = load_merkle()
+    if mm is None:
+        return None
+    try:
+        proof = merkle_manifest.prove(mm, fname, _merkle_cache["levels"])
+    except KeyError:
+        return False
+    if not merkle_manifest.verify_proof(proof, ROT_KEY):
+        return False
+    rotated = generations.entry_path(BASE, proof["info"]["rotated"], _merkle_cache["root"])
+    h = hashlib.sha512()
+    with rotated.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest() == proof["info"]["sha512"]
 
 def verify_manifest_and_unrotate():
     if not MANIFEST.exists():
         return False, "no manifest"
-    m = json.loads(MANIFEST.read_text())
-    h = m.pop("hmac", None)
-    b = json.dumps(m, sort_keys=True).encode('utf-8')
-    calc = hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
-    m["hmac"] = h
-    if calc != h:
-        return False, "invalid hmac"
-    # si ok, llamar unrotate.py para recrear OUT en memoria / tmp
-    # para simplicidad: ejecutar unrotate.py que llena unrot_temp/
-    subprocess.run(["/usr/bin/env","python3", str(BASE/"unrotate.py")], check=False)
-    return True, "unrotated"
+    st = MANIFEST.stat()
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _unrot_lock:
+        # mismo manifest en disco que el request anterior: ni json.loads, ni HMAC, ni unrotate
+        if _unrot_cache["stamp"] == stamp:
+            return _unrot_cache["result"]
+        m = json.loads(MANIFEST.read_text())
+        h = m.pop("hmac", None)
+        b = json.dumps(m, sort_keys=True).encode('utf-8')
+        calc = hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
+        m["hmac"] = h
+        if calc != h:
+            result = (False, "invalid hmac")
+        elif _unrot_cache["hmac"] == h:
+            result = (True, "unrotated")  # manifest reescrito sin cambios (mismo HMAC)
+        else:
+            # si ok, recrear OUT con unrotate.py en proceso (antes: un python3 nuevo por request)
+            import unrotate
+            try:
+                unrotate.unrotate(verbose=False)
+                _unrot_cache["hmac"] = h
+            except (OSError, ValueError) as e:
+                print("unrotate failed:", e)
+                return True, "unrotated"  # sin cachear: el siguiente request reintenta
+            result = (True, "unrotated")
+        _unrot_cache["stamp"], _unrot_cache["result"] = stamp, result
+        return result
 
 @app.route("/file/<path:fname>")
 def get_file(fname):
-    ok, msg = verify_manifest_and_unrotate()
-    if not ok:
-        abort(503, f"Manifest error: {msg}")
-    outf = BASE / "unrotated_out" / fname
-    if not outf.exists():
+    with metrics.timer("serve"):
+        with metrics.timer("unrotate"):
+            ok, msg = verify_manifest_and_unrotate()
+        if not ok:
+            abort(503, f"Manifest error: {msg}")
+        served, encoding, info = asset_build.resolve(OUT, fname, request.headers.get("Accept-Encoding", ""))
+        outf = OUT / served
+        if not outf.exists():
+            abort(404)
+        with metrics.timer("verify_entry"):
+            verified = verify_entry(served)
+        if verified is False:
+            abort(503, "Entry failed merkle verification")
+        metrics.add_files("serve")
+        metrics.add_bytes("serve", outf.stat().st_size)
+        if info is None:
+            return send_file(str(outf))
+        resp = send_file(str(outf), mimetype=info["type"], etag=False)
+        resp.headers["ETag"] = '"%s%s"' % (info["sha256"][:32], "-" + encoding if encoding else "")
+        resp.headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        # con fingerprint en el nombre el contenido no cambia nunca; el nombre lógico se revalida
+        if info["immutable"] and fname == info["file"]:
+            resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+@app.route("/metrics")
+def get_metrics():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+@app.route("/proof/<path:fname>")
+def get_proof(fname):
+    mm = load_merkle()
+    if mm is None:
+        abort(404, "no merkle manifest")
+    try:
+        return jsonify(merkle_manifest.prove(mm, fname, _merkle_cache["levels"]))
+    except KeyError:
         abort(404)
-    return send_file(str(outf))
 
 if __name__ == "__main__":
     if not ROT_KEY:
         raise SystemExit("Define ROT_KEY")
+    metrics.init("loader")
     app.run(host="0.0.0.0", port=8080)
@@ -4,7 +4,9 @@ from fido2.server import Fido2Server
 from fido2 import cbor
 from fido2.webauthn import PublicKeyCredentialRpEntity, PublicKeyCredentialUserEntity
 from fido2.ctap2 import AttestationObject
+from fido2.cose import CoseKey
 import os, base64
+from credential_store import SQLiteCredentialStore
 
 app = Flask(__name__)
 app.secret_key = os.urandom(32)
@@ -12,8 +14,8 @@ app.secret_key = os.urandom(32)
 RP = PublicKeyCredentialRpEntity(name="TigoStart", id="example.com")
 server = Fido2Server(RP)
 
-# in-memory storage for demo (use DB in prod)
-USERS = {}  # username -> {id, name, displayName, credentials: [{cred}]}
+# usuarios, credenciales y estado de las ceremonias en SQLite (WEBAUTHN_DB); la sesión solo guarda ids
+store = SQLiteCredentialStore()
 
 def b64(u): return base64.b64encode(u).decode('utf-8')
 def ub64(s): return base64.b64decode(s)
@@ -21,14 +23,10 @@ def ub64(s): return base64.b64decode(s)
 @app.route('/register/options', methods=['POST'])
 def register_options():
     username = request.json.get('username')
-    user = USERS.get(username)
-    if not user:
-        user_id = os.urandom(16)
-        USERS[username] = {"id": user_id, "name": username, "displayName": username, "credentials": []}
-        user = USERS[username]
+    user = store.get_user(username) or store.create_user(username)
     user_entity = PublicKeyCredentialUserEntity(id=user['id'], name=user['name'], display_name=user['displayName'])
     registration_data, state = server.register_begin(user_entity, user['credentials'])
-    session['state'] = state
+    session['state_id'] = store.put_state({"username": username, "state": state})
     # convert buffers to base64 for JSON transport
     reg = registration_data
     reg['publicKey']['challenge'] = b64(reg['publicKey']['challenge'])
@@ -39,29 +37,29 @@ def register_options():
 def register_complete():
     username = request.json['username']
     cred = request.json['credential']
-    state = session.get('state')
+    saved = store.pop_state(session.pop('state_id', None))
+    if not saved or saved["username"] != username:
+        return jsonify({"error":"registration state expired"}), 400
+    state = saved["state"]
     # reconstruct objects
     clientDataJSON = base64.b64decode(cred['response']['clientDataJSON'])
     attObj = base64.b64decode(cred['response']['attestationObject'])
     auth_data = server.register_complete(state, clientDataJSON, attObj)
     # store credential public key and id
-    USERS[username]['credentials'].append({
-        'cred_id': cred['rawId'],
-        'public_key': auth_data.credential_public_key
-    })
+    store.add_credential(username, cred['rawId'], cbor.encode(auth_data.credential_public_key))
     return jsonify({"status":"ok"})
 
 @app.route('/login/options', methods=['POST'])
 def login_options():
     username = request.json.get('username')
-    user = USERS.get(username)
+    user = store.get_user(username)
     if not user:
         return jsonify({"error":"user not found"}), 404
     allow = []
     for c in user['credentials']:
         allow.append({"type":"public-key","id": c['cred_id']})
     auth_data, state = server.authenticate_begin(allow)
-    session['auth_state'] = state
+    session['auth_state_id'] = store.put_state({"username": username, "state": state})
     # encode arrays to base64
     auth_data['publicKey']['challenge'] = b64(auth_data['publicKey']['challenge'])
     if 'allowCredentials' in auth_data['publicKey']:
@@ -73,19 +71,20 @@ def login_options():
 def login_complete():
     username = request.json['username']
     cred = request.json['credential']
-    state = session.get('auth_state')
+    saved = store.pop_state(session.pop('auth_state_id', None))
+    if not saved or saved["username"] != username:
+        return jsonify({"error":"authentication state expired"}), 400
+    state = saved["state"]
     clientDataJSON = base64.b64decode(cred['response']['clientDataJSON'])
     authnr_data = base64.b64decode(cred['response']['authenticatorData'])
     signature = base64.b64decode(cred['response']['signature'])
-    # verify — lookup credential public key from USERS
-    user = USERS.get(username)
-    # find credential by id
+    # verify — lookup directo por credential id (índice), ligado al usuario
     # (rawId is base64 of bytes)
-    for c in user['credentials']:
-        if c['cred_id'] == cred['rawId']:
-            stored_cred = c
-            break
-    server.authenticate_complete(state, stored_cred['public_key'], cred['rawId'], clientDataJSON, authnr_data, signature)
+    stored_cred = store.get_credential(cred['rawId'], username)
+    if not stored_cred:
+        return jsonify({"error":"unknown credential"}), 401
+    public_key = CoseKey.parse(cbor.decode(stored_cred['public_key']))
+    server.authenticate_complete(state, public_key, cred['rawId'], clientDataJSON, authnr_data, signature)
     return jsonify({"status":"ok","message":"autenticado"})
 
 if __name__=='__main__':
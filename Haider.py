@@ -1,17 +1,119 @@
 #!/usr/bin/env python3
 # Simple webhook receiver for ClouDNS webhooks & GitHub pushes
+# Los trabajos van a una cola acotada (job_queue.py): los handlers responden al instante con el job id
+# La rotación corre un solo ciclo (rotate_service.run_once) en proceso o en un worker caliente
 from flask import Flask, request, jsonify
-import os, subprocess, threading
+import os, sys, json, threading, importlib.util
+from job_queue import JobQueue, JobTimeout, QueueFull, run_command
 
 app = Flask(__name__)
 
 # ruta hacia scripts locales
 ROTATE_SCRIPT = "/opt/star-tigo-defensa/rotate/rotate_service.py"
 REPAIR_SCRIPT = "/opt/star-tigo-defensa/repair/monitor_and_repair.py"
-SYNC_SCRIPT = "/opt/star-tigo-defensa/sync/sync_repos.sh"
+SYNC_SCRIPT = "/opt/star-tigo-defensa/sync/repo_sync.py"
 
-def async_run(cmd):
-    threading.Thread(target=subprocess.run, args=(cmd,), kwargs={"shell":True}).start()
+HOOK_WORKERS = int(os.environ.get("HOOK_WORKERS", 2))
+HOOK_MAX_PENDING = int(os.environ.get("HOOK_MAX_PENDING", 50))
+HOOK_JOB_TIMEOUT = int(os.environ.get("HOOK_JOB_TIMEOUT", 900))  # segundos
+ROTATE_RUNNER = os.environ.get("ROTATE_RUNNER", "worker")  # worker / inprocess / subprocess
+
+jobs = JobQueue(workers=HOOK_WORKERS, max_pending=HOOK_MAX_PENDING, default_timeout=HOOK_JOB_TIMEOUT).start()
+
+def enqueue(key, cmd):
+    # un trabajo pendiente por clave: los disparos repetidos se pliegan en él
+    job = jobs.submit(key, lambda job: run_command(cmd, timeout=job.timeout), meta={"cmd": cmd})
+    return job.id
+
+# ---------- sync ----------
+def sync_job(job):
+    repos = job.meta["repos"]
+    cmd = ["python3", SYNC_SCRIPT] + [a for r in (repos or []) for a in ("--only", r)]
+    return run_command(cmd, timeout=job.timeout)
+
+def _merge_repos(job, meta):
+    # None = todos los repos; si no, la unión de los pedidos mientras estaba pendiente
+    if job.meta["repos"] is None or meta["repos"] is None:
+        job.meta["repos"] = None
+    elif meta["repos"][0] not in job.meta["repos"]:
+        job.meta["repos"].append(meta["repos"][0])
+
+def enqueue_sync(repo=None):
+    # una sola clave "sync": dos syncs nunca tocan los mismos checkouts a la vez
+    return jobs.submit("sync", sync_job, meta={"repos": [repo] if repo else None}, merge=_merge_repos).id
+
+# ---------- rotación de un ciclo ----------
+_rotator = None
+_rotate_lock = threading.Lock()   # serializa disparos solapados dentro de este proceso
+_pool = None
+_inprocess = None                 # thread de la rotación en proceso (ROTATE_RUNNER=inprocess)
+
+def load_rotator(script=None):
+    # importa rotate_service una sola vez (el import ya no se paga por webhook)
+    global _rotator
+    if _rotator is None:
+        script = script or ROTATE_SCRIPT
+        sys.path.insert(0, os.path.dirname(script))
+        spec = importlib.util.spec_from_file_location("rotate_service", script)
+        mod = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(mod)
+        except SystemExit as e:  # versiones antiguas de rotate_service salían al importar sin ROT_KEY
+            raise RuntimeError("rotate_service import failed: %s" % e)
+        _rotator = mod
+    return _rotator
+
+def _rotate_in_worker(script):
+    return load_rotator(script).run_once()
+
+def _warm_pool():
+    global _pool
+    if _pool is None:
+        import multiprocessing  # solo con ROTATE_RUNNER=worker
+        # spawn: el worker no hereda los threads de Flask; importa rotate_service al arrancar
+        _pool = multiprocessing.get_context("spawn").Pool(1, initializer=load_rotator, initargs=(ROTATE_SCRIPT,))
+    return _pool
+
+def _rotate_inprocess(timeout):
+    # un thread no se puede matar: al expirar el job termina en timeout y la rotación sigue en segundo
+    # plano; hasta que acabe no se lanza otra (nunca dos run_once a la vez)
+    global _inprocess
+    if _inprocess is not None and _inprocess.is_alive():
+        raise JobTimeout("previous in-process rotation still running")
+    box = {}
+    def run():
+        try:
+            box["result"] = load_rotator().run_once()
+        except BaseException as e:  # SystemExit incluido: no debe tumbar el worker de la cola
+            box["error"] = e if isinstance(e, Exception) else RuntimeError("rotation exited: %r" % e)
+    _inprocess = threading.Thread(target=run, name="rotate-inprocess", daemon=True)
+    _inprocess.start()
+    _inprocess.join(timeout)
+    if _inprocess.is_alive():
+        raise JobTimeout("rotation timeout after %ss" % timeout)
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
+
+def rotate_job(job):
+    global _pool
+    with _rotate_lock:
+        if ROTATE_RUNNER == "inprocess":
+            return _rotate_inprocess(job.timeout)
+        if ROTATE_RUNNER == "subprocess":
+            out = run_command(["python3", ROTATE_SCRIPT, "--once"], timeout=job.timeout)["output"]
+            return json.loads(out.strip().splitlines()[-1])
+        import multiprocessing
+        try:
+            return _warm_pool().apply_async(_rotate_in_worker, (ROTATE_SCRIPT,)).get(job.timeout)
+        except multiprocessing.TimeoutError:
+            _pool.terminate()
+            _pool = None
+            raise JobTimeout("rotation timeout after %ss" % job.timeout)
+
+@app.errorhandler(QueueFull)
+def queue_full(e):
+    return jsonify({"ok": False, "error": str(e)}), 429
 
 @app.route("/webhook/cloudns", methods=["POST"])
 def cloudns_webhook():
@@ -22,15 +124,28 @@ def cloudns_webhook():
     check_name = data.get("name")
     if status and status.lower() == "down":
         # registrar y lanzar reparación automática
-        async_run(f"python3 {REPAIR_SCRIPT} &")
+        return jsonify({"ok":True, "jobs": {"repair": enqueue("repair", ["python3", REPAIR_SCRIPT])}})
     return jsonify({"ok":True})
 
 @app.route("/webhook/github", methods=["POST"])
 def github_webhook():
-    # on push -> actualizar sync y/o disparar rotate
-    async_run(f"bash {SYNC_SCRIPT} &")
-    async_run(f"python3 {ROTATE_SCRIPT} &")
-    return jsonify({"ok":True})
+    # on push -> actualizar sync (solo el repo del payload) y/o disparar rotate
+    data = request.json or {}
+    repo = (data.get("repository") or {}).get("full_name")
+    ids = {"sync": enqueue_sync(repo),
+           "rotate": jobs.submit("rotate", rotate_job, meta={"runner": ROTATE_RUNNER}).id}
+    return jsonify({"ok":True, "jobs": ids})
+
+@app.route("/jobs", methods=["GET"])
+def jobs_stats():
+    return jsonify(jobs.stats())
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(job)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=9000)
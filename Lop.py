@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
-import os, time, json, hmac, hashlib
+import os, sys, time, json, hmac, hashlib
 from pathlib import Path
+import metrics
 BASE = Path(__file__).parent.parent.resolve()
 MANIFEST = BASE / "rotated" / "manifest.json"
 ROT_KEY = os.environ.get("ROT_KEY")
 BACKUP = BASE / "backup"
+DEEP_VERIFY = os.environ.get("DEEP_VERIFY", "false").lower() in ("1","true","yes")
+MANIFEST_BIN = MANIFEST.with_name("manifest.bin")
+USE_BIN = os.environ.get("ROT_MANIFEST_BIN", "false").lower() in ("1","true","yes")
 
 def verify_manifest():
+    if USE_BIN and MANIFEST_BIN.exists():
+        import manifest_bin
+        ok = manifest_bin.BinManifest(MANIFEST_BIN).verify(ROT_KEY)
+        return ok, "ok" if ok else "hmac mismatch"
     if not MANIFEST.exists(): return False, "no manifest"
     m = json.loads(MANIFEST.read_text())
     h = m.pop("hmac", None)
@@ -15,13 +23,33 @@ def verify_manifest():
     m["hmac"] = h
     return calc == h, "ok" if calc == h else "hmac mismatch"
 
-if __name__ == "__main__":
+def verify_entries():
+    import deep_verify  # solo con DEEP_VERIFY
+    path = MANIFEST_BIN if USE_BIN and MANIFEST_BIN.exists() else MANIFEST
+    report = deep_verify.verify_path(path, BASE, **deep_verify.env_options())
+    metrics.add_bytes("verify", report.get("bytes", 0))
+    metrics.add_files("verify", report.get("checked", 0))
+    for bad in report.get("mismatches", []):
+        print("[verify] entry", bad["status"], bad["entry"])
+    print("[verify] deep", report.get("checked"), "/", report.get("total"), "entries")
+    return report["ok"], "ok" if report["ok"] else "entry mismatch"
+
+def main():
     if not ROT_KEY:
         raise SystemExit("ROT_KEY required")
+    metrics.init("verify")
     while True:
-        ok, msg = verify_manifest()
+        with metrics.timer("verify_hmac"):
+            ok, msg = verify_manifest()
         print("[verify]", ok, msg)
+        if ok and DEEP_VERIFY:
+            with metrics.timer("verify_deep"):
+                ok, msg = verify_entries()
         if not ok:
+            metrics.counter("verify_failures_total", "Verificaciones fallidas").inc(reason=msg)
             print("[verify] manifest corrupto -> intentar restaurar desde backup")
             # Basic restore: find last backup with rotated content (implementation depende)
         time.sleep(20)
+
+if __name__ == "__main__":
+    sys.exit(main())
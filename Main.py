@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
-from create_monitor import create_monitor
+# Aprovisiona los checks como estado deseado: solo crea/actualiza lo que cambió (ver monitor_provision.py)
+# Uso: Main.py [--dry-run] [--prune]
+import sys, json
+from monitor_provision import provision
 
 # lista de checks a crear (ejemplo)
 checks = [
@@ -8,9 +11,6 @@ checks = [
     {"name":"fgm-tcp-443","mtype":"tcp","host":"home.cern","port":"443","period":"10"}
 ]
 
-for c in checks:
-    res = create_monitor(name=c["name"], mtype=c["mtype"], host=c["host"],
-                         period=c.get("period","10"),
-                         port=c.get("port",""),
-                         keyword=c.get("keyword",""))
-    print(res)
+if __name__ == "__main__":
+    res = provision(checks, dry_run="--dry-run" in sys.argv, prune="--prune" in sys.argv)
+    print(json.dumps(res, indent=2, ensure_ascii=False))
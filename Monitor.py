@@ -14,6 +14,8 @@ AUTH_PASS = os.environ.get("CLOUDNS_AUTH_PASS")
 if not AUTH_ID or not AUTH_PASS:
     raise SystemExit("Set CLOUDNS_AUTH_ID and CLOUDNS_AUTH_PASS in env")
 
+_session = None
+
 def create_monitor(name, mtype, host, **kwargs):
     # common params
     params = {
@@ -25,7 +27,10 @@ def create_monitor(name, mtype, host, **kwargs):
     }
     # merge any extra kwargs if provided by caller (port, keyword, interval, regionNodes, ...)
     params.update(kwargs)
-    r = requests.post(API_BASE, data=params, timeout=30)
+    global _session
+    if _session is None:
+        _session = requests.Session()  # reutiliza la conexión entre llamadas
+    r = _session.post(API_BASE, data=params, timeout=30)
     j = r.json()
     return j
 
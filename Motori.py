@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import time, json, hashlib, shutil
 from pathlib import Path
+import metrics
 BASE = Path("/opt/star-tigo-defensa")
 MIRRORS = BASE / "mirrors"
 WORK = BASE / "work"
@@ -17,33 +18,47 @@ def load():
 def save(d): HASH_STORE.write_text(json.dumps(d,indent=2))
 def snapshot(name,content):
     ts=int(time.time()); p=WORK/f"{name}_{ts}.bin"; p.parent.mkdir(parents=True,exist_ok=True); p.write_bytes(content); shutil.copy2(p,MIRRORS/p.name); return p
-def verify():
+def find_mirror(name):
+    return next(MIRRORS.glob(name + "*"), None)
+def verify(hashes=None, mirrors=None):
+    # hashes/mirrors: índices compartidos opcionales (supervisor.py); sin ellos, hash y glob en cada pasada
     s = load()
+    changes = 0
+    find = mirrors.find if mirrors else find_mirror
     for f in WATCH:
         p = Path(f)
         if not p.exists():
-            mirror = next(MIRRORS.glob(p.name + "*"), None)
+            mirror = find(p.name)
             if mirror:
                 p.parent.mkdir(parents=True,exist_ok=True)
                 shutil.copy2(mirror, p)
                 s[f] = sha(p.read_bytes()); print("restored",f)
+                changes += 1
+                metrics.counter("repair_restored_total", "Archivos restaurados desde mirror").inc()
             else:
                 print("missing and no mirror", f)
             continue
-        h = sha(p.read_bytes())
+        h = hashes.sha512(p) if hashes else sha(p.read_bytes())
+        metrics.add_files("repair_verify")
         if s.get(f) != h:
+            metrics.counter("repair_changes_total", "Cambios detectados en archivos vigilados").inc()
             print("change detected", f)
+            changes += 1
             snapshot(Path(f).name, p.read_bytes())
-            mirror = next(MIRRORS.glob(Path(f).name + "*"), None)
+            mirror = find(Path(f).name)
             if mirror:
                 shutil.copy2(mirror, p)
                 s[f] = sha(p.read_bytes()); print("repaired from mirror", f)
             else:
                 s[f] = h
     save(s)
+    return changes
 
 if __name__ == "__main__":
+    metrics.init("repair")
     while True:
-        try: verify()
+        try:
+            with metrics.cycle("repair_verify"):
+                verify()
         except Exception as e: print("monitor err", e)
         time.sleep(15)
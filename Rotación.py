@@ -4,57 +4,48 @@
 Rotador reversible de archivos de texto (HTML, CSS, JS, JSON, PY...)
 Genera rotated/ + manifest.json (sha512 por archivo + hmac)
 Push a branch rot-<ts>-<rand> si el repo está inicializado.
+Importable sin efectos: ROT_KEY se exige en main().
 """
 
-import os, time, json, hmac, hashlib, random, string, shutil, subprocess
+import os, sys, time, json, hmac, hashlib
 from pathlib import Path
+import metrics
+import rotation_engine as engine
 
 BASE = Path(__file__).parent.resolve()
 SOURCE = BASE / "source"
 ROTATED = BASE / "rotated"
 BACKUP = BASE / "backup"
 MANIFEST = ROTATED / "manifest.json"
+MERKLE_MANIFEST = ROTATED / "manifest.merkle.json"
 
 ROT_KEY = os.environ.get("ROT_KEY")
 GIT_REMOTE = os.environ.get("GIT_REMOTE", "origin")
 GIT_REPO_DIR = BASE
 BRANCH_PREFIX = "rot-"
+GIT_PUSH_BATCH = int(os.environ.get("GIT_PUSH_BATCH", 1))  # ramas pendientes por push
 ROT_INTERVAL = int(os.environ.get("ROT_INTERVAL", 600))  # default 10 min
+ROT_MERKLE = os.environ.get("ROT_MERKLE", "false").lower() in ("1", "true", "yes")
 
-if not ROT_KEY:
-    raise SystemExit("Define ROT_KEY en el entorno (export ROT_KEY=...)")
-
-# --- charset: letras, dígitos, puntuación, espacios, newline, tabs, y una lista básica de emojis ---
-BASE_CHARS = list((string.ascii_letters + string.digits + string.punctuation + " \n\t"))
-# lista básica de emojis (puedes ampliar)
-EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","😇","🙂","🙃","😍","😘","😜","🤖","🔥","✨","🌐","🔒"]
-# combinamos en una lista ordenada (sin duplicados)
-CHARSET = []
-for c in BASE_CHARS + EMOJIS:
-    if c not in CHARSET:
-        CHARSET.append(c)
+# --- charset: letras, dígitos, puntuación, espacios, newline, tabs y 20 emojis (rotation_engine "perm") ---
+CHARSET = list(engine.CHARSETS["perm"])
 
 def rand_suffix(n=6):
-    return ''.join(random.choice(string.ascii_lowercase+string.digits) for _ in range(n))
+    import random
+    return ''.join(random.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(n))
 
 def build_map(seed: str):
-    rnd = random.Random(seed)
-    perm = CHARSET.copy()
-    rnd.shuffle(perm)
-    return {CHARSET[i]: perm[i] for i in range(len(CHARSET))}
+    # la permutación y su inversa se compilan una vez por seed (LRU en rotation_engine)
+    return engine.build_map(seed)
 
 def invert_map(mapping):
     return {v:k for k,v in mapping.items()}
 
 def is_text_file(p: Path) -> bool:
-    try:
-        p.read_text(encoding='utf-8')
-        return True
-    except Exception:
-        return False
+    return engine.is_text(p)
 
 def rotate_text(text: str, mapping: dict) -> str:
-    return ''.join(mapping.get(ch, ch) for ch in text)
+    return text.translate(str.maketrans(mapping))
 
 def sha512_file(path: Path) -> str:
     h = hashlib.sha512()
@@ -72,60 +63,69 @@ def ensure_dirs():
     BACKUP.mkdir(parents=True, exist_ok=True)
 
 def snapshot_backup():
+    import shutil
     ts = int(time.time())
     dst = BACKUP / f"backup_{ts}"
     if not dst.exists():
         shutil.copytree(SOURCE, dst)
 
 def git_push_rotated(branch_name: str, message: str):
+    # commit por plumbing (sin checkout ni tocar el worktree) + push agrupado
+    import subprocess, git_publish
     try:
-        subprocess.run(["git","checkout","-b",branch_name], cwd=str(GIT_REPO_DIR), check=True)
-        subprocess.run(["git","add", str(ROTATED)], cwd=str(GIT_REPO_DIR), check=True)
-        subprocess.run(["git","commit","-m",message], cwd=str(GIT_REPO_DIR), check=True)
-        subprocess.run(["git","push","-u", GIT_REMOTE, branch_name], cwd=str(GIT_REPO_DIR), check=True)
-        # volver a main/master
-        try:
-            subprocess.run(["git","checkout","main"], cwd=str(GIT_REPO_DIR), check=True)
-        except subprocess.CalledProcessError:
-            subprocess.run(["git","checkout","master"], cwd=str(GIT_REPO_DIR), check=True)
+        git_publish.commit_rotation(GIT_REPO_DIR, ROTATED, branch_name, message)
+        git_publish.push_pending(GIT_REPO_DIR, GIT_REMOTE, GIT_PUSH_BATCH)
     except subprocess.CalledProcessError as e:
-        print("Warning: git push failed:", e)
+        print("Warning: git push failed:", e, (e.stderr or "").strip())
 
 def rotate_cycle():
     ensure_dirs()
     snapshot_backup()
     seed = str(int(time.time())) + rand_suffix(8)
-    mapping = build_map(seed)
+    table = engine.perm_tables(seed)[0]
     entries = {}
-    for root,_,files in os.walk(SOURCE):
-        for fname in files:
-            in_path = Path(root) / fname
-            rel = in_path.relative_to(SOURCE)
-            out_path = ROTATED / rel
-            out_path.parent.mkdir(parents=True, exist_ok=True)
-            # texto -> rotar; binario -> copiar tal cual
-            if is_text_file(in_path):
-                text = in_path.read_text(encoding='utf-8', errors='ignore')
-                rotated = rotate_text(text, mapping)
-                out_path.write_text(rotated, encoding='utf-8')
-            else:
-                shutil.copy2(in_path, out_path)
-            entries[str(rel)] = {"rotated": str(out_path.relative_to(BASE)), "sha512": sha512_file(out_path)}
+    with metrics.timer("walk"):
+        paths = [Path(root) / fname for root, _, files in os.walk(SOURCE) for fname in files]
+    for in_path in paths:
+        rel = in_path.relative_to(SOURCE)
+        out_path = ROTATED / rel
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        # texto -> rotar en streaming; binario -> copiar tal cual (sha512 calculado al escribir)
+        with metrics.timer("rotate", mode="perm"):
+            digest, binary = engine.rotate_path(in_path, out_path, table)
+        metrics.add_bytes("rotate", in_path.stat().st_size)
+        metrics.add_files("rotate")
+        entries[str(rel)] = {"rotated": str(out_path.relative_to(BASE)), "sha512": digest}
+        if binary:
+            entries[str(rel)]["binary"] = True
     manifest = {"timestamp": int(time.time()), "seed": seed, "entries": entries}
-    b = json.dumps(manifest, sort_keys=True).encode('utf-8')
-    manifest_hmac = hmac_sign(b)
-    manifest["hmac"] = manifest_hmac
-    MANIFEST.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    with metrics.timer("sign"):
+        b = json.dumps(manifest, sort_keys=True).encode('utf-8')
+        manifest_hmac = hmac_sign(b)
+        manifest["hmac"] = manifest_hmac
+        MANIFEST.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+        if ROT_MERKLE:
+            import merkle_manifest
+            prev = merkle_manifest.load(MERKLE_MANIFEST) if MERKLE_MANIFEST.exists() else None
+            merkle_manifest.write(merkle_manifest.from_manifest(manifest, ROT_KEY, prev), MERKLE_MANIFEST)
     branch = BRANCH_PREFIX + str(int(time.time())) + "-" + rand_suffix(6)
-    git_push_rotated(branch, f"Auto-rotated artifacts {manifest['timestamp']}")
+    with metrics.timer("push"):
+        git_push_rotated(branch, f"Auto-rotated artifacts {manifest['timestamp']}")
     print("rotate: creada rama", branch, "manifest.hmac", manifest_hmac)
     return manifest
 
-if __name__ == "__main__":
+def main():
+    if not ROT_KEY:
+        raise SystemExit("Define ROT_KEY en el entorno (export ROT_KEY=...)")
+    metrics.init("rotacion")
     print("Rotate service iniciado. ROT_INTERVAL:", ROT_INTERVAL)
     while True:
         try:
-            rotate_cycle()
+            with metrics.cycle("rotate_cycle"):
+                rotate_cycle()
         except Exception as e:
             print("rotate error:", e)
         time.sleep(ROT_INTERVAL)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,53 +26,42 @@ def hmac_check(manifest_dict):
     manifest_dict["hmac"] = h
     return calc == h
 
-# same CHARSET & build_map as rotate_service - must match
-import string, random
-BASE_CHARS = list((string.ascii_letters + string.digits + string.punctuation + " \n\t"))
-EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","😇","🙂","🙃","😍","😘","😜","🤖","🔥","✨","🌐","🔒"]
-CHARSET = []
-for c in BASE_CHARS + EMOJIS:
-    if c not in CHARSET:
-        CHARSET.append(c)
+# same CHARSET & permutation as Rotación.py - compartidos en rotation_engine
+import rotation_engine as engine, generations
+CHARSET = list(engine.CHARSETS["perm"])
 
 def build_map(seed: str):
-    rnd = random.Random(seed)
-    perm = CHARSET.copy()
-    rnd.shuffle(perm)
-    return {CHARSET[i]: perm[i] for i in range(len(CHARSET))}
+    return engine.build_map(seed)
 
 def invert_map(mapping):
     return {v:k for k,v in mapping.items()}
 
 def unrotate_text(rotated: str, inv_map: dict) -> str:
-    return ''.join(inv_map.get(ch, ch) for ch in rotated)
+    return rotated.translate(str.maketrans(inv_map))
 
 def main():
     if not MANIFEST.exists():
         print("Manifest no encontrado:", MANIFEST)
         return
-    manifest = json.loads(MANIFEST.read_text())
+    root = generations.manifest_root(MANIFEST)
+    manifest = json.loads((root / MANIFEST.name if root else MANIFEST).read_text())
     if not hmac_check(manifest.copy()):
         print("HMAC manifest invalido - abortando")
         return
     seed = manifest.get("seed")
-    mapping = build_map(seed)
-    inv = invert_map(mapping)
+    # tabla inversa cacheada por seed: des-rotar generaciones recientes no la recalcula
+    inv = engine.perm_tables(seed)[1]
     OUT.mkdir(parents=True, exist_ok=True)
     for rel, info in manifest["entries"].items():
-        rotated_path = BASE / info["rotated"]
+        rotated_path = generations.entry_path(BASE, info["rotated"], root)
         out_path = OUT / rel
         out_path.parent.mkdir(parents=True, exist_ok=True)
-        try:
-            txt = rotated_path.read_text(encoding='utf-8', errors='ignore')
-            original = unrotate_text(txt, inv)
-            out_path.write_text(original, encoding='utf-8')
-            print("Restored", rel)
-        except Exception:
-            # binario -> copiar directamente
-            import shutil
-            shutil.copy2(rotated_path, out_path)
+        if info.get("binary"):
+            engine.bytes_stream(rotated_path, out_path)
             print("Copied binary", rel)
+            continue
+        _, binary = engine.rotate_path(rotated_path, out_path, inv)
+        print("Copied binary" if binary else "Restored", rel)
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,58 @@
 #!/usr/bin/env python3
+# unrotate.py se importa una vez (por ruta) y corre en proceso; solo se repite si cambia el manifest
 from flask import Flask, send_file, abort
-import os, subprocess, pathlib
+import os, sys, threading, importlib.util, pathlib
 BASE = pathlib.Path(__file__).parent.parent.resolve()
+UNROTATE_SCRIPT = BASE / "rotate" / "unrotate.py"
 ROT_KEY = os.environ.get("ROT_KEY")
-if not ROT_KEY:
-    raise SystemExit("ROT_KEY required")
 app = Flask(__name__)
 
+_unrotator = None
+_state = {"stamp": None}
+_lock = threading.Lock()
+
+def load_unrotator():
+    global _unrotator
+    if _unrotator is None:
+        sys.path.insert(0, str(UNROTATE_SCRIPT.parent))
+        spec = importlib.util.spec_from_file_location("unrotate", UNROTATE_SCRIPT)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _unrotator = mod
+    return _unrotator
+
+def manifest_stamp(mod):
+    out = []
+    for p in (mod.MANIFEST, mod.MANIFEST_BIN):
+        try:
+            st = p.stat()
+            out.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            out.append(None)
+    return tuple(out)
+
+def ensure_unrotated():
+    # run unrotate to ensure out exists (solo la primera vez y tras cada rotación)
+    with _lock:
+        mod = load_unrotator()
+        stamp = manifest_stamp(mod)
+        if stamp == _state["stamp"]:
+            return
+        try:
+            mod.unrotate(verbose=False)
+            _state["stamp"] = stamp
+        except (OSError, ValueError) as e:
+            print("unrotate failed:", e)
+
 @app.route("/file/<path:fname>")
 def get_file(fname):
-    # run unrotate to ensure out exists
-    subprocess.run(["/usr/bin/env","python3", str(BASE/"rotate"/"unrotate.py")])
+    ensure_unrotated()
     outp = BASE / "unrotated_out" / fname
     if not outp.exists():
         abort(404)
     return send_file(str(outp))
 
 if __name__ == "__main__":
+    if not ROT_KEY:
+        raise SystemExit("ROT_KEY required")
     app.run(host="0.0.0.0", port=8080)
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 # verify_loop.py
-import os, json, time, hmac, hashlib
+import os, sys, json, time, hmac, hashlib
 from pathlib import Path
+import metrics
 
 BASE = Path(__file__).parent.resolve()
 ROTATED = BASE / "rotated"
 MANIFEST = ROTATED / "manifest.json"
 ROT_KEY = os.environ.get("ROT_KEY")
 BACKUP = BASE / "backup"
+DEEP_VERIFY = os.environ.get("DEEP_VERIFY", "false").lower() in ("1","true","yes")
+MANIFEST_BIN = MANIFEST.with_name("manifest.bin")
+USE_BIN = os.environ.get("ROT_MANIFEST_BIN", "false").lower() in ("1","true","yes")
 
 def verify_manifest():
+    if USE_BIN and MANIFEST_BIN.exists():
+        # manifest.bin: HMAC en streaming sobre mmap, sin json.loads
+        import manifest_bin
+        ok = manifest_bin.BinManifest(MANIFEST_BIN).verify(ROT_KEY)
+        return ok, "ok" if ok else "hmac mismatch"
     if not MANIFEST.exists():
         return False, "manifest not found"
     m = json.loads(MANIFEST.read_text())
@@ -22,13 +31,31 @@ def verify_manifest():
     else:
         return False, "hmac mismatch"
 
-if __name__ == "__main__":
+def verify_entries():
+    # compara sha512 de cada archivo rotado con el manifest (muestreo según VERIFY_SAMPLE_PCT / VERIFY_BUDGET_MB)
+    import deep_verify  # solo con DEEP_VERIFY
+    path = MANIFEST_BIN if USE_BIN and MANIFEST_BIN.exists() else MANIFEST
+    report = deep_verify.verify_path(path, BASE, **deep_verify.env_options())
+    metrics.add_bytes("verify", report.get("bytes", 0))
+    metrics.add_files("verify", report.get("checked", 0))
+    for bad in report.get("mismatches", []):
+        print("verify: entry", bad["status"], bad["entry"])
+    print("verify: deep", report.get("checked"), "/", report.get("total"), "entries,", report.get("mb_s"), "MB/s")
+    return report["ok"], "ok" if report["ok"] else "entry mismatch"
+
+def main():
     if not ROT_KEY:
         raise SystemExit("Define ROT_KEY")
+    metrics.init("verify")
     while True:
-        ok, msg = verify_manifest()
+        with metrics.timer("verify_hmac"):
+            ok, msg = verify_manifest()
         print("verify:", ok, msg)
+        if ok and DEEP_VERIFY:
+            with metrics.timer("verify_deep"):
+                ok, msg = verify_entries()
         if not ok:
+            metrics.counter("verify_failures_total", "Verificaciones fallidas").inc(reason=msg)
             print("Manifest corrupto -> restaurando desde backup (si aplica)")
             # logica para restore desde BACKUP (ejemplo simple: copiar último backup)
             backups = sorted(BACKUP.glob("backup_*"), reverse=True)
@@ -38,3 +65,6 @@ if __name__ == "__main__":
             else:
                 print("No backups disponibles")
         time.sleep(20)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# asset_build.py
+"""
+Build de assets estáticos antes de la rotación (rotate_service.py con ROT_ASSET_BUILD, o CLI)
+- Entrada ASSET_SRC (por defecto BASE/assets), salida ASSET_OUT (por defecto SOURCE): lo que se rota
+- Minifica HTML/CSS/JS de forma conservadora: comentarios y espacios; <pre>, <textarea>, <script> y
+  <style> no se tocan salvo para minificar su JS/CSS, y los atributos de las etiquetas quedan igual
+- El tipo se decide por contenido y no por extensión: varios .css del repo son documentos HTML
+- Fingerprint: nombre.<sha256[:10]>.ext del contenido minificado (CSS, JS, imágenes, fuentes);
+  las páginas .html y el resto conservan su nombre
+- Dedup: contenidos idénticos con la misma extensión se escriben una sola vez
+- Variantes .gz (siempre) y .br (si el módulo brotli está instalado) cuando ahorran al menos un 10%
+- asset-map.json: nombre lógico -> archivo, variantes y tipo; Desroyado.py lo usa para resolver
+  nombres lógicos y servir la variante que acepte el cliente (Accept-Encoding)
+- Las referencias href/src/url()/@import a otros assets se reescriben al nombre con fingerprint
+  (assets, luego CSS, luego JS, luego HTML; un @import entre CSS aún sin procesar queda con su nombre lógico)
+- Solo se reescriben los archivos cuyo contenido cambió: el mtime se conserva y generations.py
+  puede enlazar el rotado anterior; lo que dejó de producirse se borra
+Uso: asset_build.py [--src DIR] [--out DIR] [--dry-run]
+"""
+import os, re, sys, json, hashlib, posixpath
+from functools import lru_cache
+from pathlib import Path
+
+BASE = Path(__file__).parent.parent.resolve()
+ASSET_SRC = Path(os.environ.get("ASSET_SRC", BASE / "assets"))
+ASSET_OUT = Path(os.environ.get("ASSET_OUT", BASE / "source"))
+ASSET_MIN_COMPRESS = int(os.environ.get("ASSET_MIN_COMPRESS", 256))  # bytes; por debajo no se comprime
+MAP_NAME = "asset-map.json"
+HASH_LEN = 10
+
+PAGE_EXTS = {".html", ".htm"}
+FINGERPRINT_EXTS = {".css", ".js", ".mjs", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico",
+                    ".woff", ".woff2", ".ttf", ".otf"}
+COMPRESS_KINDS = {"html", "css", "js", "text"}
+TYPES = {".html": "text/html; charset=utf-8", ".htm": "text/html; charset=utf-8",
+         ".css": "text/css; charset=utf-8", ".js": "application/javascript; charset=utf-8",
+         ".mjs": "application/javascript; charset=utf-8", ".json": "application/json",
+         ".svg": "image/svg+xml", ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
+         ".gif": "image/gif", ".webp": "image/webp", ".ico": "image/x-icon", ".woff": "font/woff",
+         ".woff2": "font/woff2", ".ttf": "font/ttf", ".otf": "font/otf"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))  # orden de preferencia al servir
+
+# ---------- detección ----------
+_HTML_SNIFF = re.compile(r'\s*(?:<!--.*?-->\s*)*<(?:!doctype\s+html|html|head|body)\b', re.I | re.S)
+
+def kind(name: str, data: bytes) -> str:
+    """html / css / js / text / binary, mirando primero el contenido."""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return "binary"
+    if _HTML_SNIFF.match(text[:4096]):
+        return "html"
+    ext = posixpath.splitext(name)[1].lower()
+    if ext in PAGE_EXTS:
+        return "html"
+    if ext == ".css":
+        return "css"
+    if ext in (".js", ".mjs"):
+        return "js"
+    return "text"
+
+# ---------- minificadores ----------
+_CSS_TOKEN = re.compile(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|(/\*.*?\*/)|([^"\'/]+|.)', re.S)
+_CSS_PUNCT = re.compile(r'\s*([{};,])\s*')
+
+def minify_css(text: str) -> str:
+    out = []
+    for m in _CSS_TOKEN.finditer(text):
+        if m.group(1):
+            out.append(m.group(1))  # cadenas tal cual
+        elif m.group(2):
+            out.append(" ")  # un comentario separa tokens
+        else:
+            out.append(m.group(3))
+    # espacios y ";}" solo fuera de cadenas: se vuelve a partir para no tocar su contenido; los
+    # tramos seguidos entre dos cadenas se tratan juntos (un "/" suelto parte el token)
+    res, code = [], []
+    def flush():
+        if code:
+            res.append(_CSS_PUNCT.sub(r"\1", re.sub(r"\s+", " ", "".join(code))).replace(";}", "}"))
+            code.clear()
+    for m in _CSS_TOKEN.finditer("".join(out)):
+        if m.group(1):
+            flush()
+            res.append(m.group(1))
+        else:
+            code.append(m.group(0))
+    flush()
+    return "".join(res).strip()
+
+def minify_js(text: str) -> str:
+    """Solo sangría, líneas en blanco y comentarios // de línea completa; los saltos de línea se
+    conservan (inserción automática de ';'). Con plantillas `...` o cadenas continuadas con \\ no se toca."""
+    if "`" in text or "\\\n" in text or "\\\r\n" in text:
+        return text
+    lines = []
+    for line in text.splitlines():
+        s = line.strip()
+        if s and not s.startswith("//"):
+            lines.append(s)
+    return "\n".join(lines) + ("\n" if lines else "")
+
+_HTML_RAW = re.compile(r'(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)', re.S | re.I)
+_HTML_COMMENT = re.compile(r'<!--(?!\[if|\s*\[|>).*?-->', re.S)  # conserva comentarios condicionales
+_HTML_TAG = re.compile(r'(<[^>]*>)')
+_SCRIPT_TYPE = re.compile(r'\btype\s*=\s*["\']?([^"\'\s>]+)', re.I)
+_JS_TYPES = {"text/javascript", "application/javascript", "module"}
+
+def _collapse(text: str) -> str:
+    # un bloque de espacios se ve como un espacio: se conserva un salto de línea si lo había
+    return re.sub(r"\s+", lambda m: "\n" if "\n" in m.group(0) else " ", text)
+
+def _minify_html_text(seg: str) -> str:
+    seg = _HTML_COMMENT.sub("", seg)
+    return "".join(p if p.startswith("<") else _collapse(p) for p in _HTML_TAG.split(seg))
+
+def minify_html(text: str) -> str:
+    out, pos = [], 0
+    for m in _HTML_RAW.finditer(text):
+        out.append(_minify_html_text(text[pos:m.start()]))
+        open_tag, tag, body, close = m.group(1), m.group(2).lower(), m.group(3), m.group(4)
+        if tag == "style":
+            body = minify_css(body)
+        elif tag == "script":
+            t = _SCRIPT_TYPE.search(open_tag)
+            if t is None or t.group(1).lower() in _JS_TYPES:
+                body = minify_js(body).strip("\n")
+        out.append(open_tag + body + close)
+        pos = m.end()
+    out.append(_minify_html_text(text[pos:]))
+    return "".join(out).strip() + "\n"
+
+MINIFIERS = {"html": minify_html, "css": minify_css, "js": minify_js}
+
+# ---------- referencias ----------
+_HTML_REF = re.compile(r'(\b(?:href|src)\s*=\s*)(["\'])([^"\']*)\2', re.I)
+_CSS_URL = re.compile(r'(url\(\s*)(["\']?)([^"\')]+)\2(\s*\))', re.I)
+_CSS_IMPORT = re.compile(r'(@import\s+)(["\'])([^"\']+)\2', re.I)
+_EXTERNAL = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|//|#)', re.I)
+
+def _target(rel: str, ref: str, names: dict):
+    """Ruta de salida para la referencia ref hecha desde rel, o None si no es un asset del build."""
+    if not ref or _EXTERNAL.match(ref):
+        return None
+    m = re.match(r'([^?#]*)(.*)', ref, re.S)
+    path, rest = m.group(1), m.group(2)
+    if not path:
+        return None
+    logical = posixpath.normpath(path.lstrip("/") if path.startswith("/")
+                                 else posixpath.join(posixpath.dirname(rel), path))
+    out = names.get(logical)
+    if out is None or out == logical:
+        return None
+    new = "/" + out if path.startswith("/") else posixpath.relpath(out, posixpath.dirname(rel) or ".")
+    return new + rest
+
+def rewrite_refs(text: str, rel: str, k: str, names: dict) -> str:
+    def sub(m, i=3):
+        new = _target(rel, m.group(i), names)
+        if new is None:
+            return m.group(0)
+        s, a, b = m.group(0), m.start(i) - m.start(), m.end(i) - m.start()
+        return s[:a] + new + s[b:]
+    if k == "html":
+        return _HTML_REF.sub(sub, text)
+    if k == "css":
+        return _CSS_IMPORT.sub(sub, _CSS_URL.sub(sub, text))
+    return text
+
+# ---------- compresión ----------
+@lru_cache(maxsize=1)
+def _brotli():
+    try:
+        import brotli  # opcional: sin el módulo solo se generan variantes .gz
+        return brotli
+    except ImportError:
+        return None
+
+def compress(data: bytes) -> dict:
+    """{"gzip": bytes, "br": bytes} con las variantes que valen la pena."""
+    import gzip
+    out = {}
+    if len(data) < ASSET_MIN_COMPRESS:
+        return out
+    z = gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0: salida reproducible entre builds
+    if len(z) <= len(data) * 0.9:
+        out["gzip"] = z
+    br = _brotli()
+    if br is not None:
+        b = br.compress(data, quality=11)
+        if len(b) <= len(data) * 0.9:
+            out["br"] = b
+    return out
+
+# ---------- build ----------
+def _write_if_changed(path: Path, data: bytes) -> bool:
+    try:
+        st = path.stat()
+        if st.st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(".%s.%d.tmp" % (path.name, os.getpid()))
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+def _order(k: str) -> int:
+    return {"binary": 0, "text": 0, "css": 1, "js": 2, "html": 3}[k]
+
+def _walk(src: Path):
+    for p in sorted(src.rglob("*")):
+        if p.is_file() and not p.is_symlink() and not p.name.startswith("."):
+            yield p.relative_to(src).as_posix(), p
+
+def build(src=None, out=None, dry_run: bool = False) -> dict:
+    """Construye src -> out; devuelve estadísticas (bytes antes/después, dedup, escritos)."""
+    src, out = Path(src or ASSET_SRC), Path(out or ASSET_OUT)
+    if not src.is_dir():
+        raise FileNotFoundError("ASSET_SRC no existe: %s" % src)
+    items = []
+    for rel, p in _walk(src):
+        data = p.read_bytes()
+        items.append((rel, data, kind(rel, data)))
+    items.sort(key=lambda it: (_order(it[2]), it[0]))
+
+    names, assets, files, by_digest = {}, {}, {}, {}
+    stats = {"files": len(items), "bytes_in": 0, "bytes_out": 0, "deduped": 0, "written": 0,
+             "removed": 0, "gzip": 0, "br": 0, "brotli": _brotli() is not None}
+    for rel, data, k in items:
+        stats["bytes_in"] += len(data)
+        if k in MINIFIERS:
+            text = rewrite_refs(MINIFIERS[k](data.decode("utf-8")), rel, k, names)
+            data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        stem, ext = posixpath.splitext(rel)
+        dup = by_digest.get((digest, ext.lower()))
+        if dup is not None and ext.lower() not in PAGE_EXTS:
+            stats["deduped"] += 1
+            names[rel] = dup["file"]
+            assets[rel] = dup
+            continue
+        target = "%s.%s%s" % (stem, digest[:HASH_LEN], ext) if ext.lower() in FINGERPRINT_EXTS else rel
+        names[rel] = target
+        info = {"file": target, "sha256": digest, "bytes": len(data),
+                "type": TYPES.get(ext.lower(), "application/octet-stream"), "immutable": target != rel}
+        files[target] = data
+        stats["bytes_out"] += len(data)
+        if k in COMPRESS_KINDS or ext.lower() == ".svg":
+            variants = compress(data)
+            for enc, suffix in ENCODINGS:
+                if enc in variants:
+                    info[enc] = target + suffix
+                    files[target + suffix] = variants[enc]
+                    stats[enc] += 1
+        assets[rel] = by_digest[(digest, ext.lower())] = info
+
+    old = load_map(out) or {}
+    amap = {"version": 1, "assets": assets, "files": sorted(files)}
+    if dry_run:
+        return stats
+    for rel, data in files.items():
+        stats["written"] += _write_if_changed(out / rel, data)
+    for rel in old.get("files", []):
+        if rel not in files:
+            try:
+                (out / rel).unlink()
+                stats["removed"] += 1
+            except OSError:
+                pass
+    _write_if_changed(out / MAP_NAME, json.dumps(amap, indent=1, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return stats
+
+# ---------- lado del servidor ----------
+@lru_cache(maxsize=4)
+def _load_map(path: str, mtime_ns: int):
+    with open(path, encoding="utf-8") as f:
+        amap = json.load(f)
+    # también por nombre con fingerprint: /file/Estilo.<hash>.css resuelve igual que /file/Estilo.css
+    amap["by_file"] = {i["file"]: i for i in amap.get("assets", {}).values()}
+    return amap
+
+def load_map(out_dir):
+    """asset-map.json de out_dir (cacheado mientras no cambie) o None."""
+    p = Path(out_dir) / MAP_NAME
+    try:
+        return _load_map(str(p), p.stat().st_mtime_ns)
+    except (OSError, ValueError):
+        return None
+
+def accepted(header: str) -> dict:
+    """Accept-Encoding -> {codificación: q}."""
+    prefs = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        m = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if m:
+            try:
+                q = float(m.group(1))
+            except ValueError:
+                q = 0.0
+        prefs[name.strip().lower()] = q
+    return prefs
+
+def resolve(out_dir, name: str, accept_encoding: str = ""):
+    """(ruta a servir, Content-Encoding o None, info del asset o None) para el nombre pedido."""
+    amap = load_map(out_dir)
+    info = amap and (amap["assets"].get(name) or amap["by_file"].get(name))
+    if not info:
+        return name, None, None
+    prefs = accepted(accept_encoding)
+    for enc, _ in ENCODINGS:
+        variant = info.get(enc)
+        if variant and prefs.get(enc, prefs.get("*", 0)) > 0 and (Path(out_dir) / variant).exists():
+            return variant, enc, info
+    return info["file"], None, info
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Minifica, precomprime y pone fingerprint a los assets")
+    ap.add_argument("--src", default=str(ASSET_SRC))
+    ap.add_argument("--out", default=str(ASSET_OUT))
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+    try:
+        stats = build(args.src, args.out, args.dry_run)
+    except FileNotFoundError as e:
+        print("ERROR:", e, file=sys.stderr)
+        return 2
+    print(json.dumps(stats))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
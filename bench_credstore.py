@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# bench_credstore.py - throughput del camino de login de Fid0o.py sobre credential_store.py
+# Uso: bench_credstore.py [--creds 1000000] [--per-user 5] [--threads 8] [--seconds 10] [--db /tmp/bench_webauthn.db]
+# Mide, por login: get_user (login/options) + put_state + pop_state + get_credential (login/complete).
+# La verificación criptográfica de fido2 queda fuera: necesita un autenticador real.
+import os, sys, time, json, random, sqlite3, argparse, threading
+from credential_store import SQLiteCredentialStore, SCHEMA
+
+def populate(path, n_creds, per_user):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    have = db.execute("SELECT COUNT(*) FROM credentials").fetchone()[0]
+    if have >= n_creds:
+        return have
+    db.execute("PRAGMA journal_mode=WAL")
+    users = n_creds // per_user
+    t0 = time.time()
+    batch = 50000
+    for start in range(0, users, batch):
+        rng = range(start, min(users, start + batch))
+        db.executemany("INSERT OR IGNORE INTO users VALUES (?,?,?)",
+                       (("user%d" % u, os.urandom(16), "User %d" % u) for u in rng))
+        db.executemany("INSERT OR IGNORE INTO credentials(cred_id, username, public_key, created) VALUES (?,?,?,?)",
+                       (("cred-%d-%d" % (u, k), "user%d" % u, os.urandom(77), 0)
+                        for u in rng for k in range(per_user)))
+        db.commit()
+    print("poblado: %d credenciales en %.1fs" % (users * per_user, time.time() - t0), file=sys.stderr)
+    return users * per_user
+
+def run(store, users, per_user, seconds, threads, hot_fraction):
+    stop = time.time() + seconds
+    counts = [0] * threads
+    hot = max(1, int(users * hot_fraction))
+
+    def worker(i):
+        rnd = random.Random(i)
+        n = 0
+        while time.time() < stop:
+            # 80% de los logins van a un conjunto caliente de usuarios
+            u = rnd.randrange(hot) if rnd.random() < 0.8 else rnd.randrange(users)
+            name = "user%d" % u
+            user = store.get_user(name)
+            sid = store.put_state({"username": name, "state": {"challenge": "x"}})
+            store.pop_state(sid)
+            c = store.get_credential(user["credentials"][rnd.randrange(per_user)]["cred_id"], name)
+            assert c is not None
+            n += 1
+        counts[i] = n
+
+    ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    return sum(counts) / seconds
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--creds", type=int, default=1000000)
+    ap.add_argument("--per-user", type=int, default=5)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--hot", type=float, default=0.01, help="fracción de usuarios calientes")
+    ap.add_argument("--db", default="/tmp/bench_webauthn.db")
+    a = ap.parse_args()
+    total = populate(a.db, a.creds, a.per_user)
+    users = total // a.per_user
+    res = {"credentials": total, "threads": a.threads}
+    res["logins_per_s_lru"] = round(run(SQLiteCredentialStore(a.db), users, a.per_user, a.seconds, a.threads, a.hot))
+    res["logins_per_s_no_lru"] = round(run(SQLiteCredentialStore(a.db, lru_size=0), users, a.per_user, a.seconds, a.threads, a.hot))
+    print(json.dumps(res))
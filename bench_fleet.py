@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# bench_fleet.py - generador de carga de la flota para fleet_backend.py
+# Uso: bench_fleet.py [--hosts 1000] [--files 1000] [--rounds 3] [--change 0.001] [--diverged 0.01]
+#                     [--db /tmp/bench_fleet.db] [--url http://host:8000] [--threads 16] [--queries 200]
+# - Ronda 0: todos los hosts reportan todos sus archivos (carga inicial)
+# - Rondas siguientes: cada host cambia una fracción --change de sus archivos; el resto reporta igual
+#   (lo normal cada 30 s: la mayoría de los reportes no traen cambios)
+# - --diverged de los hosts tiene algunos archivos distintos del golden desde el principio
+# - Sin --url se ingiere en proceso (FleetStore + Ingestor); con --url se hace POST al servidor
+# - Mide reportes/s y filas/s por ronda y la latencia p50/p99 de divergent() y changes()
+import os, sys, json, time, random, hashlib, argparse, threading
+import fleet_backend
+
+ROOT = "/opt/star-tigo-defensa/source"
+
+def sha(s: str) -> str:
+    return hashlib.sha512(s.encode()).hexdigest()
+
+class Fleet:
+    def __init__(self, hosts, files, diverged, seed=1):
+        self.rnd = random.Random(seed)
+        self.paths = ["%s/dir%03d/file%05d.html" % (ROOT, i % 97, i) for i in range(files)]
+        self.golden = {p: sha(p) for p in self.paths}
+        self.hosts = ["host-%05d" % h for h in range(hosts)]
+        self.state = {}
+        for h in self.hosts:
+            files = dict(self.golden)
+            if self.rnd.random() < diverged:
+                for p in self.rnd.sample(self.paths, max(1, len(self.paths) // 100)):
+                    files[p] = sha(p + h)
+            self.state[h] = files
+
+    def mutate(self, change, rnd_round):
+        expected = len(self.paths) * change
+        for h in self.hosts:
+            # en media expected cambios por host; con expected < 1 la mayoría de los hosts no cambia nada
+            n = int(expected) + (self.rnd.random() < expected - int(expected))
+            for p in self.rnd.sample(self.paths, n):
+                self.state[h][p] = sha("%s%s%d" % (p, h, rnd_round))
+
+    def report(self, h):
+        return {"host": h, "os": "Linux-bench", "timestamp": int(time.time()), "files": self.state[h]}
+
+def post(url, report):
+    """Código HTTP del POST, o 503 si hay que reintentar: urlopen lanza HTTPError en 503 (cola llena) y,
+    con muchos threads, el backlog del servidor puede cortar conexiones."""
+    import urllib.request, urllib.error
+    req = urllib.request.Request(url + "/api/agent/report", data=json.dumps(report).encode(),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        if e.code != 503:
+            raise
+        return e.code
+    except (ConnectionResetError, urllib.error.URLError) as e:
+        if isinstance(e, urllib.error.URLError) and not isinstance(e.reason, ConnectionError):
+            raise
+        return 503
+
+def get(url, path):
+    import urllib.request
+    with urllib.request.urlopen(url + path, timeout=60) as r:
+        return json.loads(r.read())
+
+def run_round(fleet, ingestor, url, threads):
+    t0 = time.time()
+    if url:
+        hosts = list(fleet.hosts)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not hosts:
+                        return
+                    h = hosts.pop()
+                while post(url, fleet.report(h)) == 503:
+                    time.sleep(0.5)
+        ts = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in ts: t.start()
+        for t in ts: t.join()
+        while get(url, "/health")["pending"]:
+            time.sleep(0.05)
+    else:
+        for h in fleet.hosts:
+            while True:
+                try:
+                    ingestor.submit(fleet.report(h))
+                    break
+                except fleet_backend.queue.Full:
+                    time.sleep(0.01)
+        ingestor.drain()
+    return time.time() - t0
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(len(xs) * p))], 3) if xs else None
+
+def run_queries(fleet, store, url, n, rnd):
+    div, chg = [], []
+    for _ in range(n):
+        p = rnd.choice(fleet.paths)
+        h = rnd.choice(fleet.hosts)
+        t0 = time.perf_counter()
+        if url:
+            from urllib.parse import quote
+            get(url, "/api/fleet/divergent?path=" + quote(p))
+            t1 = time.perf_counter()
+            get(url, "/api/fleet/changes?host=%s&since=%d" % (h, int(time.time()) - 60))
+        else:
+            store.divergent(p)
+            t1 = time.perf_counter()
+            store.changes(h, int(time.time()) - 60)
+        t2 = time.perf_counter()
+        div.append((t1 - t0) * 1000)
+        chg.append((t2 - t1) * 1000)
+    return {"divergent_ms": {"p50": pct(div, 0.5), "p99": pct(div, 0.99)},
+            "changes_ms": {"p50": pct(chg, 0.5), "p99": pct(chg, 0.99)}}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Carga simulada de la flota de agentes")
+    ap.add_argument("--hosts", type=int, default=1000)
+    ap.add_argument("--files", type=int, default=1000)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--change", type=float, default=0.001, help="fracción de archivos que cambia por host y ronda")
+    ap.add_argument("--diverged", type=float, default=0.01, help="fracción de hosts con archivos fuera del golden")
+    ap.add_argument("--db", default="/tmp/bench_fleet.db")
+    ap.add_argument("--url")
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--out")
+    a = ap.parse_args()
+
+    store = ingestor = None
+    if not a.url:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(a.db + suffix):
+                os.remove(a.db + suffix)
+        store = fleet_backend.FleetStore(a.db)
+        ingestor = fleet_backend.Ingestor(store)
+    t0 = time.time()
+    fleet = Fleet(a.hosts, a.files, a.diverged)
+    print("[fleet] flota simulada: %d hosts x %d archivos en %.1fs" % (a.hosts, a.files, time.time() - t0),
+          file=sys.stderr)
+    res = {"hosts": a.hosts, "files": a.files, "mode": "http" if a.url else "in-process", "rounds": []}
+    rnd = random.Random(2)
+    for i in range(a.rounds):
+        if i:
+            fleet.mutate(a.change, i)
+        before = dict(ingestor.totals) if ingestor else None
+        secs = run_round(fleet, ingestor, a.url, a.threads)
+        r = {"round": i, "seconds": round(secs, 2), "reports_s": round(a.hosts / secs, 1),
+             "rows_s": round(a.hosts * a.files / secs)}
+        if ingestor:
+            r.update({k: ingestor.totals[k] - before[k] for k in ("unchanged", "changed", "deleted", "batches")})
+        r.update(run_queries(fleet, store, a.url, a.queries, rnd))
+        res["rounds"].append(r)
+        print("[fleet] ronda %d: %.2fs, %s reportes/s, divergent p50 %s ms, changes p50 %s ms" % (
+            i, secs, r["reports_s"], r["divergent_ms"]["p50"], r["changes_ms"]["p50"]), file=sys.stderr)
+    if not a.url:
+        res["db_bytes"] = sum(os.path.getsize(a.db + s) for s in ("", "-wal") if os.path.exists(a.db + s))
+    text = json.dumps(res, indent=2)
+    if a.out:
+        open(a.out, "w").write(text)
+    print(text)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# bench_monitor.py - coste por poll de Deimon.py contra fake_watched_api.py (en un thread local)
+# Uso: bench_monitor.py [--posts 5000] [--records 2000] [--polls 20] [--new 5] [--port 5099] [--out f.json]
+# - "full": sin ETag ni cursor (la API y el poll originales: todo se descarga y se parsea cada vez)
+# - "conditional": If-None-Match + ?since= + vista local fusionada; solo lo nuevo se revisa
+# Entre polls se añaden --new posts; mide bytes recibidos, registros enviados, 304 y ms por poll.
+import io, sys, json, time, tempfile, argparse, threading, statistics, contextlib, importlib.util, urllib.request
+from pathlib import Path
+
+HERE = Path(__file__).parent.resolve()
+
+def load(name, file):
+    sys.path.insert(0, str(HERE))
+    spec = importlib.util.spec_from_file_location(name, HERE / file)
+    m = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(m)
+    return m
+
+def call(base, path, data=None):
+    req = urllib.request.Request(base + path, data=json.dumps(data).encode() if data is not None else None,
+                                 headers={"Content-Type": "application/json"}, method="POST" if data is not None else "GET")
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read())
+
+def run_mode(mon, base, conditional, polls, new):
+    call(base, "/_config", {"etag": conditional, "cursor": conditional})
+    mon.CONFIG["conditional_fetch"] = conditional
+    mon._views.clear()
+    mon._recent_posts.clear()
+    quiet = contextlib.redirect_stdout(io.StringIO())  # poll_once imprime un "." por poll sin alertas
+    with quiet:
+        mon.poll_once()  # primer poll: carga completa en los dos modos, fuera de la medida
+    call(base, "/_reset", {})
+    times = []
+    for _ in range(polls):
+        if new:
+            call(base, "/_grow", {"posts": new})
+        t0 = time.perf_counter()
+        with quiet:
+            mon.poll_once()
+        times.append((time.perf_counter() - t0) * 1000)
+    st = call(base, "/_stats")
+    return {"poll_ms_p50": round(statistics.median(times), 2), "poll_ms_max": round(max(times), 2),
+            "bytes_per_poll": st["bytes"] // polls, "records_per_poll": st["records_sent"] // polls,
+            "not_modified": st["not_modified"], "requests": st["requests"]}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Poll completo vs condicional de Deimon.py")
+    ap.add_argument("--posts", type=int, default=5000)
+    ap.add_argument("--records", type=int, default=2000)
+    ap.add_argument("--polls", type=int, default=20)
+    ap.add_argument("--new", type=int, default=5, help="posts nuevos entre polls")
+    ap.add_argument("--port", type=int, default=5099)
+    ap.add_argument("--out")
+    a = ap.parse_args()
+
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # sin una línea por request
+    api = load("fake_watched_api", "fake_watched_api.py")
+    api.seed(a.posts, a.records)
+    srv = make_server("127.0.0.1", a.port, api.app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % a.port
+
+    mon = load("monitor_daemon", "Deimon.py")
+    mon.CONFIG["base_url"] = base
+    mon.CONFIG["forensics_dir"] = tempfile.mkdtemp(prefix="bench_monitor_")
+    mon.CONFIG["max_post_rate"] = 10 ** 9  # sin alertas: se mide el poll, no el snapshot forense
+    res = {"posts": a.posts, "records": a.records, "polls": a.polls, "new_per_poll": a.new}
+    for mode in ("full", "conditional"):
+        res[mode] = run_mode(mon, base, mode == "conditional", a.polls, a.new)
+        print("[monitor] %-11s %8.2f ms/poll %10d B/poll %6d registros/poll" % (
+            mode, res[mode]["poll_ms_p50"], res[mode]["bytes_per_poll"], res[mode]["records_per_poll"]),
+            file=sys.stderr)
+    srv.shutdown()
+    text = json.dumps(res, indent=2)
+    if a.out:
+        Path(a.out).write_text(text)
+    print(text)
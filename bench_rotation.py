@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# bench_rotation.py - benchmark reproducible de rotación, unrotate y verificación
+# Uso: bench_rotation.py [--scale 1.0] [--modes right,up,...] [--out bench.json]
+#                        [--baseline bench_baseline.json] [--save-baseline] [--threshold 0.2] [--no-e2e] [--no-micro]
+# - Genera un árbol SOURCE sintético (semilla fija): muchos archivos pequeños, unos pocos enormes,
+#   texto con muchos emojis y binarios aleatorios
+# - Por cada modo: rotate_service.py --once -> unrotate.py -> deep_verify.py, cada fase en su propio
+#   proceso (segundos, MB/s, archivos/s, RSS pico) y comprobación byte a byte del round-trip
+# - Micro-benchmarks en proceso de char_shift, line_rotate, matrix_rotate_90, bytes_rotl, sha512_file y HMAC
+# - Con --baseline compara contra un resultado guardado y sale con 1 si alguna métrica empeora más que --threshold
+# - Sale con 1 (y no guarda --save-baseline) si alguna fase falla o el round-trip no es idéntico
+import os, sys, json, time, random, shutil, string, hashlib, platform, tempfile, argparse, subprocess
+from pathlib import Path
+
+HERE = Path(__file__).parent.resolve()
+MODES = ["right", "left", "perm", "up", "down", "matrix_cw", "matrix_ccw", "binary_left", "binary_right"]
+# módulos que rotate_service/unrotate/deep_verify importan desde su directorio
+MODULES = ["rotate_service.py", "unrotate.py", "rotation_engine.py", "deep_verify.py", "manifest_bin.py",
+           "merkle_manifest.py", "metrics.py", "generations.py"]
+SEED = 1234
+ROT_KEY = "bench-key"
+EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","🤖","🔥","✨","🌐","🔒"]
+WORDS = string.ascii_letters + string.digits + string.punctuation
+
+def _text(rnd, size, emoji_ratio):
+    out, n = [], 0
+    while n < size:
+        if rnd.random() < emoji_ratio:
+            c = rnd.choice(EMOJIS)
+        else:
+            c = "".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 12))) + rnd.choice(" \n\t ")
+        out.append(c)
+        n += len(c.encode('utf-8'))
+    return "".join(out)
+
+def generate(source: Path, scale=1.0, seed=SEED):
+    """Árbol sintético determinista; devuelve {files, bytes}."""
+    rnd = random.Random(seed)
+    specs = []
+    specs += [("small/d%02d/s%04d.txt" % (i % 20, i), 2048, 0.02) for i in range(int(2000 * scale))]
+    specs += [("emoji/e%03d.txt" % i, 64 * 1024, 0.5) for i in range(int(50 * scale))]
+    specs += [("huge/h%d.txt" % i, 8 * 1024 * 1024, 0.05) for i in range(max(1, int(2 * scale)))]
+    specs += [("bin/b%03d.bin" % i, 256 * 1024, None) for i in range(int(40 * scale))]
+    total = 0
+    # un bloque base por tipo evita que generar el árbol domine el tiempo del benchmark
+    chunk_cache = {}
+    for rel, size, emoji in specs:
+        p = source / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        if emoji is None:
+            data = rnd.randbytes(size)
+        else:
+            key = emoji
+            if key not in chunk_cache:
+                chunk_cache[key] = _text(rnd, 256 * 1024, emoji)
+            base = chunk_cache[key]
+            off = rnd.randrange(len(base) // 2)
+            text = (base[off:] + base[:off]) * (size // len(base) + 1)
+            # recorte en frontera UTF-8 y salto de línea final, como un archivo de texto real
+            data = text.encode('utf-8')[:size - 1].decode('utf-8', errors='ignore').encode('utf-8') + b"\n"
+        p.write_bytes(data)
+        total += len(data)
+    return {"files": len(specs), "bytes": total}
+
+def layout(root: Path):
+    """root/rotate/<módulos> y root/source: BASE de rotate_service/unrotate resuelve a root."""
+    (root / "rotate").mkdir(parents=True, exist_ok=True)
+    for m in MODULES:
+        shutil.copy2(HERE / m, root / "rotate" / m)
+    return root / "rotate"
+
+# ru_maxrss de wait4 conserva en Linux el pico heredado del padre (este proceso, con el corpus cargado):
+# cada fase corre bajo este envoltorio, que tras exec lee su propio VmHWM justo antes de salir
+HWM_WRAPPER = r"""
+import os, sys, runpy
+out, sys.argv = sys.argv[1], sys.argv[2:]
+sys.argv[0] = os.path.abspath(sys.argv[0])  # __file__ absoluto, como al ejecutar el script directamente
+sys.path[0] = os.path.dirname(sys.argv[0])
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    try:
+        with open("/proc/self/status") as f:
+            hwm = next((l.split()[1] for l in f if l.startswith("VmHWM:")), "")
+        with open(out, "w") as f:
+            f.write(hwm)
+    except OSError:
+        pass
+"""
+
+def run_phase(cmd, cwd, env):
+    """Ejecuta una fase (cmd = [python, script, args...]) en su propio proceso; RSS pico = VmHWM del hijo
+    (ru_maxrss solo donde no hay /proc). stderr va a un temporal: con un PIPE sin leer durante wait4
+    una fase que escribe mucho se bloquearía."""
+    fd, hwm_file = tempfile.mkstemp(prefix="bench_hwm_")
+    os.close(fd)
+    with tempfile.TemporaryFile(prefix="bench_err_") as errf:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([cmd[0], "-c", HWM_WRAPPER, hwm_file] + cmd[1:], cwd=cwd, env=env,
+                                stdout=subprocess.DEVNULL, stderr=errf)
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - t0
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        errf.seek(0)
+        err = errf.read().decode('utf-8', errors='replace').strip()
+    try:
+        with open(hwm_file) as f:
+            rss_kb = int(f.read().strip() or 0) or None
+    except (OSError, ValueError):
+        rss_kb = None
+    finally:
+        os.unlink(hwm_file)
+    if rss_kb is None:
+        rss_kb = usage.ru_maxrss if sys.platform != "darwin" else usage.ru_maxrss // 1024
+    return {"seconds": round(seconds, 4), "peak_rss_kb": rss_kb, "rc": proc.returncode,
+            **({"stderr": err[-500:]} if proc.returncode else {})}
+
+def compare_trees(a: Path, b: Path):
+    bad = 0
+    for p in a.rglob("*"):
+        if p.is_file():
+            q = b / p.relative_to(a)
+            if not q.exists() or q.read_bytes() != p.read_bytes():
+                bad += 1
+    return bad
+
+def bench_mode(root: Path, mode: str, size: dict):
+    for d in ("rotated", "unrotated_out", "backup"):
+        shutil.rmtree(root / d, ignore_errors=True)
+    rot = root / "rotate"
+    env = dict(os.environ, ROT_KEY=ROT_KEY, ROT_MODE=mode, GIT_PUSH="false",
+               VERIFY_SAMPLE_PCT="100", PYTHONDONTWRITEBYTECODE="1")
+    for k in ("ROT_MERKLE", "ROT_MANIFEST_BIN", "METRICS_PORT", "METRICS_FILE", "METRICS_PROFILE_BUDGET"):
+        env.pop(k, None)
+    py = sys.executable
+    phases = {
+        "rotate": run_phase([py, "rotate_service.py", "--once"], rot, env),
+        "unrotate": run_phase([py, "unrotate.py"], rot, env),
+        "verify": run_phase([py, "deep_verify.py", "--manifest", str(root / "rotated" / "manifest.json"),
+                             "--base", str(root), "--no-state"], rot, env),
+    }
+    mb = size["bytes"] / 1e6
+    for ph in phases.values():
+        s = max(ph["seconds"], 1e-9)
+        ph["mb_s"] = round(mb / s, 2)
+        ph["files_s"] = round(size["files"] / s, 1)
+    res = {"phases": phases, "roundtrip_mismatches": compare_trees(root / "source", root / "unrotated_out")}
+    res["seconds"] = round(sum(p["seconds"] for p in phases.values()), 4)
+    return res
+
+# ---------- micro-benchmarks ----------
+def _best(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def micro(tmp: Path, repeat=5):
+    os.environ.setdefault("ROT_KEY", ROT_KEY)
+    sys.path.insert(0, str(HERE))
+    import rotate_service as rs
+    rnd = random.Random(SEED)
+    text = _text(rnd, 1 << 20, 0.05)
+    blob = rnd.randbytes(1 << 20)
+    big = tmp / "micro.bin"
+    big.write_bytes(rnd.randbytes(16 << 20))
+    entries = {"f%06d.txt" % i: {"rotated": "rotated/f%06d.txt" % i, "sha512": hashlib.sha512(b"%d" % i).hexdigest()}
+               for i in range(20000)}
+    manifest = {"timestamp": 0, "seed": "x", "mode": "right", "param": 1, "entries": entries}
+    mb_text = len(text.encode('utf-8')) / 1e6
+    cases = {
+        "char_shift": (lambda: rs.char_shift(text, 3), mb_text),
+        "line_rotate": (lambda: rs.line_rotate(text, 7), mb_text),
+        "matrix_rotate_90": (lambda: rs.matrix_rotate_90(text[:200000]), len(text[:200000].encode('utf-8')) / 1e6),
+        "bytes_rotl": (lambda: rs.bytes_rotl(blob, 3), len(blob) / 1e6),
+        "sha512_file": (lambda: rs.sha512_file(big), big.stat().st_size / 1e6),
+        "manifest_hmac": (lambda: rs.hmac_sign_bytes(json.dumps(manifest, sort_keys=True).encode('utf-8')), None),
+    }
+    out = {}
+    for name, (fn, mb) in cases.items():
+        s = _best(fn, repeat)
+        out[name] = {"seconds": round(s, 5)}
+        if mb:
+            out[name]["mb_s"] = round(mb / s, 2)
+        else:
+            out[name]["entries_s"] = round(len(entries) / s, 1)
+    return out
+
+# ---------- baseline ----------
+def _flatten(d, prefix=""):
+    for k, v in d.items():
+        key = prefix + "." + k if prefix else k
+        if isinstance(v, dict):
+            yield from _flatten(v, key)
+        elif k in ("seconds", "peak_rss_kb", "roundtrip_mismatches") and isinstance(v, (int, float)):
+            yield key, v
+
+def compare(result, baseline, threshold):
+    """Métricas 'más es peor' (segundos, RSS, mismatches) que crecen más de threshold respecto al baseline."""
+    old = dict(_flatten({"e2e": baseline.get("e2e", {}), "micro": baseline.get("micro", {})}))
+    regressions = []
+    for key, v in _flatten({"e2e": result.get("e2e", {}), "micro": result.get("micro", {})}):
+        if key not in old:
+            continue
+        b = old[key]
+        if key.endswith("roundtrip_mismatches"):
+            worse = v > b
+        else:
+            worse = b > 0 and v > b * (1 + threshold)
+        if worse:
+            regressions.append({"metric": key, "baseline": b, "current": v,
+                                "ratio": round(v / b, 3) if b else None})
+    return regressions
+
+def meta(scale):
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    return {"timestamp": int(time.time()), "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "git": rev, "scale": scale, "seed": SEED}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark de rotate -> unrotate -> verify por modo")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiplica el número de archivos generados")
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--out", help="escribir el resultado JSON aquí (por defecto stdout)")
+    ap.add_argument("--baseline", help="JSON de referencia contra el que comparar")
+    ap.add_argument("--save-baseline", action="store_true", help="guardar este resultado como --baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    ap.add_argument("--no-e2e", action="store_true")
+    ap.add_argument("--no-micro", action="store_true")
+    ap.add_argument("--keep", action="store_true", help="no borrar el directorio temporal")
+    args = ap.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_rotation_"))
+    result = {"meta": meta(args.scale)}
+    try:
+        if not args.no_e2e:
+            layout(root)
+            size = generate(root / "source", args.scale)
+            result["meta"]["tree"] = size
+            print("[bench] source: %d files, %.1f MB" % (size["files"], size["bytes"] / 1e6), file=sys.stderr)
+            result["e2e"] = {}
+            for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+                r = bench_mode(root, mode, size)
+                result["e2e"][mode] = r
+                ph = r["phases"]
+                print("[bench] %-12s rotate %6.2f MB/s  unrotate %6.2f MB/s  verify %7.2f MB/s  mismatches %d"
+                      % (mode, ph["rotate"]["mb_s"], ph["unrotate"]["mb_s"], ph["verify"]["mb_s"],
+                         r["roundtrip_mismatches"]), file=sys.stderr)
+        if not args.no_micro:
+            result["micro"] = micro(root)
+            for name, r in result["micro"].items():
+                print("[bench] micro %-16s %s" % (name, r), file=sys.stderr)
+    finally:
+        if args.keep:
+            print("[bench] kept", root, file=sys.stderr)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    # una fase fallida o un round-trip con diferencias invalida el resultado: ni baseline ni "ok"
+    failures = ["%s %s rc=%d" % (mode, name, ph["rc"]) for mode, r in result.get("e2e", {}).items()
+                for name, ph in r["phases"].items() if ph["rc"]]
+    failures += ["%s roundtrip_mismatches=%d" % (mode, r["roundtrip_mismatches"])
+                 for mode, r in result.get("e2e", {}).items() if r["roundtrip_mismatches"]]
+    if failures:
+        result["failures"] = failures
+        for f in failures:
+            print("[bench] FAILED %s" % f, file=sys.stderr)
+    rc = 1 if failures else 0
+    if args.baseline and not args.save_baseline and Path(args.baseline).exists():
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.threshold)
+        result["regressions"] = regressions
+        for r in regressions:
+            print("[bench] REGRESSION %(metric)s: %(baseline)s -> %(current)s" % r, file=sys.stderr)
+        rc = 1 if regressions or failures else 0
+    text = json.dumps(result, indent=2)
+    if args.save_baseline and args.baseline and not failures:
+        Path(args.baseline).write_text(text)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    sys.exit(rc)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# bench_startup.py - coste de arranque en frío (import) de las herramientas CLI y servidores
+# Uso: bench_startup.py [--runs 10] [--tools rotate,unrotate,...] [--out startup.json]
+#                       [--baseline startup_baseline.json] [--save-baseline] [--threshold 0.2]
+# - Cada herramienta se importa en un proceso nuevo con python -X importtime (sin ejecutar main())
+# - Reporta mediana/mínimo del tiempo de pared, tiempo total de import y los imports más pesados
+# - El arranque del intérprete vacío (python -c pass) se mide aparte como referencia
+import os, sys, json, time, argparse, subprocess, statistics
+from pathlib import Path
+
+HERE = Path(__file__).parent.resolve()
+TOOLS = {
+    "rotate": "rotate_service.py",
+    "unrotate": "unrotate.py",
+    "verify": "Verificado.py",
+    "sign": "5272.py",
+    "rotacion": "Rotación.py",
+    "unrotate_perm": "Rotate.py",
+    "deep_verify": "deep_verify.py",
+    "supervisor": "supervisor.py",
+    "loader": "Desroyado.py",
+    "monitor": "Deimon.py",
+    "agent": "62827.py",
+}
+LOADER = ("import importlib.util, sys; sys.path.insert(0, %r); "
+          "spec = importlib.util.spec_from_file_location('bench_target', %r); "
+          "m = importlib.util.module_from_spec(spec); spec.loader.exec_module(m)")
+
+def parse_importtime(stderr: str):
+    """Líneas 'import time: self | cumulative | módulo' -> (total_us, top-level [(us, módulo)])."""
+    total, top = 0, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line.split(":", 1)[1].split("|", 2)
+            self_us, cum_us = int(self_us), int(cum_us)
+        except ValueError:
+            continue
+        name = name[1:]  # separador "| " antes del nombre
+        total += self_us
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        if depth <= 1:
+            top.append((cum_us, name.strip()))
+    top.sort(reverse=True)
+    return total, top
+
+def run(cmd, env):
+    t0 = time.perf_counter()
+    r = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    return time.perf_counter() - t0, r
+
+def bench_tool(path: Path, runs: int, env):
+    code = LOADER % (str(path.parent), str(path))
+    walls, imports, top, err = [], [], [], None
+    for _ in range(runs):
+        wall, r = run([sys.executable, "-X", "importtime", "-c", code], env)
+        walls.append(wall)
+        total, top = parse_importtime(r.stderr)
+        imports.append(total)
+        if r.returncode != 0:
+            err = r.stderr.strip().splitlines()[-1] if r.stderr.strip() else "rc=%d" % r.returncode
+    out = {"wall_ms": round(statistics.median(walls) * 1000, 1), "wall_min_ms": round(min(walls) * 1000, 1),
+           "import_ms": round(statistics.median(imports) / 1000, 1),
+           "heaviest": [{"module": n, "ms": round(us / 1000, 1)} for us, n in top[:5]]}
+    if err:
+        out["error"] = err[-300:]
+    return out
+
+def compare(result, baseline, threshold):
+    regressions = []
+    for name, r in result.get("tools", {}).items():
+        b = baseline.get("tools", {}).get(name)
+        if b and b.get("wall_ms") and r["wall_ms"] > b["wall_ms"] * (1 + threshold):
+            regressions.append({"tool": name, "baseline": b["wall_ms"], "current": r["wall_ms"]})
+    return regressions
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Arranque en frío (python -X importtime) de las herramientas")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--tools", default=",".join(TOOLS))
+    ap.add_argument("--out")
+    ap.add_argument("--baseline")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.2)
+    args = ap.parse_args()
+
+    # ROT_KEY presente para que las herramientas que aún la exigen al importar no salgan antes de tiempo
+    env = dict(os.environ, ROT_KEY=os.environ.get("ROT_KEY", "bench-key"), PYTHONDONTWRITEBYTECODE="1")
+    env.pop("METRICS_PORT", None)
+    env.pop("METRICS_FILE", None)
+    base = [run([sys.executable, "-c", "pass"], env)[0] for _ in range(args.runs)]
+    result = {"python": sys.version.split()[0], "interpreter_ms": round(statistics.median(base) * 1000, 1), "tools": {}}
+    for name in [t for t in args.tools.split(",") if t]:
+        path = HERE / TOOLS.get(name, name)
+        r = bench_tool(path, args.runs, env)
+        result["tools"][name] = r
+        print("[startup] %-14s wall %7.1f ms  import %7.1f ms  %s" % (
+            name, r["wall_ms"], r["import_ms"],
+            ", ".join("%s %.0f" % (h["module"], h["ms"]) for h in r["heaviest"][:3])), file=sys.stderr)
+
+    rc = 0
+    if args.baseline and not args.save_baseline and Path(args.baseline).exists():
+        result["regressions"] = compare(result, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for r in result["regressions"]:
+            print("[startup] REGRESSION %(tool)s: %(baseline)s -> %(current)s ms" % r, file=sys.stderr)
+        rc = 1 if result["regressions"] else 0
+    text = json.dumps(result, indent=2)
+    if args.save_baseline and args.baseline:
+        Path(args.baseline).write_text(text)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    sys.exit(rc)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# credential_store.py
+"""
+Almacén de usuarios/credenciales WebAuthn para Fid0o.py
+- SQLite por defecto (WAL: varios workers/procesos comparten el mismo archivo)
+- Índices por username y por credential id: login sin recorrer listas
+- LRU en proceso para usuarios calientes, con TTL corto (WEBAUTHN_LRU_TTL): el registro invalida la
+  entrada en el worker que lo hizo; los demás workers la renuevan al expirar
+- Estado de registro/autenticación guardado del lado del servidor con expiración
+  (la cookie de sesión solo lleva un id opaco); pop_state lo lee y borra de forma atómica: entre
+  workers, un estado solo se consume una vez
+Otras implementaciones solo necesitan los mismos métodos que SQLiteCredentialStore.
+"""
+import os, json, time, sqlite3, threading, secrets
+from collections import OrderedDict
+
+DB_PATH = os.environ.get("WEBAUTHN_DB", "webauthn.db")
+LRU_SIZE = int(os.environ.get("WEBAUTHN_LRU", 10000))
+LRU_TTL = float(os.environ.get("WEBAUTHN_LRU_TTL", 5))      # segundos
+STATE_TTL = int(os.environ.get("WEBAUTHN_STATE_TTL", 300))  # segundos
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    user_id BLOB NOT NULL,
+    display_name TEXT
+);
+CREATE TABLE IF NOT EXISTS credentials (
+    cred_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL REFERENCES users(username),
+    public_key BLOB NOT NULL,
+    sign_count INTEGER DEFAULT 0,
+    created INTEGER
+);
+CREATE INDEX IF NOT EXISTS credentials_username ON credentials(username);
+CREATE TABLE IF NOT EXISTS states (
+    state_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS states_expires ON states(expires);
+"""
+
+class LRU:
+    def __init__(self, size, ttl=LRU_TTL):
+        self.size, self.ttl = size, ttl
+        self.data = OrderedDict()  # key -> (caduca, valor)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.data.get(key)
+            if hit is not None:
+                if hit[0] > time.monotonic():
+                    self.data.move_to_end(key)
+                    return hit[1]
+                del self.data[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def drop(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+class SQLiteCredentialStore:
+    def __init__(self, path=DB_PATH, lru_size=LRU_SIZE, lru_ttl=LRU_TTL):
+        self.path = path
+        self._local = threading.local()  # una conexión por thread
+        self.cache = LRU(lru_size, lru_ttl)
+        db = self._db()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # ---------- usuarios ----------
+    def get_user(self, username):
+        """{id, name, displayName, credentials: [{cred_id, public_key}]} o None (cacheado)."""
+        user = self.cache.get(username)
+        if user is not None:
+            return user
+        db = self._db()
+        row = db.execute("SELECT user_id, display_name FROM users WHERE username=?", (username,)).fetchone()
+        if not row:
+            return None
+        creds = db.execute("SELECT cred_id, public_key FROM credentials WHERE username=?", (username,)).fetchall()
+        user = {"id": row[0], "name": username, "displayName": row[1],
+                "credentials": [{"cred_id": c, "public_key": pk} for c, pk in creds]}
+        self.cache.put(username, user)
+        return user
+
+    def create_user(self, username, display_name=None):
+        db = self._db()
+        db.execute("INSERT OR IGNORE INTO users(username, user_id, display_name) VALUES (?,?,?)",
+                   (username, os.urandom(16), display_name or username))
+        db.commit()
+        self.cache.drop(username)
+        return self.get_user(username)
+
+    # ---------- credenciales ----------
+    def add_credential(self, username, cred_id, public_key: bytes):
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO credentials(cred_id, username, public_key, created) VALUES (?,?,?,?)",
+                   (cred_id, username, public_key, int(time.time())))
+        db.commit()
+        self.cache.drop(username)
+
+    def get_credential(self, cred_id, username=None):
+        """Búsqueda directa por índice de credential id (opcionalmente ligada al usuario)."""
+        row = self._db().execute("SELECT username, public_key FROM credentials WHERE cred_id=?", (cred_id,)).fetchone()
+        if not row or (username is not None and row[0] != username):
+            return None
+        return {"cred_id": cred_id, "username": row[0], "public_key": row[1]}
+
+    # ---------- estado de ceremonias ----------
+    def put_state(self, data: dict, ttl=STATE_TTL):
+        state_id = secrets.token_urlsafe(24)
+        db = self._db()
+        db.execute("INSERT INTO states(state_id, data, expires) VALUES (?,?,?)",
+                   (state_id, json.dumps(data, default=str), int(time.time()) + ttl))
+        db.commit()
+        return state_id
+
+    def pop_state(self, state_id):
+        """Un solo uso: el estado se borra al leerlo; None si no existe o expiró."""
+        if not state_id:
+            return None
+        db = self._db()
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            # el DELETE que devuelve la fila es la lectura: dos workers no pueden obtener el mismo estado
+            row = db.execute("DELETE FROM states WHERE state_id=? RETURNING data, expires", (state_id,)).fetchone()
+        else:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT data, expires FROM states WHERE state_id=?", (state_id,)).fetchone()
+            db.execute("DELETE FROM states WHERE state_id=?", (state_id,))
+        db.execute("DELETE FROM states WHERE expires<?", (int(time.time()),))
+        db.commit()
+        if not row or row[1] < time.time():
+            return None
+        return json.loads(row[0])
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# deep_verify.py
+"""
+Verificación profunda de rotated/
+- Además del HMAC del manifest, compara el sha512 de cada entrada con el archivo rotado real
+- Hash en paralelo (pool de threads o de procesos) con lectura en streaming
+- Muestreo por ciclo: VERIFY_SAMPLE_PCT (% de entradas) y/o VERIFY_BUDGET_MB (bytes máximos)
+- Un cursor persistente hace que cada ciclo continúe donde quedó el anterior,
+  así el árbol completo se recorre en varias pasadas
+- Reporta cada discrepancia por entrada (mismatch / missing / error)
+"""
+import os, sys, json, time, hmac, hashlib, math
+from pathlib import Path
+import manifest_bin, generations
+
+CHUNK = 1 << 20  # 1 MiB: hashlib libera el GIL con buffers grandes
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+STATE_NAME = ".deep_verify_state.json"
+
+def sha512_file(path, chunk: int = CHUNK) -> str:
+    h = hashlib.sha512()
+    buf = bytearray(chunk)
+    mv = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(mv[:n])
+    return h.hexdigest()
+
+def hmac_ok(manifest: dict, key: str) -> bool:
+    m = dict(manifest)
+    h = m.pop("hmac", None)
+    b = json.dumps(m, sort_keys=True).encode('utf-8')
+    calc = hmac.new(key.encode('utf-8'), b, hashlib.sha512).hexdigest()
+    return h is not None and hmac.compare_digest(calc, h)
+
+def check_entry(job):
+    # job = (rel, path, expected_sha512, size); top-level para poder usarse con ProcessPool
+    rel, path, expected, _ = job
+    try:
+        actual = sha512_file(path)
+    except FileNotFoundError:
+        return {"entry": rel, "status": "missing", "path": path}
+    except OSError as e:
+        return {"entry": rel, "status": "error", "path": path, "error": str(e)}
+    if actual == expected:
+        return {"entry": rel, "status": "ok"}
+    return {"entry": rel, "status": "mismatch", "path": path, "expected": expected, "actual": actual}
+
+def _size(path) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+def select_entries(entries: dict, base: Path, sample_pct=None, budget_bytes=None, cursor: int = 0,
+                   gen_root=None):
+    """Devuelve (jobs, next_cursor). Sin muestreo ni presupuesto selecciona todo."""
+    keys = sorted(entries)
+    total = len(keys)
+    if not total:
+        return [], 0
+    start = cursor % total
+    want = total
+    if sample_pct is not None:
+        want = max(1, min(total, math.ceil(total * float(sample_pct) / 100.0)))
+    jobs, used = [], 0
+    for i in range(want):
+        rel = keys[(start + i) % total]
+        info = entries[rel]
+        path = str(generations.entry_path(base, info["rotated"], gen_root))
+        size = _size(path)
+        if budget_bytes is not None and jobs and used + size > budget_bytes:
+            break
+        jobs.append((rel, path, info.get("sha512"), size))
+        used += size
+    return jobs, (start + len(jobs)) % total
+
+def load_cursor(state_path):
+    try:
+        return int(json.loads(Path(state_path).read_text()).get("cursor", 0))
+    except Exception:
+        return 0
+
+def save_cursor(state_path, cursor: int):
+    p = Path(state_path)
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps({"cursor": cursor, "updated": int(time.time())}))
+    os.replace(tmp, p)
+
+def deep_verify(manifest: dict, base: Path, workers: int = None, processes: bool = False,
+                sample_pct=None, budget_bytes=None, state_path=None, gen_root=None):
+    """Hashea las entradas seleccionadas y devuelve un reporte con las discrepancias. gen_root: generación
+    del manifest (generations.manifest_root); sin ella se usa la publicada ahora."""
+    t0 = time.time()
+    entries = manifest.get("entries", {})
+    cursor = load_cursor(state_path) if state_path else 0
+    if gen_root is None:
+        gen_root = generations.current(Path(base) / "rotated")
+    jobs, next_cursor = select_entries(entries, Path(base), sample_pct, budget_bytes, cursor, gen_root)
+    workers = workers or DEFAULT_WORKERS
+    # concurrent.futures (y multiprocessing) solo se cargan al verificar, no al importar
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    pool_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    problems = []
+    if jobs:
+        # hashear primero los archivos grandes reparte mejor la carga entre workers
+        ordered = sorted(jobs, key=lambda j: j[3], reverse=True)
+        with pool_cls(max_workers=min(workers, len(ordered))) as ex:
+            for res in ex.map(check_entry, ordered, chunksize=1 if not processes else 16):
+                if res["status"] != "ok":
+                    problems.append(res)
+    if state_path:
+        save_cursor(state_path, next_cursor)
+    nbytes = sum(j[3] for j in jobs)
+    secs = time.time() - t0
+    return {
+        "ok": not problems,
+        "checked": len(jobs),
+        "total": len(entries),
+        "bytes": nbytes,
+        "seconds": round(secs, 3),
+        "mb_s": round(nbytes / 1e6 / secs, 1) if secs > 0 else None,
+        "cursor": next_cursor,
+        "mismatches": sorted(problems, key=lambda r: r["entry"]),
+    }
+
+def verify_path(manifest_path, base, key=None, **kw):
+    """Carga el manifest, valida el HMAC (si hay key) y hace la verificación profunda."""
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return {"ok": False, "error": "manifest not found"}
+    # leer el manifest desde su generación: las entradas se resuelven en esa misma generación
+    gen_root = generations.manifest_root(manifest_path)
+    m = manifest_bin.open_manifest(gen_root / manifest_path.name if gen_root else manifest_path)  # .json o .bin
+    if key:
+        valid = m.verify(key) if isinstance(m, manifest_bin.BinManifest) else hmac_ok(m, key)
+        if not valid:
+            return {"ok": False, "error": "hmac mismatch"}
+    kw.setdefault("state_path", manifest_path.parent / STATE_NAME)
+    return deep_verify(m, base, gen_root=gen_root, **kw)
+
+def env_options():
+    """Opciones de muestreo desde el entorno, usadas por los bucles de verificación."""
+    pct = os.environ.get("VERIFY_SAMPLE_PCT")
+    mb = os.environ.get("VERIFY_BUDGET_MB")
+    return {
+        "sample_pct": float(pct) if pct else None,
+        "budget_bytes": int(float(mb) * 1024 * 1024) if mb else None,
+        "workers": int(os.environ.get("VERIFY_WORKERS", DEFAULT_WORKERS)),
+        "processes": os.environ.get("VERIFY_PROCESSES", "false").lower() in ("1", "true", "yes"),
+    }
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Verificación profunda de rotated/ contra el manifest")
+    ap.add_argument("--manifest", default="rotated/manifest.json")
+    ap.add_argument("--base", default=".", help="directorio base de las rutas 'rotated' del manifest")
+    ap.add_argument("--sample", type=float, help="porcentaje de entradas a verificar en esta pasada")
+    ap.add_argument("--budget-mb", type=float, help="máximo de MB a leer en esta pasada")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--processes", action="store_true", help="usar pool de procesos en vez de threads")
+    ap.add_argument("--no-state", action="store_true", help="no leer/guardar el cursor de muestreo")
+    args = ap.parse_args(argv)
+    kw = dict(workers=args.workers, processes=args.processes, sample_pct=args.sample,
+              budget_bytes=int(args.budget_mb * 1024 * 1024) if args.budget_mb else None)
+    if args.no_state:
+        kw["state_path"] = None
+    report = verify_path(args.manifest, Path(args.base), key=os.environ.get("ROT_KEY"), **kw)
+    print(json.dumps(report, indent=2))
+    return 0 if report.get("ok") else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# fake_cloudns.py - API de monitorización ClouDNS falsa (en memoria) para pruebas locales
+# Uso: python3 fake_cloudns.py [puerto]  ->  CLOUDNS_API_ROOT=http://127.0.0.1:<puerto>/api/json/monitoring/
+from flask import Flask, request, jsonify
+import sys, time, threading
+
+app = Flask(__name__)
+AUTH = {"auth-id": "test", "auth-password": "test"}
+LATENCY = 0.0  # segundos de latencia simulada por petición
+
+_lock = threading.Lock()
+_monitors = {}
+_stats = {"requests": 0, "add": 0, "update": 0, "delete": 0, "list": 0}
+_next_id = [1]
+
+def _check_auth():
+    return all(request.form.get(k) == v for k, v in AUTH.items())
+
+def _params():
+    return {k: v for k, v in request.form.items() if k not in AUTH}
+
+@app.before_request
+def _count():
+    with _lock:
+        _stats["requests"] += 1
+    if LATENCY:
+        time.sleep(LATENCY)
+
+@app.route("/api/json/monitoring/<op>/", methods=["POST"])
+def monitoring(op):
+    if not _check_auth():
+        return jsonify({"status": "Failed", "statusDescription": "Invalid authentication"})
+    p = _params()
+    with _lock:
+        if op == "list-monitors":
+            _stats["list"] += 1
+            return jsonify({m["id"]: m for m in _monitors.values()})
+        if op == "add-monitor":
+            _stats["add"] += 1
+            mid = str(_next_id[0]); _next_id[0] += 1
+            p["id"] = mid
+            _monitors[mid] = p
+            return jsonify({"status": "Success", "statusDescription": "Monitor added", "id": mid})
+        mid = p.get("id")
+        if mid not in _monitors:
+            return jsonify({"status": "Failed", "statusDescription": "Monitor not found"})
+        if op == "update-monitor":
+            _stats["update"] += 1
+            _monitors[mid].update(p)
+            return jsonify({"status": "Success", "statusDescription": "Monitor updated"})
+        if op == "delete-monitor":
+            _stats["delete"] += 1
+            del _monitors[mid]
+            return jsonify({"status": "Success", "statusDescription": "Monitor deleted"})
+    return jsonify({"status": "Failed", "statusDescription": "Unknown operation"}), 404
+
+@app.route("/_stats")
+def stats():
+    with _lock:
+        return jsonify(dict(_stats, monitors=len(_monitors)))
+
+@app.route("/_reset", methods=["POST"])
+def reset():
+    with _lock:
+        _monitors.clear()
+        for k in _stats:
+            _stats[k] = 0
+    return jsonify({"ok": True})
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    app.run(host="127.0.0.1", port=port, threaded=True)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# fake_watched_api.py - API vigilada por Deimon.py, falsa (en memoria), para pruebas y medidas locales
+# Uso: python3 fake_watched_api.py [puerto]  ->  CONFIG["base_url"] = "http://127.0.0.1:<puerto>"
+# - /api/posts y /api/sentinel/check: colecciones con secuencia por registro; ?since=N devuelve solo
+#   lo posterior a N y la cabecera X-Cursor con la secuencia actual
+# - ETag en todos los endpoints (If-None-Match -> 304)
+# - /_config {"etag": bool, "cursor": bool}: apagarlos reproduce la API original (siempre todo)
+# - /_grow {"posts": n, "break": n}: añade posts y rompe la integridad de n registros del sentinel
+from flask import Flask, request, jsonify, make_response
+import sys, json, time, hashlib, threading
+from datetime import datetime
+
+app = Flask(__name__)
+LATENCY = 0.0  # segundos de latencia simulada por petición
+
+_lock = threading.Lock()
+_seq = [0]
+_posts = {}      # id -> (seq, post)
+_sentinel = {}   # id -> (seq, registro)
+_ia = {"modelo": "v1", "estado": "ok"}
+_governance = {"favor": 10, "contra": 3}
+_last = {"posts": 0, "sentinel": 0}  # secuencia del último cambio de cada colección (cursor)
+_config = {"etag": True, "cursor": True}
+_stats = {"requests": 0, "not_modified": 0, "bytes": 0, "records_sent": 0}
+
+def _touch(coll):
+    _seq[0] += 1
+    _last[coll] = _seq[0]
+    return _seq[0]
+
+def seed(posts=1000, records=500):
+    with _lock:
+        for i in range(records):
+            _sentinel[i] = (_touch("sentinel"), {"id": i, "nombre": "archivo-%d" % i, "integridad_valida": True,
+                                                 "sha256": hashlib.sha256(b"%d" % i).hexdigest()})
+        for i in range(posts):
+            _add_post()
+
+def _add_post():
+    pid = len(_posts) + 1
+    _posts[pid] = (_touch("posts"), {"id": pid, "autor": "user%d" % (pid % 50), "texto": "post %d " % pid * 4,
+                                     "fecha": "2020-01-01T00:00:00"})
+
+def _reply(obj, coll=None, records=None):
+    """JSON con ETag. En colecciones obj(lista) arma la respuesta con los registros de records
+    ({id: (seq, registro)}) posteriores a ?since= si el cursor está activo."""
+    since = request.args.get("since", type=int) if _config["cursor"] else None
+    cursor = _last[coll] if coll else None
+    # el ETag sale del cursor (o del objeto): un 304 no construye ni serializa la respuesta
+    etag = '"%s"' % hashlib.sha256(("%s|%s|%s" % (request.path, since, cursor if coll
+                                                  else json.dumps(obj, sort_keys=True))).encode()).hexdigest()[:32]
+    if _config["etag"] and request.headers.get("If-None-Match") == etag:
+        _stats["not_modified"] += 1
+        return make_response("", 304, {"ETag": etag})
+    if coll:
+        sel = sorted((t for t in records.values() if since is None or t[0] > since), key=lambda t: t[0])
+        obj = obj([r for _, r in sel])
+        _stats["records_sent"] += len(sel)
+    body = json.dumps(obj)
+    _stats["bytes"] += len(body)
+    headers = {"Content-Type": "application/json"}
+    if _config["etag"]:
+        headers["ETag"] = etag
+    if _config["cursor"] and coll:
+        headers["X-Cursor"] = str(cursor)
+    return make_response(body, 200, headers)
+
+@app.before_request
+def _count():
+    with _lock:
+        _stats["requests"] += 1
+    if LATENCY:
+        time.sleep(LATENCY)
+
+@app.route("/api/posts")
+def posts():
+    with _lock:
+        return _reply(lambda sel: sel, "posts", _posts)
+
+@app.route("/api/sentinel/check")
+def sentinel():
+    with _lock:
+        return _reply(lambda sel: {"ok": True, "resultado": sel}, "sentinel", _sentinel)
+
+@app.route("/api/ia")
+def ia():
+    with _lock:
+        return _reply(dict(_ia))
+
+@app.route("/api/governance/status")
+def governance():
+    with _lock:
+        return _reply(dict(_governance))
+
+@app.route("/_grow", methods=["POST"])
+def grow():
+    p = request.get_json(silent=True) or {}
+    now = datetime.utcnow().isoformat()
+    with _lock:
+        for _ in range(int(p.get("posts", 0))):
+            _add_post()
+            _posts[len(_posts)][1]["fecha"] = now
+        broken = [i for i, (_, r) in _sentinel.items() if r["integridad_valida"]][:int(p.get("break", 0))]
+        for i in broken:
+            _sentinel[i] = (_touch("sentinel"), dict(_sentinel[i][1], integridad_valida=False))
+        if p.get("votes"):
+            _governance["favor"] += int(p["votes"])
+    return jsonify({"ok": True, "posts": len(_posts), "broken": broken})
+
+@app.route("/_config", methods=["POST"])
+def config():
+    with _lock:
+        _config.update({k: bool(v) for k, v in (request.get_json(silent=True) or {}).items() if k in _config})
+        return jsonify(_config)
+
+@app.route("/_stats")
+def stats():
+    with _lock:
+        return jsonify(dict(_stats, posts=len(_posts), sentinel=len(_sentinel)))
+
+@app.route("/_reset", methods=["POST"])
+def reset():
+    with _lock:
+        for k in _stats:
+            _stats[k] = 0
+    return jsonify({"ok": True})
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    seed()
+    app.run(host="127.0.0.1", port=port, threaded=True)
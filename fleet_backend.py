@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+# fleet_backend.py
+"""
+Backend de ingesta de la flota de agentes (62827.py)
+- POST /api/agent/report: el reporte se encola y responde 202 al instante; un único hilo escritor
+  junta hasta FLEET_BATCH reportes (o FLEET_FLUSH_MS) y los escribe en una sola transacción
+  Dentro de un lote solo cuenta el último reporte de cada host
+- SQLite en WAL (como credential_store.py), rutas internadas (path_id) y sha512 como BLOB
+- Último estado por (host, path): se lee el estado del host (rango de la clave primaria) y solo se
+  escriben las filas cuyo hash cambió; si el reporte entero es igual al anterior (digest BLAKE2b)
+  solo se actualiza last_seen
+  Un archivo que deja de aparecer queda con sha512 NULL (borrado) y su hora de cambio; uno que llega
+  como PENDING (aplazado por el presupuesto de E/S del agente, aún sin hash) conserva su estado
+  Cada reporte va en su propio SAVEPOINT: si uno falla solo se pierde ese, no el lote
+  Las rutas no UTF-8 (surrogates sueltos de os.fsdecode en el agente) se guardan como \\xNN
+- Consultas por índice:
+    * divergent(path): hosts cuyo hash difiere del golden (tabla golden, o el mayoritario si no hay)
+    * changes(host, since): qué cambió en el host desde T (hora del servidor al ingerir)
+- Cola de comandos: POST /api/fleet/commands (admin) -> GET /api/agent/commands?host= los entrega una vez
+- Golden desde un manifest de rotate_service.py (src_sha512, HMAC con ROT_KEY): golden --manifest
+Uso: fleet_backend.py serve [--port 8000] | query divergent PATH | query changes HOST [--since T]
+     | golden --manifest rotated/manifest.json --root /opt/star-tigo-defensa/source | command HOST ACTION
+Carga simulada: bench_fleet.py
+"""
+import os, sys, json, time, queue, hashlib, sqlite3, threading
+import metrics
+
+FLEET_DB = os.environ.get("FLEET_DB", "fleet.db")
+FLEET_PORT = int(os.environ.get("FLEET_PORT", 8000))
+FLEET_BATCH = int(os.environ.get("FLEET_BATCH", 200))             # reportes por transacción
+FLEET_FLUSH_MS = int(os.environ.get("FLEET_FLUSH_MS", 200))       # espera máxima para llenar un lote
+FLEET_MAX_PENDING = int(os.environ.get("FLEET_MAX_PENDING", 5000))  # reportes encolados antes de 503
+FLEET_MAX_BODY = int(os.environ.get("FLEET_MAX_BODY", 64 << 20))
+FLEET_ADMIN_TOKEN = os.environ.get("FLEET_ADMIN_TOKEN")           # sin token: admin solo desde localhost
+ACTIONS = ("scan", "repair-request")                              # lo único que el agente entiende
+PENDING = "pending"                                               # hash_engine.PENDING: archivo aún sin hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    host_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    os TEXT,
+    last_seen INTEGER,
+    last_change INTEGER,
+    files INTEGER DEFAULT 0,
+    digest BLOB
+);
+CREATE TABLE IF NOT EXISTS paths (
+    path_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    host_id INTEGER NOT NULL,
+    path_id INTEGER NOT NULL,
+    sha512 BLOB,
+    changed INTEGER NOT NULL,
+    PRIMARY KEY (host_id, path_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS state_path ON state(path_id, sha512);
+CREATE INDEX IF NOT EXISTS state_changed ON state(host_id, changed);
+CREATE TABLE IF NOT EXISTS golden (
+    path_id INTEGER PRIMARY KEY,
+    sha512 BLOB NOT NULL,
+    set_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    action TEXT NOT NULL,
+    created INTEGER NOT NULL,
+    delivered INTEGER
+);
+CREATE INDEX IF NOT EXISTS commands_pending ON commands(host, delivered);
+CREATE TABLE IF NOT EXISTS repair_requests (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    ts INTEGER NOT NULL
+);
+"""
+
+UPSERT = ("INSERT INTO state(host_id, path_id, sha512, changed) VALUES (?,?,?,?) "
+          "ON CONFLICT(host_id, path_id) DO UPDATE SET sha512=excluded.sha512, changed=excluded.changed "
+          "WHERE state.sha512 IS NOT excluded.sha512")
+
+def report_digest(files: dict) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for p in sorted(files):
+        h.update(p.encode("utf-8", "surrogatepass") + b"\0" + str(files[p]).encode("ascii", "replace") + b"\n")
+    return h.digest()
+
+def clean_text(s: str) -> str:
+    """Texto que SQLite acepta (UTF-8 válido). Un nombre no UTF-8 de Linux llega del agente, tras
+    str(Path) y json, con surrogates sueltos (surrogateescape): sus bytes se escriben como \\xNN."""
+    try:
+        s.encode("utf-8")
+        return s
+    except UnicodeEncodeError:
+        try:
+            return s.encode("utf-8", "surrogateescape").decode("utf-8", "backslashreplace")
+        except UnicodeEncodeError:
+            return s.encode("utf-8", "backslashreplace").decode("utf-8")
+
+def _hex(b):
+    return b.hex() if b is not None else None
+
+class FleetStore:
+    def __init__(self, path=FLEET_DB):
+        self.path = path
+        self._local = threading.local()  # una conexión por thread
+        self._paths = {}                 # path -> path_id (solo crece; lo comparten todos los threads)
+        self._hosts = {}                 # name -> host_id
+        self._lock = threading.Lock()
+        db = self._db()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA temp_store=MEMORY")
+            self._local.db = db
+        return db
+
+    # ---------- internado ----------
+    def path_ids(self, db, paths, create=True):
+        missing = [p for p in paths if p not in self._paths]
+        if missing:
+            if create:
+                db.executemany("INSERT OR IGNORE INTO paths(path) VALUES (?)", ((p,) for p in missing))
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                rows = db.execute("SELECT path, path_id FROM paths WHERE path IN (%s)" % ",".join("?" * len(chunk)),
+                                  chunk).fetchall()
+                with self._lock:
+                    self._paths.update(rows)
+        return [self._paths.get(p) for p in paths]
+
+    def host_id(self, db, name, create=True):
+        hid = self._hosts.get(name)
+        if hid is None:
+            if create:
+                db.execute("INSERT OR IGNORE INTO hosts(name) VALUES (?)", (name,))
+            row = db.execute("SELECT host_id FROM hosts WHERE name=?", (name,)).fetchone()
+            if row is None:
+                return None
+            hid = self._hosts[name] = row[0]
+        return hid
+
+    # ---------- ingesta ----------
+    def ingest(self, reports, now=None):
+        """Escribe una lista de reportes {host, os, files} en una transacción (un SAVEPOINT por reporte:
+        el que falla se descarta solo); devuelve estadísticas."""
+        now = int(now or time.time())
+        db = self._db()
+        stats = {"reports": 0, "unchanged": 0, "rows": 0, "changed": 0, "deleted": 0, "bad": 0, "failed": 0}
+        try:
+            with db:
+                db.execute("BEGIN")
+                for r in reports:
+                    db.execute("SAVEPOINT report")
+                    try:
+                        self._ingest_one(db, r, now, stats)
+                    except Exception as e:
+                        db.execute("ROLLBACK TO report")
+                        self._forget_ids()
+                        stats["failed"] += 1
+                        print("[fleet] reporte descartado (host %r): %s" % (r.get("host"), e), file=sys.stderr)
+                    else:
+                        stats["reports"] += 1
+                    db.execute("RELEASE report")
+        except Exception:
+            self._forget_ids()
+            raise
+        return stats
+
+    def _forget_ids(self):
+        # un rollback puede deshacer inserts de hosts/paths ya internados: se vuelven a leer de la base
+        with self._lock:
+            self._paths.clear()
+            self._hosts.clear()
+
+    def _ingest_one(self, db, r, now, stats):
+        files = r.get("files") or {}
+        if not isinstance(r.get("host"), str) or not r["host"] or not isinstance(files, dict):
+            raise ValueError("reporte inválido")
+        host, os_name = clean_text(r["host"]), r.get("os")
+        os_name = clean_text(os_name) if isinstance(os_name, str) else None
+        try:
+            "\0".join(files).encode("utf-8")  # lo normal: todo UTF-8 válido, sin copiar el dict
+        except UnicodeEncodeError:
+            files = {clean_text(p): h for p, h in files.items()}
+        hid = self.host_id(db, host)
+        digest = report_digest(files)
+        row = db.execute("SELECT digest FROM hosts WHERE host_id=?", (hid,)).fetchone()
+        if row and row[0] == digest:
+            db.execute("UPDATE hosts SET last_seen=?, os=? WHERE host_id=?", (now, os_name, hid))
+            stats["unchanged"] += 1
+            return
+        paths = list(files)
+        ids = self.path_ids(db, paths)
+        # estado actual del host en un solo recorrido de su rango de la clave primaria:
+        # se escriben solo las filas cuyo hash cambió y se detectan los borrados
+        current = dict(db.execute("SELECT path_id, sha512 FROM state WHERE host_id=?", (hid,)))
+        rows, n = [], 0
+        for p, pid in zip(paths, ids):
+            if files[p] == PENDING:
+                current.pop(pid, None)  # sigue presente; el hash llega en un próximo reporte
+                n += 1
+                continue
+            try:
+                h = bytes.fromhex(files[p])
+            except (TypeError, ValueError):
+                stats["bad"] += 1
+                continue
+            n += 1
+            if current.pop(pid, None) != h:
+                rows.append((hid, pid, h, now))
+        # lo que queda en current ya no lo reporta el host
+        gone = [(now, hid, pid) for pid, h in current.items() if h is not None]
+        if rows:
+            db.executemany(UPSERT, rows)
+        if gone:
+            db.executemany("UPDATE state SET sha512=NULL, changed=? WHERE host_id=? AND path_id=?", gone)
+        db.execute("UPDATE hosts SET last_seen=?, os=?, files=?, digest=?, "
+                   "last_change=CASE WHEN ? THEN ? ELSE last_change END WHERE host_id=?",
+                   (now, os_name, n, digest, bool(rows or gone), now, hid))
+        stats["rows"] += n
+        stats["changed"] += len(rows)
+        stats["deleted"] += len(gone)
+
+    # ---------- consultas ----------
+    def golden(self, path_id):
+        """(sha512, origen): el de la tabla golden o, si no hay, el hash mayoritario de la flota."""
+        db = self._db()
+        row = db.execute("SELECT sha512 FROM golden WHERE path_id=?", (path_id,)).fetchone()
+        if row:
+            return row[0], "golden"
+        row = db.execute("SELECT sha512, COUNT(*) c FROM state WHERE path_id=? AND sha512 IS NOT NULL "
+                         "GROUP BY sha512 ORDER BY c DESC LIMIT 1", (path_id,)).fetchone()
+        return (row[0], "majority") if row else (None, None)
+
+    def divergent(self, path, limit=1000):
+        db = self._db()
+        pid = self.path_ids(db, [path], create=False)[0]
+        if pid is None:
+            return None
+        gold, source = self.golden(pid)
+        rows = db.execute("SELECT h.name, s.sha512, s.changed FROM state s JOIN hosts h ON h.host_id=s.host_id "
+                          "WHERE s.path_id=? AND s.sha512 IS NOT ? ORDER BY s.changed DESC LIMIT ?",
+                          (pid, gold, limit)).fetchall()
+        total = db.execute("SELECT COUNT(*) FROM state WHERE path_id=?", (pid,)).fetchone()[0]
+        return {"path": path, "golden": _hex(gold), "source": source, "hosts_with_path": total,
+                "divergent": [{"host": h, "sha512": _hex(s), "changed": c} for h, s, c in rows]}
+
+    def changes(self, host, since=0, limit=10000):
+        db = self._db()
+        hid = self.host_id(db, host, create=False)
+        if hid is None:
+            return None
+        rows = db.execute("SELECT p.path, s.sha512, s.changed FROM state s JOIN paths p ON p.path_id=s.path_id "
+                          "WHERE s.host_id=? AND s.changed>=? ORDER BY s.changed LIMIT ?",
+                          (hid, int(since), limit)).fetchall()
+        return {"host": host, "since": int(since),
+                "changes": [{"path": p, "sha512": _hex(s), "changed": c} for p, s, c in rows]}
+
+    def hosts(self, stale_after=None):
+        rows = self._db().execute("SELECT name, os, last_seen, last_change, files FROM hosts ORDER BY name").fetchall()
+        now = time.time()
+        return [{"host": n, "os": o, "last_seen": ls, "last_change": lc, "files": f,
+                 "stale": bool(stale_after and ls and now - ls > stale_after)} for n, o, ls, lc, f in rows]
+
+    def set_golden(self, hashes: dict):
+        """{path: sha512 hex}; devuelve cuántos se guardaron."""
+        db = self._db()
+        now = int(time.time())
+        with db:
+            paths = list(hashes)
+            ids = self.path_ids(db, paths)
+            db.executemany("INSERT OR REPLACE INTO golden(path_id, sha512, set_at) VALUES (?,?,?)",
+                           ((pid, bytes.fromhex(hashes[p]), now) for p, pid in zip(paths, ids)))
+        return len(paths)
+
+    # ---------- comandos ----------
+    def add_command(self, host, action):
+        if action not in ACTIONS:
+            raise ValueError("acción no permitida: %r" % action)
+        db = self._db()
+        with db:
+            cur = db.execute("INSERT INTO commands(host, action, created) VALUES (?,?,?)",
+                             (host, action, int(time.time())))
+        return cur.lastrowid
+
+    def pop_commands(self, host):
+        """Comandos pendientes del host; se marcan entregados en la misma transacción (una sola entrega)."""
+        db = self._db()
+        with db:
+            rows = db.execute("SELECT id, action, created FROM commands WHERE host=? AND delivered IS NULL ORDER BY id",
+                              (host,)).fetchall()
+            if rows:
+                db.executemany("UPDATE commands SET delivered=? WHERE id=?",
+                               ((int(time.time()), i) for i, _, _ in rows))
+        return [{"id": i, "action": a, "created": c} for i, a, c in rows]
+
+    def repair_request(self, host):
+        db = self._db()
+        with db:
+            db.execute("INSERT INTO repair_requests(host, ts) VALUES (?,?)", (host, int(time.time())))
+
+class Ingestor:
+    """Cola acotada + hilo escritor que agrupa reportes en lotes."""
+    def __init__(self, store, batch=FLEET_BATCH, flush_ms=FLEET_FLUSH_MS, max_pending=FLEET_MAX_PENDING):
+        self.store, self.batch, self.flush = store, batch, flush_ms / 1000.0
+        self.q = queue.Queue(max_pending)
+        self.totals = {"reports": 0, "unchanged": 0, "rows": 0, "changed": 0, "deleted": 0, "bad": 0, "failed": 0,
+                       "batches": 0, "coalesced": 0, "rejected": 0}
+        self._idle = threading.Condition()
+        self._busy = 0
+        self._thread = threading.Thread(target=self._run, name="fleet-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, report):
+        """Encola; lanza queue.Full si el escritor no da abasto (el agente reintenta en el próximo ciclo)."""
+        with self._idle:
+            self._busy += 1
+        try:
+            self.q.put_nowait(report)
+        except queue.Full:
+            with self._idle:
+                self._busy -= 1
+            self.totals["rejected"] += 1
+            raise
+
+    def _run(self):
+        while True:
+            items = [self.q.get()]
+            deadline = time.time() + self.flush
+            while len(items) < self.batch:
+                try:
+                    items.append(self.q.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            # dentro del lote, el último reporte de cada host sustituye a los anteriores
+            latest = {}
+            for r in items:
+                latest[r["host"]] = r
+            try:
+                with metrics.timer("fleet_ingest"):
+                    st = self.store.ingest(list(latest.values()))
+                for k, v in st.items():
+                    self.totals[k] += v
+                self.totals["batches"] += 1
+                self.totals["coalesced"] += len(items) - len(latest)
+                metrics.add_files("fleet_ingest", st["rows"])
+            except Exception as e:
+                print("[fleet] ingest error:", e, file=sys.stderr)
+            with self._idle:
+                self._busy -= len(items)
+                self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """Espera a que todo lo encolado esté escrito."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._busy == 0, timeout)
+
+def serve(port=FLEET_PORT, addr="0.0.0.0", store=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+    store = store or FleetStore()
+    ingestor = Ingestor(store)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, obj, headers=None):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            n = int(self.headers.get("Content-Length", 0))
+            if n > FLEET_MAX_BODY:
+                raise ValueError("body demasiado grande")
+            body = self.rfile.read(n)
+            if self.headers.get("Content-Encoding") == "gzip":
+                import gzip
+                body = gzip.decompress(body)
+            return json.loads(body)
+
+        def _admin(self):
+            if FLEET_ADMIN_TOKEN:
+                import hmac
+                return hmac.compare_digest(self.headers.get("X-Fleet-Token", ""), FLEET_ADMIN_TOKEN)
+            return self.client_address[0] in ("127.0.0.1", "::1")
+
+        def do_GET(self):
+            u = urlsplit(self.path)
+            q = {k: v[0] for k, v in parse_qs(u.query).items()}
+            t0 = time.perf_counter()
+            if u.path == "/health":
+                return self._reply(200, {"ok": True, "pending": ingestor.q.qsize(), "totals": ingestor.totals})
+            if u.path == "/metrics":
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                return self.wfile.write(body)
+            if u.path == "/api/agent/commands":
+                if not q.get("host"):
+                    return self._reply(400, {"ok": False, "error": "host requerido"})
+                return self._reply(200, {"commands": store.pop_commands(q["host"])})
+            if u.path == "/api/fleet/divergent":
+                res = store.divergent(q.get("path", ""), int(q.get("limit", 1000)))
+            elif u.path == "/api/fleet/changes":
+                res = store.changes(q.get("host", ""), int(q.get("since", 0)), int(q.get("limit", 10000)))
+            elif u.path == "/api/fleet/hosts":
+                res = {"hosts": store.hosts(int(q["stale_after"]) if q.get("stale_after") else None)}
+            else:
+                return self._reply(404, {"ok": False})
+            if res is None:
+                return self._reply(404, {"ok": False, "error": "no encontrado"})
+            res["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            self._reply(200, res)
+
+        def do_POST(self):
+            u = urlsplit(self.path)
+            try:
+                data = self._body()
+            except (ValueError, OSError) as e:
+                return self._reply(400, {"ok": False, "error": str(e)})
+            if u.path == "/api/agent/report":
+                if not isinstance(data, dict) or not isinstance(data.get("host"), str) \
+                        or not isinstance(data.get("files", {}), dict):
+                    return self._reply(400, {"ok": False, "error": "reporte inválido"})
+                try:
+                    ingestor.submit({"host": data["host"], "os": data.get("os"), "files": data.get("files") or {}})
+                except queue.Full:
+                    return self._reply(503, {"ok": False, "error": "cola llena"}, {"Retry-After": "30"})
+                return self._reply(202, {"ok": True, "queued": ingestor.q.qsize()})
+            if u.path == "/api/agent/repair_request":
+                if not isinstance(data, dict) or not data.get("host"):
+                    return self._reply(400, {"ok": False, "error": "host requerido"})
+                store.repair_request(data["host"])
+                return self._reply(200, {"ok": True})
+            if u.path in ("/api/fleet/commands", "/api/fleet/golden"):
+                if not self._admin():
+                    return self._reply(403, {"ok": False, "error": "forbidden"})
+                try:
+                    if u.path == "/api/fleet/commands":
+                        return self._reply(200, {"ok": True, "id": store.add_command(data["host"], data["action"])})
+                    return self._reply(200, {"ok": True, "stored": store.set_golden(data["golden"])})
+                except (KeyError, TypeError, ValueError) as e:
+                    return self._reply(400, {"ok": False, "error": str(e)})
+            self._reply(404, {"ok": False})
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer((addr, int(port)), Handler)
+    srv.ingestor = ingestor
+    return srv
+
+def golden_from_manifest(manifest_path, root, key=None):
+    """{ruta absoluta en el agente: src_sha512} de un manifest firmado de rotate_service.py."""
+    import hmac
+    key = key or os.environ.get("ROT_KEY")
+    if not key:
+        raise RuntimeError("define ROT_KEY en entorno")
+    with open(manifest_path, encoding="utf-8") as f:
+        m = json.load(f)
+    h = m.pop("hmac", None)
+    calc = hmac.new(key.encode("utf-8"), json.dumps(m, sort_keys=True).encode("utf-8"), hashlib.sha512).hexdigest()
+    if not h or not hmac.compare_digest(calc, h):
+        raise ValueError("HMAC del manifest inválido")
+    return {os.path.join(root, rel): e["src_sha512"] for rel, e in m["entries"].items() if e.get("src_sha512")}
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Backend de ingesta de reportes de agentes")
+    ap.add_argument("--db", default=FLEET_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("--port", type=int, default=FLEET_PORT)
+    q = sub.add_parser("query")
+    q.add_argument("kind", choices=("divergent", "changes", "hosts"))
+    q.add_argument("target", nargs="?", default="")
+    q.add_argument("--since", type=int, default=0)
+    g = sub.add_parser("golden")
+    g.add_argument("--manifest", required=True)
+    g.add_argument("--root", default="/opt/star-tigo-defensa/source")
+    c = sub.add_parser("command")
+    c.add_argument("host")
+    c.add_argument("action", choices=ACTIONS)
+    args = ap.parse_args(argv)
+
+    store = FleetStore(args.db)
+    if args.cmd == "serve":
+        metrics.init("fleet")
+        srv = serve(args.port, store=store)
+        print("[fleet] listening on", args.port, "db", args.db)
+        srv.serve_forever()
+        return 0
+    if args.cmd == "query":
+        t0 = time.perf_counter()
+        if args.kind == "divergent":
+            res = store.divergent(args.target)
+        elif args.kind == "changes":
+            res = store.changes(args.target, args.since)
+        else:
+            res = {"hosts": store.hosts()}
+        if res is None:
+            print("no encontrado:", args.target, file=sys.stderr)
+            return 1
+        res["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        print(json.dumps(res, indent=1))
+        return 0
+    if args.cmd == "golden":
+        try:
+            hashes = golden_from_manifest(args.manifest, args.root)
+        except (RuntimeError, ValueError, OSError) as e:
+            print("ERROR:", e, file=sys.stderr)
+            return 2
+        print(json.dumps({"stored": store.set_golden(hashes)}))
+        return 0
+    print(json.dumps({"id": store.add_command(args.host, args.action)}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# generations.py
+"""
+Generaciones de rotated/ con doble buffer (rotate_service.py, shard_rotate.py)
+- Cada ciclo escribe en rotated/gen-<ts>/; los archivos sin cambios se enlazan (hardlink)
+  desde la generación anterior en vez de reescribirse
+- publish(): un único os.replace del symlink rotated/current publica la generación entera;
+  rotated/manifest.json, manifest.merkle.json y manifest.bin son symlinks fijos a current/ (solo
+  los que existen en la generación publicada; los que dejan de existir se borran)
+- Las entradas del manifest son estables (rotated/<rel>, como en el árbol publicado en git): entre
+  generaciones iguales el manifest no cambia. Se resuelven con entry_path() dentro de la generación
+  del manifest leído (manifest_root() sigue el symlink): quien leyó un manifest lee siempre los
+  archivos de esa misma generación (snapshot consistente)
+- .index.json de cada generación: modo/param/seed y, por archivo, stat del origen y del rotado,
+  sha512, binary y sha512 del origen; es lo que decide si un archivo se puede enlazar
+- gc(): borra las generaciones antiguas (conserva ROT_KEEP_GENERATIONS, nunca una más joven
+  que ROT_GEN_MIN_AGE segundos, para no dejar sin archivos a un lector lento)
+"""
+import os, json, time, shutil
+from functools import lru_cache
+from pathlib import Path
+
+PREFIX = "gen-"
+CURRENT = "current"
+INDEX = ".index.json"
+MANIFEST_NAMES = ("manifest.json", "manifest.merkle.json", "manifest.bin")
+ROT_KEEP_GENERATIONS = int(os.environ.get("ROT_KEEP_GENERATIONS", 3))
+ROT_GEN_MIN_AGE = int(os.environ.get("ROT_GEN_MIN_AGE", 600))
+
+def _ts(p: Path) -> int:
+    try:
+        return int(p.name[len(PREFIX):])
+    except ValueError:
+        return -1
+
+def generations(rotated):
+    """Generaciones existentes, de la más antigua a la más nueva."""
+    rotated = Path(rotated)
+    if not rotated.is_dir():
+        return []
+    return sorted((p for p in rotated.iterdir() if p.name.startswith(PREFIX) and p.is_dir()
+                   and not p.is_symlink() and _ts(p) >= 0), key=_ts)
+
+def current(rotated):
+    link = Path(rotated) / CURRENT
+    if not link.is_symlink():
+        return None
+    gen = Path(rotated) / os.readlink(link)
+    return gen if gen.is_dir() else None
+
+def manifest_root(manifest_path):
+    """Generación a la que pertenece un manifest (rotated/manifest.json -> current/ -> gen-<ts>/),
+    o None sin generaciones."""
+    real = Path(os.path.realpath(manifest_path))
+    return real.parent if real.parent.name.startswith(PREFIX) else None
+
+def entry_path(base, rotated: str, gen_root=None) -> Path:
+    """Archivo en disco de la entrada "rotated" de un manifest: rotated/<rel> se busca en gen_root
+    si hay generaciones; los manifests antiguos (rotated/gen-<ts>/<rel>) se resuelven tal cual."""
+    parts = Path(rotated).parts
+    if gen_root is not None and len(parts) > 1 and not parts[1].startswith(PREFIX):
+        return Path(gen_root).joinpath(*parts[1:])
+    return Path(base) / rotated
+
+def new_generation(rotated) -> Path:
+    # nombres crecientes aunque haya dos ciclos en el mismo segundo
+    last = max((_ts(g) for g in generations(rotated)), default=0)
+    gen = Path(rotated) / ("%s%d" % (PREFIX, max(int(time.time()), last + 1)))
+    gen.mkdir(parents=True)
+    return gen
+
+@lru_cache(maxsize=4)
+def _load_index(path: str, mtime_ns: int):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_index(gen):
+    """Índice de una generación publicada (cacheado mientras no cambie) o None."""
+    if gen is None:
+        return None
+    p = Path(gen) / INDEX
+    try:
+        return _load_index(str(p), p.stat().st_mtime_ns)
+    except (OSError, ValueError):
+        return None
+
+def write_index(gen, mode: str, param: int, seed: str, files: dict):
+    p = Path(gen) / INDEX
+    tmp = p.with_name(".%s.%d.tmp" % (p.name, os.getpid()))
+    tmp.write_text(json.dumps({"mode": mode, "param": param, "seed": seed, "files": files}), encoding="utf-8")
+    os.replace(tmp, p)
+
+def reusable(gen, mode: str, param: int, seed: str):
+    """Índice de `gen` si su contenido rotado vale para este ciclo: mismo modo y param
+    (en perm la tabla depende de la seed, que cambia en cada ciclo, así que no se reutiliza)."""
+    idx = load_index(gen)
+    if idx and idx["mode"] == mode and idx["param"] == param and (mode != "perm" or idx["seed"] == seed):
+        return {"dir": Path(gen), "files": idx["files"]}
+    return None
+
+def try_link(prev, rel: str, src_st, dst: Path):
+    """Enlaza prev/rel en dst si el origen no cambió y el rotado anterior sigue intacto (dst puede
+    existir ya, p. ej. un shard reasignado tras morir su worker: se reemplaza, no falla).
+    Devuelve la entrada del índice reutilizada o None."""
+    old = prev["files"].get(rel) if prev else None
+    if not old or len(old) < 7 or old[0] != src_st.st_mtime_ns or old[1] != src_st.st_size:
+        return None
+    src = prev["dir"] / rel
+    try:
+        st = src.stat()
+        if (st.st_mtime_ns, st.st_size) != (old[4], old[5]):
+            return None  # el rotado anterior se modificó: se vuelve a rotar
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(".%s.%d.tmp" % (dst.name, os.getpid()))
+        if tmp.is_symlink() or tmp.exists():
+            tmp.unlink()
+        os.link(src, tmp)
+        os.replace(tmp, dst)
+    except OSError:
+        return None  # sin hardlinks (otro FS) o el anterior ya no existe
+    return old
+
+def index_entry(src_st, dst: Path, digest: str, binary: bool, src_digest: str):
+    st = dst.stat()
+    return [src_st.st_mtime_ns, src_st.st_size, digest, bool(binary), st.st_mtime_ns, st.st_size, src_digest]
+
+def _symlink(target: str, path: Path):
+    tmp = path.with_name(".%s.%d.tmp" % (path.name, os.getpid()))
+    if tmp.is_symlink() or tmp.exists():
+        tmp.unlink()
+    os.symlink(target, tmp)
+    os.replace(tmp, path)  # atómico: el lector ve la generación anterior o la nueva, nunca una mezcla
+
+def publish(rotated, gen):
+    rotated, gen = Path(rotated), Path(gen)
+    _symlink(gen.name, rotated / CURRENT)
+    for name in MANIFEST_NAMES:
+        p = rotated / name
+        target = CURRENT + "/" + name
+        if (gen / name).exists():
+            if not (p.is_symlink() and os.readlink(p) == target):
+                _symlink(target, p)
+        elif p.is_symlink() or p.exists():
+            # p. ej. ROT_MANIFEST_BIN desactivado: sin link colgando ni manifest de otro ciclo
+            p.unlink()
+
+def gc(rotated, keep: int = ROT_KEEP_GENERATIONS, min_age: int = ROT_GEN_MIN_AGE):
+    """Borra generaciones anteriores a la actual salvo las keep-1 más recientes y las jóvenes.
+    Las posteriores a la actual (un ciclo en curso) no se tocan."""
+    cur = current(rotated)
+    if cur is None:
+        return []
+    gens = [g for g in generations(rotated) if _ts(g) <= _ts(cur)]
+    older = gens[:-1]
+    now = time.time()
+    removed = []
+    for i, g in enumerate(older[:max(0, len(older) - max(0, keep - 1))]):
+        # dejó de ser la actual cuando se escribió la siguiente
+        if now - gens[i + 1].stat().st_mtime < min_age:
+            continue
+        shutil.rmtree(g, ignore_errors=True)
+        removed.append(g.name)
+    return removed
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# git_publish.py
+"""
+Publicación de rotaciones en git sin tocar el working tree
+- El commit se arma con plumbing: hash-object (solo archivos cambiados), un índice temporal
+  (GIT_INDEX_FILE), write-tree y commit-tree; la rama se crea con update-ref
+- Reusa los blobs de archivos sin cambios (caché por inodo + tamaño+mtime en .git/rot-publish-cache.json):
+  los archivos enlazados entre generaciones (rotated/gen-<ts>/) aciertan aunque cambie la ruta
+- Las ramas quedan pendientes en .git/rot-pending y se empujan juntas en un solo `git push`
+- Los archivos ocultos de rotated/ (locks, estado, temporales) no se publican
+Uso: git_publish.py commit <repo> <rotated_dir> <branch> [mensaje] | push <repo> [remote]
+"""
+import os, sys, json, fcntl, tempfile, subprocess
+from pathlib import Path
+from contextlib import contextmanager
+
+CACHE_NAME = "rot-publish-cache.json"
+PENDING_NAME = "rot-pending"
+LOCK_NAME = "rot-publish.lock"
+
+def _git(repo, *args, input=None, env=None):
+    e = dict(os.environ)
+    if env:
+        e.update(env)
+    r = subprocess.run(["git", *args], cwd=str(repo), input=input, env=e,
+                       capture_output=True, text=True)
+    if r.returncode != 0:
+        raise subprocess.CalledProcessError(r.returncode, ["git", *args], r.stdout, r.stderr)
+    return r.stdout
+
+def git_dir(repo) -> Path:
+    return Path(repo, _git(repo, "rev-parse", "--git-dir").strip()).resolve()
+
+@contextmanager
+def _locked(gdir: Path):
+    with open(gdir / LOCK_NAME, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def _walk(root: Path):
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if not name.startswith("."):
+                yield Path(dirpath) / name
+
+def _load_cache(gdir: Path):
+    try:
+        return json.loads((gdir / CACHE_NAME).read_text())
+    except Exception:
+        return {}
+
+def _save_cache(gdir: Path, cache: dict):
+    tmp = gdir / (CACHE_NAME + ".tmp")
+    tmp.write_text(json.dumps(cache))
+    os.replace(tmp, gdir / CACHE_NAME)
+
+def hash_files(repo, gdir: Path, files):
+    """{path_en_repo: (mode, blob)}; solo se pasa por hash-object lo que cambió desde la última vez.
+    La caché va por (dev, ino), no por ruta: cada generación es un directorio nuevo, pero lo que no
+    cambió es el mismo inodo (hardlink) con el mismo tamaño y mtime."""
+    cache = _load_cache(gdir)
+    out, todo, live = {}, [], set()
+    for abspath, rel in files:
+        st = abspath.stat()
+        mode = "100755" if st.st_mode & 0o111 else "100644"
+        key = "%d:%d" % (st.st_dev, st.st_ino)
+        live.add(key)
+        sig = [st.st_size, st.st_mtime_ns]
+        hit = cache.get(key)
+        if hit and hit[:2] == sig:
+            out[rel] = (mode, hit[2])
+        else:
+            todo.append((abspath, rel, mode, sig, key))
+    if todo:
+        blobs = _git(repo, "hash-object", "-w", "--stdin-paths",
+                     input="".join(str(t[0]) + "\n" for t in todo)).split()
+        for (abspath, rel, mode, sig, key), blob in zip(todo, blobs):
+            out[rel] = (mode, blob)
+            cache[key] = sig + [blob]
+    _save_cache(gdir, {k: v for k, v in cache.items() if k in live})
+    return out, len(todo)
+
+def commit_rotation(repo, rotated_dir, branch: str, message: str, parent: str = "HEAD", prefix: str = None):
+    """Crea refs/heads/<branch> = parent + contenido de rotated_dir bajo `prefix`; no toca el worktree."""
+    repo = Path(repo).resolve()
+    rotated_dir = Path(rotated_dir).resolve()
+    gdir = git_dir(repo)
+    if prefix is None:
+        prefix = rotated_dir.relative_to(repo).as_posix()
+    files = [(p, prefix + "/" + p.relative_to(rotated_dir).as_posix()) for p in _walk(rotated_dir)]
+    with _locked(gdir):
+        blobs, hashed = hash_files(repo, gdir, files)
+        fd, index = tempfile.mkstemp(dir=str(gdir), prefix="rot-index-")
+        os.close(fd)
+        os.unlink(index)  # git crea el índice desde cero
+        env = {"GIT_INDEX_FILE": index}
+        try:
+            try:
+                parent_sha = _git(repo, "rev-parse", "--verify", "-q", parent + "^{commit}").strip()
+            except subprocess.CalledProcessError:
+                parent_sha = None
+            if parent_sha:
+                _git(repo, "read-tree", parent_sha, env=env)
+                _git(repo, "rm", "--cached", "-r", "-q", "--ignore-unmatch", "--", prefix, env=env)
+            info = "".join("%s %s\t%s\n" % (mode, blob, rel) for rel, (mode, blob) in sorted(blobs.items()))
+            _git(repo, "update-index", "--add", "--index-info", input=info, env=env)
+            tree = _git(repo, "write-tree", env=env).strip()
+        finally:
+            if os.path.exists(index):
+                os.unlink(index)
+        args = ["commit-tree", tree, "-m", message]
+        if parent_sha:
+            args[2:2] = ["-p", parent_sha]
+        commit = _git(repo, *args).strip()
+        _git(repo, "update-ref", "refs/heads/" + branch, commit)
+        with open(gdir / PENDING_NAME, "a") as f:
+            f.write(branch + "\n")
+    return {"branch": branch, "commit": commit, "tree": tree, "files": len(blobs), "hashed": hashed}
+
+def pending(repo):
+    p = git_dir(repo) / PENDING_NAME
+    return [l for l in p.read_text().split() if l] if p.exists() else []
+
+def push_pending(repo, remote: str = "origin", min_batch: int = 1):
+    """Empuja todas las ramas pendientes en un solo push cuando hay al menos `min_batch`."""
+    gdir = git_dir(repo)
+    with _locked(gdir):
+        branches = pending(repo)
+        if not branches or len(branches) < min_batch:
+            return []
+        _git(repo, "push", remote, *["refs/heads/%s:refs/heads/%s" % (b, b) for b in branches])
+        (gdir / PENDING_NAME).write_text("")
+    return branches
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 5 and sys.argv[1] == "commit":
+        msg = sys.argv[5] if len(sys.argv) > 5 else "Auto-rotated artifacts"
+        print(json.dumps(commit_rotation(sys.argv[2], sys.argv[3], sys.argv[4], msg)))
+    elif len(sys.argv) >= 3 and sys.argv[1] == "push":
+        print("pushed:", push_pending(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else "origin"))
+    else:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(2)
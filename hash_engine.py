@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# hash_engine.py
+"""
+Motor de hashing del agente (62827.py)
+- sha512 en un pool de hilos (hashlib suelta el GIL con bloques grandes) con lecturas por bloques
+  de HASH_CHUNK en un buffer reutilizado (readinto), sin cargar el archivo entero en memoria
+- Caché persistente (HASH_CACHE) por ruta: [mtime_ns, size, inode, blake2b, sha512]
+    * nivel 0: stat igual -> se reutiliza el sha512 sin leer el archivo (HASH_TRUST_STAT)
+    * nivel 1: stat distinto -> BLAKE2b (más barato que sha512); si coincide con el guardado el
+      contenido no cambió (touch, copia, reescritura idéntica) y el sha512 no se recalcula
+    * si no coincide, el sha512 sale de los bloques ya leídos (hasta HASH_KEEP_MAX) o de una relectura
+    * archivo nuevo: una sola pasada calcula los dos
+- Presupuesto de E/S por escaneo (HASH_IO_BUDGET_MB) y límite de ritmo (HASH_IO_RATE_MB MB/s,
+  compartido entre hilos): el agente no compite con la carga de producción por el disco
+  Lo que no entra en el presupuesto se aplaza al siguiente escaneo (primero los archivos nuevos) y
+  cuenta como "deferred": si ya tenía sha512 se informa el anterior; si nunca se hasheó se informa
+  PENDING ("pending"), que fleet_backend.py ignora (ni cambio ni borrado)
+- scan() devuelve (entradas {ruta: sha512}, estadísticas con files/s y bytes/s)
+"""
+import os, json, time, hashlib, threading
+from pathlib import Path
+
+HASH_CACHE = os.environ.get("HASH_CACHE", str(Path(__file__).parent / ".hash_cache.json"))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_CHUNK = int(os.environ.get("HASH_CHUNK", 1 << 20))
+HASH_FAST_TIER = os.environ.get("HASH_FAST_TIER", "true").lower() in ("1","true","yes")
+HASH_TRUST_STAT = os.environ.get("HASH_TRUST_STAT", "true").lower() in ("1","true","yes")
+HASH_KEEP_MAX = int(os.environ.get("HASH_KEEP_MAX", 8 << 20))   # bytes retenidos para no releer
+HASH_IO_BUDGET_MB = float(os.environ.get("HASH_IO_BUDGET_MB", 0))  # 0 = sin límite por escaneo
+HASH_IO_RATE_MB = float(os.environ.get("HASH_IO_RATE_MB", 0))      # 0 = sin límite de ritmo
+PENDING = "pending"  # valor en el reporte de un archivo aplazado que aún no tiene sha512
+
+def fast_digest():
+    return hashlib.blake2b(digest_size=16)
+
+class Throttle:
+    """Cubo de tokens en bytes/s compartido entre los hilos del escaneo."""
+    def __init__(self, rate_bps: float, burst: int = HASH_CHUNK):
+        self.rate = rate_bps
+        # ráfaga corta (1/10 s o un bloque): el límite se nota ya desde el principio del escaneo
+        self.cap = self.tokens = max(burst, rate_bps / 10)
+        self.t = time.monotonic()
+        self.lock = threading.Lock()
+        self.slept = 0.0
+
+    def consume(self, n: int):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+            self.t = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.slept += wait
+        if wait:
+            time.sleep(wait)  # fuera del lock: los otros hilos siguen descontando
+
+class Budget:
+    """Bytes que aún se pueden leer en este escaneo (None = sin límite)."""
+    def __init__(self, limit):
+        self.limit = self.left = limit
+        self.lock = threading.Lock()
+
+    def take(self, n: int, force: bool = False) -> bool:
+        if self.left is None:
+            return True
+        with self.lock:
+            # un archivo mayor que todo el presupuesto entra si es lo primero que se lee
+            if n > self.left and not force and self.left < self.limit:
+                return False
+            self.left -= n
+            return True
+
+class HashEngine:
+    def __init__(self, cache_path=HASH_CACHE, workers: int = HASH_WORKERS, chunk: int = HASH_CHUNK,
+                 fast: bool = HASH_FAST_TIER, trust_stat: bool = HASH_TRUST_STAT,
+                 budget_mb: float = HASH_IO_BUDGET_MB, rate_mb: float = HASH_IO_RATE_MB):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.workers, self.chunk, self.fast, self.trust_stat = max(1, workers), chunk, fast, trust_stat
+        self.budget_mb, self.rate_mb = budget_mb, rate_mb
+        self.cache = self._load()
+        self.last_stats = None
+
+    # ---------- caché ----------
+    def _load(self) -> dict:
+        if not self.cache_path:
+            return {}
+        try:
+            return json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        if not self.cache_path:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_name(".%s.%d.tmp" % (self.cache_path.name, os.getpid()))
+        tmp.write_text(json.dumps(self.cache), encoding="utf-8")
+        os.replace(tmp, self.cache_path)
+
+    # ---------- lectura ----------
+    def _read(self, path: str, hashers, throttle, keep=None) -> int:
+        buf = bytearray(self.chunk)
+        mv = memoryview(buf)
+        total = 0
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                throttle.consume(n)
+                block = mv[:n]
+                for h in hashers:
+                    h.update(block)
+                if keep is not None:
+                    keep.append(bytes(block))
+                total += n
+        return total
+
+    def _hash(self, path: str, st, old, throttle, budget):
+        """(entrada de caché, estado, bytes leídos); estado: hashed / fast / deferred."""
+        stat = [st.st_mtime_ns, st.st_size, st.st_ino]
+        if not budget.take(st.st_size):
+            return old, "deferred", 0
+        if self.fast and old and old[3]:
+            fh = fast_digest()
+            keep = [] if st.st_size <= HASH_KEEP_MAX else None
+            read = self._read(path, [fh], throttle, keep)
+            fd = fh.hexdigest()
+            if fd == old[3]:
+                return stat + [fd, old[4]], "fast", read
+            sh = hashlib.sha512()
+            if keep is not None:
+                for b in keep:
+                    sh.update(b)
+            else:
+                budget.take(st.st_size, force=True)  # la relectura también cuenta
+                read += self._read(path, [sh], throttle)
+            return stat + [fd, sh.hexdigest()], "hashed", read
+        sh = hashlib.sha512()
+        fh = fast_digest() if self.fast else None
+        read = self._read(path, [sh] + ([fh] if fh else []), throttle)
+        return stat + [fh.hexdigest() if fh else None, sh.hexdigest()], "hashed", read
+
+    # ---------- escaneo ----------
+    def scan(self, paths):
+        """paths: iterable de rutas de archivo. Devuelve ({ruta: sha512 o PENDING}, stats)."""
+        from concurrent.futures import ThreadPoolExecutor
+        t0 = time.time()
+        throttle = Throttle(self.rate_mb * (1 << 20), self.chunk)
+        budget = Budget(int(self.budget_mb * (1 << 20)) if self.budget_mb > 0 else None)
+        stats = {"files": 0, "stat_hits": 0, "fast_hits": 0, "hashed": 0, "deferred": 0, "errors": 0,
+                 "bytes_read": 0}
+        cache, todo, pending = {}, [], []
+        for p in paths:
+            p = str(p)
+            try:
+                st = os.stat(p)
+            except OSError:
+                stats["errors"] += 1
+                continue
+            old = self.cache.get(p)
+            if self.trust_stat and old and old[:3] == [st.st_mtime_ns, st.st_size, st.st_ino]:
+                cache[p] = old
+                stats["stat_hits"] += 1
+            else:
+                todo.append((p, st, old))
+        # con presupuesto, primero lo que nunca se hasheó
+        todo.sort(key=lambda t: t[2] is not None)
+
+        def work(job):
+            p, st, old = job
+            try:
+                return p, self._hash(p, st, old, throttle, budget)
+            except OSError:
+                return p, (None, "error", 0)
+
+        if self.workers > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(self.workers) as ex:
+                results = list(ex.map(work, todo))
+        else:
+            results = [work(j) for j in todo]
+        for p, (entry, state, read) in results:
+            stats["bytes_read"] += read
+            if state == "error":
+                stats["errors"] += 1
+                continue
+            stats[{"hashed": "hashed", "fast": "fast_hits", "deferred": "deferred"}[state]] += 1
+            if entry:
+                cache[p] = entry
+            elif state == "deferred":
+                pending.append(p)  # nuevo y sin presupuesto: sin entrada de caché hasta que se lea
+        self.cache = cache  # solo lo visto en este escaneo: las rutas borradas salen de la caché
+        self.save()
+        secs = time.time() - t0
+        stats["files"] = len(cache) + len(pending)
+        stats["pending"] = len(pending)
+        stats["seconds"] = round(secs, 3)
+        stats["files_s"] = round(stats["files"] / secs, 1) if secs else None
+        stats["bytes_s"] = round(stats["bytes_read"] / secs) if secs else None
+        stats["throttled_s"] = round(throttle.slept, 3)
+        self.last_stats = stats
+        entries = {p: e[4] for p, e in cache.items()}
+        entries.update(dict.fromkeys(pending, PENDING))
+        return entries, stats
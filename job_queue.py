@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# job_queue.py
+"""
+Cola de trabajos acotada para los webhooks (Haider.py)
+- Pool de workers configurable, límite de pendientes (QueueFull si se llena)
+- Coalescencia por clave: si ya hay un trabajo pendiente con la misma clave
+  (p.ej. "rotate", "sync") los disparos nuevos se pliegan en él (merge() puede actualizarlo)
+- Nunca corren dos trabajos de la misma clave a la vez
+- Timeout por trabajo (los comandos se matan al expirar)
+- Métricas: profundidad de la cola, tiempo de espera y de ejecución
+"""
+import time, uuid, threading, subprocess
+from collections import deque, OrderedDict
+
+class QueueFull(Exception):
+    pass
+
+class JobTimeout(Exception):
+    pass
+
+class Job:
+    def __init__(self, key, fn, timeout=None, meta=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.fn = fn
+        self.timeout = timeout
+        self.meta = meta or {}
+        self.status = "queued"  # queued / running / done / failed / timeout
+        self.folded = 0         # disparos plegados en este trabajo
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        d = {"id": self.id, "key": self.key, "status": self.status, "folded": self.folded,
+             "enqueued_at": self.enqueued_at, "started_at": self.started_at,
+             "finished_at": self.finished_at, "result": self.result, "error": self.error}
+        if self.meta:
+            d["meta"] = self.meta
+        if self.started_at:
+            d["wait_s"] = round(self.started_at - self.enqueued_at, 3)
+        if self.finished_at:
+            d["run_s"] = round(self.finished_at - self.started_at, 3)
+        return d
+
+class _Stat:
+    def __init__(self):
+        self.count = 0; self.total = 0.0; self.max = 0.0; self.last = 0.0
+
+    def add(self, v):
+        self.count += 1; self.total += v; self.last = v
+        self.max = max(self.max, v)
+
+    def to_dict(self):
+        return {"count": self.count, "avg": round(self.total / self.count, 3) if self.count else 0.0,
+                "max": round(self.max, 3), "last": round(self.last, 3)}
+
+class JobQueue:
+    def __init__(self, workers=2, max_pending=100, default_timeout=None, history=500):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.default_timeout = default_timeout
+        self._pending = deque()
+        self._running = {}                  # key -> Job
+        self._jobs = OrderedDict()          # id -> Job (historial acotado)
+        self._history = history
+        self._cv = threading.Condition()
+        self._threads = []
+        self._stop = False
+        self.wait_stat = _Stat()
+        self.run_stat = _Stat()
+        self.counters = {"submitted": 0, "folded": 0, "rejected": 0, "done": 0, "failed": 0, "timeout": 0}
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name="job-worker-%d" % i, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, wait=True):
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def submit(self, key, fn, timeout=None, meta=None, merge=None):
+        """Encola fn(job) bajo `key`; devuelve el Job (uno ya pendiente si se pliega). Al plegarse,
+        merge(job, meta) actualiza el pendiente bajo el lock (todavía no ha empezado)."""
+        with self._cv:
+            for job in self._pending:
+                if job.key == key:
+                    if merge:
+                        merge(job, meta or {})
+                    job.folded += 1
+                    self.counters["folded"] += 1
+                    return job
+            if len(self._pending) >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise QueueFull("job queue full (%d pending)" % len(self._pending))
+            job = Job(key, fn, timeout if timeout is not None else self.default_timeout, meta)
+            self._pending.append(job)
+            self._remember(job)
+            self.counters["submitted"] += 1
+            self._cv.notify()
+            return job
+
+    def get(self, job_id):
+        with self._cv:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def stats(self):
+        with self._cv:
+            now = time.time()
+            oldest = min((now - j.enqueued_at for j in self._pending), default=0.0)
+            return {"depth": len(self._pending), "running": sorted(self._running),
+                    "workers": self.workers, "oldest_wait_s": round(oldest, 3),
+                    "wait_s": self.wait_stat.to_dict(), "run_s": self.run_stat.to_dict(),
+                    "counters": dict(self.counters)}
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self._history:
+            old_id, old = next(iter(self._jobs.items()))
+            if old.status in ("queued", "running"):
+                break
+            self._jobs.pop(old_id)
+
+    def _next(self):
+        # primer trabajo pendiente cuya clave no esté corriendo
+        for job in self._pending:
+            if job.key not in self._running:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                job = self._next()
+                while job is None:
+                    if self._stop:
+                        return
+                    self._cv.wait()
+                    job = self._next()
+                self._running[job.key] = job
+                job.status = "running"
+                job.started_at = time.time()
+                self.wait_stat.add(job.started_at - job.enqueued_at)
+            try:
+                job.result = job.fn(job)
+                job.status = "done"
+            except JobTimeout as e:
+                job.status, job.error = "timeout", str(e)
+            except Exception as e:
+                job.status, job.error = "failed", str(e)
+            with self._cv:
+                job.finished_at = time.time()
+                self.run_stat.add(job.finished_at - job.started_at)
+                self.counters[job.status] += 1
+                self._running.pop(job.key, None)
+                self._cv.notify_all()
+
+def run_command(cmd, timeout=None, cwd=None):
+    """Ejecuta cmd (lista, sin shell); mata el proceso si supera el timeout."""
+    p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        out, _ = p.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        p.kill()
+        p.communicate()
+        raise JobTimeout("timeout after %ss: %s" % (timeout, " ".join(cmd)))
+    tail = out.decode('utf-8', 'replace')[-2000:]
+    if p.returncode != 0:
+        raise RuntimeError("exit %d: %s" % (p.returncode, tail))
+    return {"returncode": p.returncode, "output": tail}
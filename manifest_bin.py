@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# manifest_bin.py
+"""
+Manifest binario compacto (rotated/manifest.bin) con acceso perezoso por entrada
+Formato (little-endian):
+  b"RMB1" | u32 len cabecera | cabecera JSON (timestamp, seed, mode, param, hmac, count)
+  | count registros de 100 bytes ordenados por ruta (utf-8)
+  | blob de cadenas | HMAC-SHA512 (64 bytes) de todo lo anterior
+Registro: off/len de la ruta, off/len de 'rotated', off/len de campos extra (JSON), sha512 crudo (64 bytes)
+  ('rotated' = prefijo común + ruta se guarda solo como marca, sin repetir la cadena)
+- Búsqueda binaria sobre mmap: leer una entrada no parsea el resto
+- La cabecera guarda el HMAC del manifest JSON: to-json reproduce el JSON original y su HMAC sigue valiendo
+- El HMAC final (sobre los bytes del archivo) se valida en streaming, sin parsear
+"""
+import os, sys, json, mmap, hmac, struct, hashlib
+from pathlib import Path
+from collections.abc import Mapping
+
+MAGIC = b"RMB1"
+REC = struct.Struct("<QQQIII64s")  # path_off, rot_off, extra_off, path_len, rot_len, extra_len, sha512
+TRAILER = 64
+SAME = 0xFFFFFFFF  # rot_len: 'rotated' == cabecera["rprefix"] + ruta
+HEADER_FIELDS = ("timestamp", "seed", "mode", "param", "hmac")
+
+def _mac(key: str):
+    return hmac.new(key.encode('utf-8'), digestmod=hashlib.sha512)
+
+def encode(manifest: dict, key: str) -> bytes:
+    entries = manifest.get("entries", {})
+    items = sorted(((rel.encode('utf-8'), info) for rel, info in entries.items()), key=lambda t: t[0])
+    header = {k: manifest[k] for k in HEADER_FIELDS if k in manifest}
+    header["count"] = len(items)
+    extra_top = {k: v for k, v in manifest.items() if k not in HEADER_FIELDS and k != "entries"}
+    if extra_top:
+        header["extra"] = extra_top
+    prefix = _rotated_prefix(entries)
+    if prefix is not None:
+        header["rprefix"] = prefix
+    hb = json.dumps(header, sort_keys=True).encode('utf-8')
+    blob = bytearray()
+    recs = bytearray()
+    for path, info in items:
+        rot = info.get("rotated", "").encode('utf-8')
+        same = prefix is not None and rot == prefix.encode('utf-8') + path
+        rest = {k: v for k, v in info.items() if k not in ("rotated", "sha512")}
+        extra = json.dumps(rest, sort_keys=True).encode('utf-8') if rest else b""
+        digest = bytes.fromhex(info["sha512"]) if info.get("sha512") else b"\x00" * 64
+        po = len(blob); blob += path
+        ro = len(blob)
+        if not same:
+            blob += rot
+        eo = len(blob); blob += extra
+        recs += REC.pack(po, ro, eo, len(path), SAME if same else len(rot), len(extra), digest)
+    body = MAGIC + struct.pack("<I", len(hb)) + hb + bytes(recs) + bytes(blob)
+    mac = _mac(key)
+    mac.update(body)
+    return body + mac.digest()
+
+def _rotated_prefix(entries: dict):
+    for rel, info in entries.items():
+        rot = info.get("rotated", "")
+        if rot.endswith(rel):
+            return rot[:len(rot) - len(rel)]
+        return None
+    return None
+
+def write(manifest: dict, path, key: str):
+    p = Path(path)
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_bytes(encode(manifest, key))
+    os.replace(tmp, p)
+
+class Entries(Mapping):
+    """Vista perezosa de las entradas: cada acceso decodifica solo un registro."""
+    def __init__(self, bm):
+        self._bm = bm
+
+    def __len__(self):
+        return self._bm.count
+
+    def __iter__(self):
+        for i in range(self._bm.count):
+            yield self._bm._path(i).decode('utf-8')
+
+    def __getitem__(self, rel):
+        info = self._bm.entry(rel)
+        if info is None:
+            raise KeyError(rel)
+        return info
+
+    def __contains__(self, rel):
+        return self._bm._find(rel.encode('utf-8')) is not None
+
+    def items(self):
+        for i in range(self._bm.count):
+            yield self._bm._path(i).decode('utf-8'), self._bm._info(i)
+
+class BinManifest(Mapping):
+    """Manifest binario mapeado en memoria; se comporta como el dict del manifest JSON."""
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:4] != MAGIC:
+            raise ValueError("not a binary manifest: %s" % path)
+        (hlen,) = struct.unpack_from("<I", self._mm, 4)
+        self.header = json.loads(self._mm[8:8 + hlen])
+        self.count = self.header["count"]
+        self._recs = 8 + hlen
+        self._blob = self._recs + self.count * REC.size
+        self.entries = Entries(self)
+
+    def close(self):
+        self._mm.close()
+
+    # --- acceso tipo dict a la cabecera ---
+    def _top(self):
+        top = {k: self.header[k] for k in HEADER_FIELDS if k in self.header}
+        top.update(self.header.get("extra", {}))
+        top["entries"] = self.entries
+        return top
+
+    def __getitem__(self, k):
+        if k == "entries":
+            return self.entries
+        return self._top()[k]
+
+    def __iter__(self):
+        return iter(self._top())
+
+    def __len__(self):
+        return len(self._top())
+
+    # --- registros ---
+    def _rec(self, i):
+        return REC.unpack_from(self._mm, self._recs + i * REC.size)
+
+    def _path(self, i):
+        po, _, _, pl, _, _, _ = self._rec(i)
+        return self._mm[self._blob + po:self._blob + po + pl]
+
+    def _info(self, i):
+        po, ro, eo, pl, rl, el, digest = self._rec(i)
+        b = self._blob
+        if rl == SAME:
+            rotated = self.header["rprefix"] + self._mm[b + po:b + po + pl].decode('utf-8')
+        else:
+            rotated = self._mm[b + ro:b + ro + rl].decode('utf-8')
+        info = {"rotated": rotated, "sha512": digest.hex()}
+        if el:
+            info.update(json.loads(self._mm[b + eo:b + eo + el]))
+        return info
+
+    def _find(self, key: bytes):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            p = self._path(mid)
+            if p < key:
+                lo = mid + 1
+            elif p > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def entry(self, rel):
+        """Info de una entrada (o None) con búsqueda binaria."""
+        i = self._find(rel.encode('utf-8'))
+        return None if i is None else self._info(i)
+
+    def verify(self, key: str) -> bool:
+        """HMAC sobre los bytes del archivo (sin parsear entradas)."""
+        n = len(self._mm) - TRAILER
+        if n < 8:
+            return False
+        mac = _mac(key)
+        step = 1 << 22
+        for off in range(0, n, step):
+            mac.update(self._mm[off:min(n, off + step)])
+        return hmac.compare_digest(mac.digest(), self._mm[n:])
+
+    def to_dict(self) -> dict:
+        m = {k: v for k, v in self._top().items() if k != "entries"}
+        m["entries"] = dict(self.entries.items())
+        return m
+
+def open_manifest(path):
+    """Abre manifest.json o manifest.bin (detecta por el magic)."""
+    p = Path(path)
+    with open(p, "rb") as f:
+        magic = f.read(4)
+    if magic == MAGIC:
+        return BinManifest(p)
+    return json.loads(p.read_text())
+
+def json_hmac_ok(manifest: dict, key: str) -> bool:
+    m = {k: v for k, v in manifest.items() if k != "hmac"}
+    b = json.dumps(m, sort_keys=True).encode('utf-8')
+    calc = hmac.new(key.encode('utf-8'), b, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(calc, manifest.get("hmac") or "")
+
+if __name__ == "__main__":
+    key = os.environ.get("ROT_KEY")
+    if len(sys.argv) < 3 or not key:
+        print("Uso: ROT_KEY=... manifest_bin.py to-bin <manifest.json> [out] | to-json <manifest.bin> [out]"
+              " | get <manifest.bin> <entry> | verify <manifest.bin>")
+        sys.exit(2)
+    cmd, src = sys.argv[1], Path(sys.argv[2])
+    if cmd == "to-bin":
+        m = json.loads(src.read_text())
+        if not json_hmac_ok(m, key):
+            print("manifest HMAC invalido - abort"); sys.exit(1)
+        out = Path(sys.argv[3]) if len(sys.argv) > 3 else src.with_suffix(".bin")
+        write(m, out, key)
+        print("escrito", out, out.stat().st_size, "bytes")
+    elif cmd == "to-json":
+        bm = BinManifest(src)
+        if not bm.verify(key):
+            print("manifest.bin HMAC invalido - abort"); sys.exit(1)
+        out = Path(sys.argv[3]) if len(sys.argv) > 3 else src.with_suffix(".json")
+        out.write_text(json.dumps(bm.to_dict(), indent=2), encoding='utf-8')
+        print("escrito", out)
+    elif cmd == "get":
+        info = BinManifest(src).entry(sys.argv[3])
+        print(json.dumps(info, indent=2))
+        sys.exit(0 if info else 1)
+    elif cmd == "verify":
+        ok = BinManifest(src).verify(key)
+        print("manifest.bin:", ok)
+        sys.exit(0 if ok else 1)
+    else:
+        print("comando desconocido:", cmd); sys.exit(2)
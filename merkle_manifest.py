@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# merkle_manifest.py
+"""
+Manifest Merkle (rotated/manifest.merkle.json), junto al manifest.json plano
+- Cada directorio hashea a sus hijos (árbol binario tipo RFC 6962 sobre los hijos ordenados)
+- Solo se firma con HMAC la cabecera con la raíz (timestamp, seed, mode, param, count, root)
+- Prueba de inclusión O(log n) para un solo archivo (usada por el loader); con una caché de niveles
+  por directorio (prove(..., cache)) las pruebas siguientes no rehashean a los hermanos
+- Diff rápido entre generaciones: solo se desciende en directorios cuya raíz cambió
+- Re-firma incremental: solo se recalculan los directorios tocados, sobre un manifest anterior
+  cuya firma y raíz se comprobaron antes de reutilizarlo
+"""
+import os, sys, json, hmac, hashlib
+from pathlib import Path
+
+VERSION = 1
+HEADER_FIELDS = ("version", "timestamp", "seed", "mode", "param", "count", "root")
+
+def _h(b: bytes) -> bytes:
+    return hashlib.sha512(b).digest()
+
+EMPTY = _h(b"")
+
+def _canon(info: dict) -> bytes:
+    return json.dumps(info, sort_keys=True).encode('utf-8')
+
+def file_record(name: str, info: dict) -> bytes:
+    return _h(b"\x00f" + name.encode('utf-8') + b"\x00" + _canon(info))
+
+def dir_record(name: str, root: bytes) -> bytes:
+    return _h(b"\x00d" + name.encode('utf-8') + b"\x00" + root)
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return _h(b"\x01" + left + right)
+
+def _split(n: int) -> int:
+    # mayor potencia de 2 estrictamente menor que n
+    k = 1
+    while k << 1 < n:
+        k <<= 1
+    return k
+
+def mth(leaves):
+    n = len(leaves)
+    if n == 0:
+        return EMPTY
+    if n == 1:
+        return leaves[0]
+    k = _split(n)
+    return _node(mth(leaves[:k]), mth(leaves[k:]))
+
+def audit_path(m: int, leaves):
+    n = len(leaves)
+    if n <= 1:
+        return []
+    k = _split(n)
+    if m < k:
+        return audit_path(m, leaves[:k]) + [mth(leaves[k:])]
+    return audit_path(m - k, leaves[k:]) + [mth(leaves[:k])]
+
+def tree_levels(leaves):
+    """Niveles del árbol de abajo arriba; el último impar sube sin pareja (mismo MTH que mth())."""
+    levels = [list(leaves) or [EMPTY]]
+    while len(levels[-1]) > 1:
+        lv = levels[-1]
+        levels.append([_node(lv[i], lv[i + 1]) if i + 1 < len(lv) else lv[i] for i in range(0, len(lv), 2)])
+    return levels
+
+def levels_path(m: int, levels):
+    """audit_path(m, leaves) a partir de los niveles ya calculados: O(log n) sin hashear."""
+    path = []
+    for lv in levels[:-1]:
+        sib = m ^ 1
+        if sib < len(lv):
+            path.append(lv[sib])
+        m >>= 1
+    return path
+
+def root_from_path(m: int, n: int, leaf: bytes, path):
+    if n == 1:
+        if path:
+            raise ValueError("audit path too long")
+        return leaf
+    if not path:
+        raise ValueError("audit path too short")
+    k = _split(n)
+    if m < k:
+        return _node(root_from_path(m, k, leaf, path[:-1]), path[-1])
+    return _node(path[-1], root_from_path(m - k, n - k, leaf, path[:-1]))
+
+# ---------- árbol ----------
+# dir:  {"r": hex raíz de hijos, "c": {nombre: nodo}}
+# file: {"h": hex record, "e": info del manifest plano}
+
+def _new_dir():
+    return {"r": EMPTY.hex(), "c": {}}
+
+def _child_record(name: str, node: dict) -> bytes:
+    if "c" in node:
+        return dir_record(name, bytes.fromhex(node["r"]))
+    return bytes.fromhex(node["h"])
+
+def _child_leaves(d: dict):
+    names = sorted(d["c"])
+    return names, [_child_record(n, d["c"][n]) for n in names]
+
+def _rehash_dir(d: dict):
+    _, leaves = _child_leaves(d)
+    d["r"] = mth(leaves).hex()
+
+def _rehash_all(d: dict):
+    for child in d["c"].values():
+        if "c" in child:
+            _rehash_all(child)
+    _rehash_dir(d)
+
+def _parts(rel: str):
+    return [p for p in rel.replace(os.sep, "/").split("/") if p]
+
+def apply_changes(tree: dict, changes: dict):
+    """changes = {rel: info | None}. Actualiza hojas y recalcula solo los directorios tocados.
+    Los borrados van primero: si una ruta pasa de archivo a directorio (o al revés) el nodo viejo
+    se quita antes de insertar el nuevo."""
+    dirty = {}
+    for rel, info in sorted(changes.items(), key=lambda kv: kv[1] is not None):
+        parts = _parts(rel)
+        chain = [tree]
+        d = tree
+        for p in parts[:-1]:
+            nxt = d["c"].get(p)
+            if nxt is None or "c" not in nxt:
+                if info is None:
+                    break
+                nxt = d["c"][p] = _new_dir()
+            chain.append(nxt)
+            d = nxt
+        else:
+            name = parts[-1]
+            if info is None:
+                if name in d["c"] and "c" not in d["c"][name]:  # solo un archivo; un directorio se poda solo
+                    del d["c"][name]
+            else:
+                d["c"][name] = {"h": file_record(name, info).hex(), "e": info}
+            for depth, node in enumerate(chain):
+                dirty[id(node)] = (depth, node, parts[:depth])
+    # de lo más profundo a la raíz; podar directorios vacíos
+    for depth, node, prefix in sorted(dirty.values(), key=lambda t: -t[0]):
+        _rehash_dir(node)
+        if depth and not node["c"]:
+            # el camino viejo puede no existir ya: un antepasado pasó a ser archivo (a/b/c -> a) o el
+            # propio nodo fue sustituido por un archivo del mismo nombre; entonces no hay nada que podar
+            parent = tree
+            for p in prefix[:-1]:
+                parent = parent["c"].get(p)
+                if parent is None or "c" not in parent:
+                    break
+            else:
+                if parent["c"].get(prefix[-1]) is node:
+                    del parent["c"][prefix[-1]]
+    return tree
+
+def build_tree(entries: dict) -> dict:
+    tree = _new_dir()
+    for rel, info in entries.items():
+        parts = _parts(rel)
+        d = tree
+        for p in parts[:-1]:
+            d = d["c"].setdefault(p, _new_dir())
+        d["c"][parts[-1]] = {"h": file_record(parts[-1], info).hex(), "e": info}
+    _rehash_all(tree)
+    return tree
+
+def iter_entries(node: dict, prefix: str = ""):
+    for name, child in node["c"].items():
+        rel = prefix + name
+        if "c" in child:
+            yield from iter_entries(child, rel + "/")
+        else:
+            yield rel, child["e"]
+
+def _count(node: dict) -> int:
+    return sum(_count(c) if "c" in c else 1 for c in node["c"].values())
+
+# ---------- firma ----------
+def header_bytes(mm: dict) -> bytes:
+    return json.dumps({k: mm.get(k) for k in HEADER_FIELDS}, sort_keys=True).encode('utf-8')
+
+def sign(mm: dict, key: str) -> dict:
+    mm["root"] = mm["tree"]["r"]
+    mm["count"] = _count(mm["tree"])
+    mm["hmac"] = hmac.new(key.encode('utf-8'), header_bytes(mm), hashlib.sha512).hexdigest()
+    return mm
+
+def verify_header(mm: dict, key: str) -> bool:
+    calc = hmac.new(key.encode('utf-8'), header_bytes(mm), hashlib.sha512).hexdigest()
+    return hmac.compare_digest(calc, mm.get("hmac") or "")
+
+def verify_tree(mm: dict, key: str) -> bool:
+    # verificación completa: recalcula todas las raíces de directorio
+    return _verified_tree(mm, key) is not None
+
+def _rehash_files(d: dict):
+    for name, child in d["c"].items():
+        if "c" in child:
+            _rehash_files(child)
+        else:
+            child["h"] = file_record(name, child["e"]).hex()
+
+def _verified_tree(mm: dict, key: str):
+    """Copia del árbol de mm con todas las raíces recalculadas, o None si no cuadra con la raíz firmada."""
+    try:
+        if mm.get("version") != VERSION or not verify_header(mm, key):
+            return None
+        tree = json.loads(json.dumps(mm["tree"]))
+        _rehash_files(tree)
+        _rehash_all(tree)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    return tree if tree["r"] == mm.get("root") else None
+
+def from_manifest(m: dict, key: str, previous: dict = None) -> dict:
+    """Construye (o actualiza incrementalmente desde `previous`) el manifest Merkle de un manifest plano.
+    `previous` solo se reutiliza si su HMAC y su raíz verifican; si no, se construye desde cero."""
+    entries = m.get("entries", {})
+    tree = _verified_tree(previous, key) if previous else None
+    if previous and tree is None:
+        print("[merkle] manifest anterior no verifica; se reconstruye completo", file=sys.stderr)
+    if tree is not None:
+        old = dict(iter_entries(tree))
+        changes = {rel: info for rel, info in entries.items() if old.get(rel) != info}
+        changes.update({rel: None for rel in old if rel not in entries})
+        apply_changes(tree, changes)
+    else:
+        tree = build_tree(entries)
+    mm = {"version": VERSION, "timestamp": m.get("timestamp"), "seed": m.get("seed"),
+          "mode": m.get("mode"), "param": m.get("param"), "tree": tree}
+    return sign(mm, key)
+
+# ---------- pruebas de inclusión ----------
+def _dir_levels(d: dict, cache):
+    """(índice por nombre, niveles) de un directorio; cache = {id(nodo): (nodo, índice, niveles)}.
+    Guardar el nodo mantiene vivo su id; la caché vale mientras el árbol no se modifique."""
+    hit = cache.get(id(d)) if cache is not None else None
+    if hit is not None and hit[0] is d:
+        return hit[1], hit[2]
+    names, leaves = _child_leaves(d)
+    index, levels = {n: i for i, n in enumerate(names)}, tree_levels(leaves)
+    if cache is not None:
+        cache[id(d)] = (d, index, levels)
+    return index, levels
+
+def prove(mm: dict, rel: str, cache: dict = None) -> dict:
+    """Prueba de inclusión de rel. Con `cache` (un dict por árbol cargado, p. ej. el del loader) las
+    hojas y niveles de cada directorio se calculan una vez y cada prueba cuesta O(profundidad·log n)."""
+    parts = _parts(rel)
+    d = mm["tree"]
+    levels = []
+    for name in parts:
+        if "c" not in d or name not in d["c"]:
+            raise KeyError(rel)
+        index, lv = _dir_levels(d, cache)
+        idx = index[name]
+        levels.append({"name": name, "index": idx, "size": len(index),
+                       "path": [x.hex() for x in levels_path(idx, lv)]})
+        d = d["c"][name]
+    if "c" in d:
+        raise KeyError(rel)
+    header = {k: mm.get(k) for k in HEADER_FIELDS}
+    return {"entry": rel, "info": d["e"], "levels": levels, "header": header, "hmac": mm.get("hmac")}
+
+def verify_proof(proof: dict, key: str) -> bool:
+    """Valida una prueba de inclusión sin cargar el árbol: O(log n) hashes + HMAC de la cabecera."""
+    header = proof["header"]
+    calc = hmac.new(key.encode('utf-8'), json.dumps(header, sort_keys=True).encode('utf-8'),
+                    hashlib.sha512).hexdigest()
+    if not hmac.compare_digest(calc, proof.get("hmac") or ""):
+        return False
+    levels = proof["levels"]
+    try:
+        rec = file_record(levels[-1]["name"], proof["info"])
+        for i in range(len(levels) - 1, -1, -1):
+            lv = levels[i]
+            root = root_from_path(lv["index"], lv["size"], rec, [bytes.fromhex(x) for x in lv["path"]])
+            if i:
+                rec = dir_record(levels[i - 1]["name"], root)
+    except (ValueError, IndexError):
+        return False
+    return root.hex() == header["root"]
+
+# ---------- diff ----------
+def diff(a: dict, b: dict, prefix: str = "", out=None) -> dict:
+    """Diferencias entre dos árboles (o manifests Merkle); ignora subárboles con la misma raíz."""
+    if out is None:
+        out = {"added": [], "removed": [], "changed": []}
+    a = a.get("tree", a)
+    b = b.get("tree", b)
+    if a["r"] == b["r"]:
+        return out
+    for name in sorted(set(a["c"]) | set(b["c"])):
+        ca, cb = a["c"].get(name), b["c"].get(name)
+        rel = prefix + name
+        if ca is not None and cb is not None and "c" in ca and "c" in cb:
+            diff(ca, cb, rel + "/", out)
+        elif ca is not None and cb is not None and "c" not in ca and "c" not in cb:
+            if ca["h"] != cb["h"]:
+                out["changed"].append(rel)
+        else:
+            out["removed"].extend(_leaves(ca, rel))
+            out["added"].extend(_leaves(cb, rel))
+    return out
+
+def _leaves(node, rel: str):
+    if node is None:
+        return []
+    if "c" in node:
+        return [r for r, _ in iter_entries(node, rel + "/")]
+    return [rel]
+
+def load(path) -> dict:
+    return json.loads(Path(path).read_text())
+
+def write(mm: dict, path):
+    p = Path(path)
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps(mm, sort_keys=True), encoding='utf-8')
+    os.replace(tmp, p)
+
+if __name__ == "__main__":
+    key = os.environ.get("ROT_KEY")
+    if len(sys.argv) < 3 or not key:
+        print("Uso: ROT_KEY=... merkle_manifest.py build <manifest.json> [out] | proof <merkle> <entry>"
+              " | verify-proof <proof.json> | verify <merkle> | diff <merkle_a> <merkle_b>")
+        sys.exit(2)
+    cmd = sys.argv[1]
+    if cmd == "build":
+        src = Path(sys.argv[2])
+        out = Path(sys.argv[3]) if len(sys.argv) > 3 else src.with_name("manifest.merkle.json")
+        prev = load(out) if out.exists() else None
+        mm = from_manifest(json.loads(src.read_text()), key, prev)
+        write(mm, out)
+        print("merkle root:", mm["root"], "entries:", mm["count"])
+    elif cmd == "proof":
+        print(json.dumps(prove(load(sys.argv[2]), sys.argv[3]), indent=2))
+    elif cmd == "verify-proof":
+        ok = verify_proof(load(sys.argv[2]), key)
+        print("proof:", ok)
+        sys.exit(0 if ok else 1)
+    elif cmd == "verify":
+        ok = verify_tree(load(sys.argv[2]), key)
+        print("merkle:", ok)
+        sys.exit(0 if ok else 1)
+    elif cmd == "diff":
+        print(json.dumps(diff(load(sys.argv[2]), load(sys.argv[3])), indent=2))
+    else:
+        print("comando desconocido:", cmd)
+        sys.exit(2)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# metrics.py
+"""
+Instrumentación compartida de los daemons (rotate, verify, repair, monitor, agent, loader)
+- Contadores, gauges e histogramas con etiquetas; timer(phase) para las fases
+  (walk, read, rotate, write, hash, sign, push, serve, ...)
+- Exportación Prometheus: METRICS_PORT (endpoint HTTP /metrics) y/o METRICS_FILE (textfile)
+- Perfilador por muestreo opcional: con METRICS_PROFILE_BUDGET=<segundos>, si un ciclo
+  supera el presupuesto se vuelcan sus stacks más calientes en METRICS_PROFILE_DIR
+Todo es en memoria y barato; sin METRICS_* no se abre ningún puerto ni archivo.
+"""
+import os, sys, time, threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+PREFIX = "fed80_"
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600)
+PROFILE_BUDGET = float(os.environ.get("METRICS_PROFILE_BUDGET", 0) or 0)
+PROFILE_INTERVAL = float(os.environ.get("METRICS_PROFILE_INTERVAL", 0.01))
+PROFILE_DIR = os.environ.get("METRICS_PROFILE_DIR", "./profiles")
+
+_lock = threading.Lock()
+_metrics = {}
+_const = {}
+
+def _key(labels):
+    merged = dict(_const)
+    merged.update(labels)
+    return tuple(sorted((k, str(v)) for k, v in merged.items()))
+
+def _fmt_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name, self.help, self.values = name, help, {}
+
+    def inc(self, v=1, **labels):
+        k = _key(labels)
+        with _lock:
+            self.values[k] = self.values.get(k, 0) + v
+
+    def render(self):
+        return ["%s%s %s" % (self.name, _fmt_labels(k), v) for k, v in self.values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, v, **labels):
+        with _lock:
+            self.values[_key(labels)] = v
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=BUCKETS):
+        self.name, self.help, self.buckets, self.values = name, help, tuple(buckets), {}
+
+    def observe(self, v, **labels):
+        k = _key(labels)
+        with _lock:
+            st = self.values.get(k)
+            if st is None:
+                st = self.values[k] = [[0] * len(self.buckets), 0, 0.0]
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    st[0][i] += 1
+            st[1] += 1
+            st[2] += v
+
+    def render(self):
+        out = []
+        for k, (counts, n, total) in self.values.items():
+            for b, c in zip(self.buckets, counts):
+                out.append("%s_bucket%s %d" % (self.name, _fmt_labels(k, [("le", repr(float(b)))]), c))
+            out.append("%s_bucket%s %d" % (self.name, _fmt_labels(k, [("le", "+Inf")]), n))
+            out.append("%s_count%s %d" % (self.name, _fmt_labels(k), n))
+            out.append("%s_sum%s %s" % (self.name, _fmt_labels(k), repr(total)))
+        return out
+
+def _get(cls, name, help, **kw):
+    name = PREFIX + name
+    with _lock:
+        m = _metrics.get(name)
+        if m is None:
+            m = _metrics[name] = cls(name, help, **kw)
+    return m
+
+def counter(name, help=""):
+    return _get(Counter, name, help)
+
+def gauge(name, help=""):
+    return _get(Gauge, name, help)
+
+def histogram(name, help="", buckets=BUCKETS):
+    return _get(Histogram, name, help, buckets=buckets)
+
+PHASES = histogram("phase_seconds", "Duración de cada fase")
+BYTES = counter("bytes_total", "Bytes procesados por fase")
+FILES = counter("files_total", "Archivos procesados por fase")
+
+@contextmanager
+def timer(phase, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES.observe(time.perf_counter() - t0, phase=phase, **labels)
+
+def add_bytes(phase, n, **labels):
+    BYTES.inc(n, phase=phase, **labels)
+
+def add_files(phase, n=1, **labels):
+    FILES.inc(n, phase=phase, **labels)
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for m in sorted(_metrics.values(), key=lambda m: m.name):
+            if not m.values:
+                continue
+            lines.append("# HELP %s %s" % (m.name, m.help))
+            lines.append("# TYPE %s %s" % (m.name, m.kind))
+            lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path):
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+def start_http_server(port, addr="0.0.0.0"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode('utf-8')
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer((addr, int(port)), Handler)
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
+
+_started = False
+
+def init(daemon, **const_labels):
+    """Etiqueta `daemon` fija y exportadores según METRICS_PORT / METRICS_FILE (idempotente)."""
+    global _started
+    _const["daemon"] = daemon
+    _const.update(const_labels)
+    if _started:
+        return
+    _started = True
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        start_http_server(port)
+    path = os.environ.get("METRICS_FILE")
+    if path:
+        interval = float(os.environ.get("METRICS_FILE_INTERVAL", 15))
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_textfile(path)
+                except OSError as e:
+                    print("metrics: textfile error:", e, file=sys.stderr)
+        threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+
+# ---------- perfilador por muestreo ----------
+class _Sampler(threading.Thread):
+    def __init__(self, target_ident, interval):
+        super().__init__(name="metrics-profiler", daemon=True)
+        self.target, self.interval = target_ident, interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self.done = threading.Event()
+
+    def run(self):
+        import traceback  # solo cuando hay presupuesto de perfilado
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                continue
+            stack = tuple("%s:%d %s" % (f.filename, f.lineno, f.name)
+                          for f in traceback.extract_stack(frame)[-12:])
+            self.stacks[stack] += 1
+            self.samples += 1
+
+@contextmanager
+def cycle(name, budget=None, **labels):
+    """Mide un ciclo completo; si dura más que `budget` (o METRICS_PROFILE_BUDGET) vuelca stacks calientes."""
+    budget = PROFILE_BUDGET if budget is None else budget
+    sampler = None
+    if budget:
+        sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL)
+        sampler.start()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        PHASES.observe(elapsed, phase=name, **labels)
+        gauge("last_cycle_seconds", "Duración del último ciclo").set(elapsed, phase=name, **labels)
+        if sampler:
+            sampler.done.set()
+            sampler.join()
+            if elapsed > budget:
+                counter("cycle_over_budget_total", "Ciclos que superaron el presupuesto").inc(phase=name, **labels)
+                dump_profile(name, elapsed, budget, sampler)
+
+def dump_profile(name, elapsed, budget, sampler, top=10):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, "%s-%d.txt" % (name, int(time.time())))
+    with open(path, "w") as f:
+        f.write("# %s: %.3fs (budget %.3fs), %d samples\n" % (name, elapsed, budget, sampler.samples))
+        for stack, n in sampler.stacks.most_common(top):
+            f.write("\n%d samples (%.1f%%)\n" % (n, 100.0 * n / max(1, sampler.samples)))
+            f.write("".join("  %s\n" % line for line in stack))
+    print("metrics: %s took %.2fs > budget %.2fs, hot stacks -> %s" % (name, elapsed, budget, path), file=sys.stderr)
+    return path
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Aprovisionamiento idempotente de checks de monitorización ClouDNS (estado deseado)
+- Lista los monitores existentes una sola vez y calcula el diff por nombre
+- Crea / actualiza / borra (con --prune) solo lo que cambió; duplicados se eliminan con --prune
+- Peticiones concurrentes con límite de tasa y una sola requests.Session con pool de conexiones
+- --dry-run imprime el plan sin tocar la API
+Requiere: CLOUDNS_AUTH_ID, CLOUDNS_AUTH_PASS en env (CLOUDNS_API_ROOT para apuntar a fake_cloudns.py)
+"""
+import os, json, time, threading
+from concurrent.futures import ThreadPoolExecutor
+
+API_ROOT = os.environ.get("CLOUDNS_API_ROOT", "https://panel.cloudns.net/api/json/monitoring/")
+# add-monitor/ es el endpoint que ya usa Monitor.py; el resto sigue la misma convención
+ENDPOINTS = {"list": "list-monitors/", "add": "add-monitor/", "update": "update-monitor/", "delete": "delete-monitor/"}
+RATE = float(os.environ.get("CLOUDNS_RATE", 5))       # peticiones por segundo
+WORKERS = int(os.environ.get("CLOUDNS_WORKERS", 8))
+# campos que no se comparan al calcular el diff
+IGNORED = {"id", "status", "auth-id", "auth-password"}
+
+class RateLimiter:
+    """Token bucket compartido entre threads."""
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class CloudnsClient:
+    def __init__(self, auth_id, auth_pass, api_root=API_ROOT, rate=RATE, pool=WORKERS, timeout=30):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.auth = {"auth-id": auth_id, "auth-password": auth_pass}
+        self.root = api_root.rstrip("/") + "/"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = RateLimiter(rate)
+        self.timeout = timeout
+        self.calls = 0
+
+    def _post(self, op, params=None):
+        self.limiter.acquire()
+        data = dict(self.auth)
+        data.update(params or {})
+        r = self.session.post(self.root + ENDPOINTS[op], data=data, timeout=self.timeout)
+        self.calls += 1
+        j = r.json()
+        if isinstance(j, dict) and j.get("status") == "Failed":
+            raise RuntimeError("%s: %s" % (op, j.get("statusDescription", j)))
+        return j
+
+    def list_monitors(self):
+        j = self._post("list")
+        items = j.values() if isinstance(j, dict) else j
+        return [m for m in items if isinstance(m, dict)]
+
+    def add(self, params):
+        return self._post("add", params)
+
+    def update(self, monitor_id, params):
+        p = dict(params)
+        p["id"] = monitor_id
+        return self._post("update", p)
+
+    def delete(self, monitor_id):
+        return self._post("delete", {"id": monitor_id})
+
+def normalize(check: dict) -> dict:
+    """Formato de Main.py (mtype, period, ...) -> parámetros de la API; vacíos fuera.
+    Sin period se usa "10", como hacía Main.py."""
+    p = {"period": "10"}
+    for k, v in check.items():
+        if k == "mtype":
+            k = "type"
+        if v is None or v == "":
+            continue
+        p[k] = str(v)
+    return p
+
+def plan(desired, existing, prune=False):
+    by_name = {}
+    dupes = []
+    for m in existing:
+        if m.get("name") in by_name:
+            dupes.append(m)
+        else:
+            by_name[m.get("name")] = m
+    steps = []
+    wanted = set()
+    for check in desired:
+        params = normalize(check)
+        name = params["name"]
+        wanted.add(name)
+        cur = by_name.get(name)
+        if cur is None:
+            steps.append({"action": "create", "name": name, "params": params})
+            continue
+        changes = {k: [cur.get(k), v] for k, v in params.items()
+                   if k not in IGNORED and str(cur.get(k, "")) != v}
+        if changes:
+            steps.append({"action": "update", "name": name, "id": cur.get("id"), "params": params, "changes": changes})
+    if prune:
+        for m in existing:
+            if m.get("name") not in wanted:
+                steps.append({"action": "delete", "name": m.get("name"), "id": m.get("id")})
+        for m in dupes:
+            if m.get("name") in wanted:
+                steps.append({"action": "delete", "name": m.get("name"), "id": m.get("id"), "duplicate": True})
+    return steps
+
+def _apply_step(client, step):
+    t0 = time.time()
+    try:
+        if step["action"] == "create":
+            res = client.add(step["params"])
+        elif step["action"] == "update":
+            res = client.update(step["id"], step["params"])
+        else:
+            res = client.delete(step["id"])
+        out = {"ok": True, "result": res}
+    except Exception as e:
+        out = {"ok": False, "error": str(e)}
+    out.update(action=step["action"], name=step["name"], ms=round((time.time() - t0) * 1000, 1))
+    return out
+
+def apply(client, steps, workers=WORKERS):
+    if not steps:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(steps))) as ex:
+        return list(ex.map(lambda s: _apply_step(client, s), steps))
+
+def provision(desired, dry_run=False, prune=False, client=None):
+    if client is None:
+        auth_id = os.environ.get("CLOUDNS_AUTH_ID")
+        auth_pass = os.environ.get("CLOUDNS_AUTH_PASS")
+        if not auth_id or not auth_pass:
+            raise SystemExit("Set CLOUDNS_AUTH_ID and CLOUDNS_AUTH_PASS in env")
+        client = CloudnsClient(auth_id, auth_pass)
+    t0 = time.time()
+    steps = plan(desired, client.list_monitors(), prune=prune)
+    summary = {"create": 0, "update": 0, "delete": 0}
+    for s in steps:
+        summary[s["action"]] += 1
+    if dry_run:
+        return {"dry_run": True, "plan": steps, "summary": summary}
+    results = apply(client, steps)
+    failed = [r for r in results if not r["ok"]]
+    return {"summary": summary, "failed": failed, "api_calls": client.calls,
+            "seconds": round(time.time() - t0, 3)}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Aprovisiona checks ClouDNS desde un JSON de estado deseado")
+    ap.add_argument("desired", help="archivo JSON con la lista de checks (formato de Main.py)")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--prune", action="store_true", help="borrar monitores que no estén en el estado deseado")
+    args = ap.parse_args()
+    with open(args.desired) as f:
+        desired = json.load(f)
+    print(json.dumps(provision(desired, dry_run=args.dry_run, prune=args.prune), indent=2, ensure_ascii=False))
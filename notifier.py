@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# notifier.py
+"""
+Notificaciones en segundo plano (Deimon.py)
+- notify()/Incident.add() solo encolan: el webhook lo llama un hilo emisor con requests.Session
+  (conexiones reutilizadas) y timeout; el poll nunca espera a la red
+- Incident: los mensajes de un mismo incidente (alerta, contención, aprobación...) salen en un solo
+  envío al cerrarlo
+- Dedup por fingerprint (de claves de alerta, no del texto) con ventana NOTIFY_COOLDOWN: un incidente
+  igual a uno enviado hace poco no se envía; el siguiente que sí sale indica cuántas repeticiones se
+  suprimieron
+- Límite por destino (NOTIFY_RATE envíos por minuto, cubo de tokens): lo que no cabe espera turno
+- Spool persistente (NOTIFY_SPOOL): cada envío se escribe a disco antes de intentarse y se borra al
+  recibir 2xx; los fallos se reintentan con backoff exponencial (también tras reiniciar el proceso)
+  y tras NOTIFY_MAX_ATTEMPTS pasan a NOTIFY_SPOOL/dead/
+"""
+import os, json, time, uuid, hashlib, threading
+from pathlib import Path
+import metrics
+
+NOTIFY_SPOOL = os.environ.get("NOTIFY_SPOOL", "./notify_spool")
+NOTIFY_COOLDOWN = int(os.environ.get("NOTIFY_COOLDOWN", 600))        # segundos
+NOTIFY_RATE = float(os.environ.get("NOTIFY_RATE", 6))                # envíos por minuto y destino
+NOTIFY_TIMEOUT = float(os.environ.get("NOTIFY_TIMEOUT", 10))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", 8))
+NOTIFY_MAX_BACKOFF = int(os.environ.get("NOTIFY_MAX_BACKOFF", 600))
+
+def fingerprint(keys) -> str:
+    """Huella estable de un incidente a partir de claves estructuradas de sus alertas (p. ej.
+    "integrity:<id>", "post_rate"): el que llama decide qué identifica una alerta y qué es un dato
+    variable (conteos). El orden y las repeticiones no cuentan; el texto se compara tal cual."""
+    norm = sorted(set(str(k) for k in keys))
+    return hashlib.sha256("\n".join(norm).encode("utf-8")).hexdigest()[:32]
+
+class Bucket:
+    def __init__(self, per_min: float):
+        self.rate = per_min / 60.0
+        self.cap = self.tokens = max(1.0, per_min / 6)  # ráfaga de 10 s
+        self.t = time.monotonic()
+
+    def wait_time(self) -> float:
+        """0 si hay token (y lo consume); si no, segundos hasta el siguiente."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+        self.t = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class Incident:
+    """Mensajes de un incidente; close() los envía juntos (o nada, si el fingerprint está en cooldown)."""
+    def __init__(self, notifier, fp, title=None):
+        self.notifier, self.fingerprint, self.title = notifier, fp, title
+        self.id = uuid.uuid4().hex[:12]
+        self.messages = []
+        self.closed = False
+
+    def add(self, message: str, payload=None):
+        self.messages.append({"text": message, "meta": payload or {}, "ts": time.time()})
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.notifier._close_incident(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Notifier:
+    def __init__(self, destinations=(), spool_dir=NOTIFY_SPOOL, cooldown=NOTIFY_COOLDOWN, rate_per_min=NOTIFY_RATE,
+                 timeout=NOTIFY_TIMEOUT, max_attempts=NOTIFY_MAX_ATTEMPTS, sender=None):
+        self.destinations = [d for d in destinations if d]
+        self.spool = Path(spool_dir)
+        self.cooldown, self.rate, self.timeout, self.max_attempts = cooldown, rate_per_min, timeout, max_attempts
+        self._send = sender or self._post  # sender(dest, body) -> bool; inyectable para pruebas
+        self._session = None
+        self._cv = threading.Condition()
+        self._pending = []                # entradas del spool: {id, dest, body, attempts, next_try}
+        self._seen = {}                   # fingerprint -> [último envío, suprimidos desde entonces]
+        self._buckets = {}
+        self._thread = None
+        self._stop = False
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dead": 0, "suppressed": 0, "rate_limited": 0}
+
+    # ---------- API ----------
+    def start(self):
+        if self._thread is None:
+            self._load_spool()
+            self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+            self._thread.start()
+        return self
+
+    def incident(self, fp, title=None) -> Incident:
+        return Incident(self, fp, title)
+
+    def notify(self, message: str, payload=None, fp=None):
+        """Mensaje suelto (un incidente de un solo mensaje)."""
+        inc = Incident(self, fp or fingerprint([message]))
+        inc.add(message, payload)
+        inc.close()
+
+    def close(self, timeout=10.0):
+        """Espera a que se vacíe la cola (lo que falle queda en el spool) y para el hilo."""
+        deadline = time.time() + timeout
+        with self._cv:
+            while self._pending and any(e["next_try"] <= time.time() for e in self._pending) \
+                    and time.time() < deadline:
+                self._cv.wait(0.05)
+            self._stop = True
+            self._cv.notify_all()
+        if self._thread:
+            self._thread.join(max(0.0, deadline - time.time()))
+
+    # ---------- dedup y batch ----------
+    def _close_incident(self, inc: Incident):
+        if not inc.messages or not self.destinations:
+            return
+        now = time.time()
+        with self._cv:
+            seen = self._seen.get(inc.fingerprint)
+            if seen and now - seen[0] < self.cooldown:
+                seen[1] += 1
+                self.stats["suppressed"] += 1
+                metrics.counter("notify_suppressed_total", "Notificaciones suprimidas por dedup").inc()
+                return
+            repeats = seen[1] if seen else 0
+            self._seen[inc.fingerprint] = [now, 0]
+        text = "\n".join(m["text"] for m in inc.messages)
+        if repeats:
+            text += "\n(repetido %d veces en los últimos %d s sin notificar)" % (repeats, self.cooldown)
+        body = {"text": text, "meta": {"incident": inc.id, "fingerprint": inc.fingerprint, "title": inc.title,
+                                       "repeats": repeats, "messages": inc.messages}}
+        for dest in self.destinations:
+            self._enqueue(dest, body)
+
+    # ---------- spool ----------
+    def _entry_path(self, e):
+        return self.spool / ("%s.json" % e["id"])
+
+    def _write(self, e):
+        self.spool.mkdir(parents=True, exist_ok=True)
+        p = self._entry_path(e)
+        tmp = p.with_name(".%s.%d.tmp" % (p.name, os.getpid()))
+        tmp.write_text(json.dumps(e, default=str), encoding="utf-8")
+        os.replace(tmp, p)
+
+    def _enqueue(self, dest, body):
+        # id ordenable por tiempo: el spool se reanuda en orden de llegada
+        e = {"id": "%d-%s" % (time.time() * 1000, uuid.uuid4().hex[:8]), "dest": dest, "body": body,
+             "attempts": 0, "next_try": 0}
+        try:
+            self._write(e)
+        except OSError as ex:
+            print("notify spool write failed:", ex)  # se intenta igual, solo en memoria
+        with self._cv:
+            self._pending.append(e)
+            self.stats["queued"] += 1
+            self._cv.notify()
+
+    def _load_spool(self):
+        if not self.spool.is_dir():
+            return
+        for p in sorted(self.spool.glob("*.json")):
+            try:
+                e = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            e["next_try"] = 0  # tras reiniciar se reintenta enseguida (respetando el límite por destino)
+            self._pending.append(e)
+
+    def _done(self, e):
+        try:
+            self._entry_path(e).unlink()
+        except OSError:
+            pass
+
+    def _dead(self, e):
+        dead = self.spool / "dead"
+        dead.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(self._entry_path(e), dead / self._entry_path(e).name)
+        except OSError:
+            pass
+
+    # ---------- emisor ----------
+    def _post(self, dest, body) -> bool:
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        r = self._session.post(dest, json=body, timeout=self.timeout)
+        return 200 <= r.status_code < 300
+
+    def _next_due(self):
+        """(entrada lista para enviar o None, segundos hasta la próxima). Aplica el límite por destino."""
+        now = time.time()
+        wait = None
+        for e in sorted(self._pending, key=lambda e: (e["next_try"], e["id"])):
+            if e["next_try"] > now:
+                w = e["next_try"] - now
+                wait = w if wait is None else min(wait, w)
+                continue
+            b = self._buckets.setdefault(e["dest"], Bucket(self.rate))
+            w = b.wait_time()
+            if w == 0:
+                self._pending.remove(e)
+                return e, 0
+            self.stats["rate_limited"] += 1
+            e["next_try"] = now + w
+            wait = w if wait is None else min(wait, w)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while True:
+                    if self._stop:
+                        return
+                    e, wait = self._next_due()
+                    if e:
+                        break
+                    self._cv.wait(wait)
+            try:
+                ok = self._send(e["dest"], e["body"])
+            except Exception as ex:
+                ok = False
+                e["error"] = str(ex)[:200]
+            if ok:
+                self._done(e)
+                self.stats["sent"] += 1
+                metrics.counter("notify_sent_total", "Notificaciones enviadas").inc()
+                with self._cv:
+                    self._cv.notify_all()
+                continue
+            e["attempts"] += 1
+            self.stats["failed"] += 1
+            metrics.counter("notify_failed_total", "Envíos de notificación fallidos").inc()
+            if e["attempts"] >= self.max_attempts:
+                self._dead(e)
+                self.stats["dead"] += 1
+                continue
+            e["next_try"] = time.time() + min(NOTIFY_MAX_BACKOFF, 5 * 2 ** (e["attempts"] - 1))
+            try:
+                self._write(e)
+            except OSError:
+                pass
+            with self._cv:
+                self._pending.append(e)
+                self._cv.notify_all()
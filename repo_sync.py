@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# repo_sync.py
+"""
+Sincronización paralela e incremental de repos espejo (reemplaza Repositorio.sh)
+- Pool de workers (SYNC_WORKERS)
+- ls-remote antes de nada: si la punta remota no se movió, no hay fetch ni reset
+- Clones y fetch parciales/superficiales (SYNC_DEPTH, SYNC_FILTER; por defecto --depth 1 --filter=blob:none)
+- --only owner/repo (o solo el nombre) para sincronizar únicamente el repo del webhook
+- Reporte por repo con tiempos (JSON lines) y resumen final
+Repos: SYNC_REPOS="owner/repo[@rama],..." (también acepta URLs o rutas locales)
+"""
+import os, sys, json, time, subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BASE_DIR = Path(os.environ.get("SYNC_BASE_DIR", "/opt/star-tigo-defensa/git_sync"))
+DEFAULT_REPOS = [
+    "FernandoGuadalupeMendezEspinoza/proyecto-1",
+    "FernandoGuadalupeMendezEspinoza/proyecto-IA",
+    "FernandoGuadalupeMendezEspinoza/proyecto-robotics",
+]
+REPOS = [r.strip() for r in os.environ.get("SYNC_REPOS", ",".join(DEFAULT_REPOS)).split(",") if r.strip()]
+BRANCH = os.environ.get("SYNC_BRANCH", "main")
+SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", 8))
+SYNC_DEPTH = os.environ.get("SYNC_DEPTH", "1")          # "" = historia completa
+SYNC_FILTER = os.environ.get("SYNC_FILTER", "blob:none")  # "" = clon completo
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+
+def parse_spec(spec: str):
+    # "owner/repo@rama", "/ruta/repo.git@rama"; el "@" de git@host:... o de un token no es rama
+    repo, branch = spec, ""
+    base, sep, br = spec.rpartition("@")
+    if sep and base and "/" not in br and ":" not in br:
+        repo, branch = base, br
+    name = os.path.basename(repo.rstrip("/"))
+    if name.endswith(".git"):
+        name = name[:-4]
+    return repo, branch or BRANCH, name
+
+def repo_url(repo: str) -> str:
+    if "://" in repo or repo.startswith("/") or repo.startswith("git@"):
+        return repo
+    if GITHUB_TOKEN:
+        return "https://%s@github.com/%s.git" % (GITHUB_TOKEN, repo)
+    return "git@github.com:%s.git" % repo
+
+def _git(*args, cwd=None):
+    r = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if r.returncode != 0:
+        msg = r.stderr.strip()
+        if GITHUB_TOKEN:
+            msg = msg.replace(GITHUB_TOKEN, "***")
+        raise RuntimeError("git %s: %s" % (args[0], msg))
+    return r.stdout
+
+def _shallow_opts():
+    opts = []
+    if SYNC_DEPTH:
+        opts.append("--depth=" + SYNC_DEPTH)
+    if SYNC_FILTER:
+        opts.append("--filter=" + SYNC_FILTER)
+    return opts
+
+def sync_one(spec: str, base_dir: Path = None):
+    base_dir = Path(base_dir or BASE_DIR)
+    repo, branch, name = parse_spec(spec)
+    dest = base_dir / name
+    url = repo_url(repo)
+    t0 = time.time()
+    res = {"repo": repo, "branch": branch, "dir": str(dest)}
+    try:
+        if (dest / ".git").exists():
+            out = _git("ls-remote", url, "refs/heads/" + branch)
+            remote = out.split()[0] if out.strip() else None
+            local = _git("rev-parse", "HEAD", cwd=dest).strip()
+            res["ls_remote_s"] = round(time.time() - t0, 3)
+            if remote is None:
+                raise RuntimeError("remote branch not found: " + branch)
+            if remote == local:
+                res.update(action="unchanged", sha=local)
+            else:
+                _git("fetch", "--prune", *_shallow_opts(), url, branch, cwd=dest)
+                _git("reset", "-q", "--hard", "FETCH_HEAD", cwd=dest)
+                res.update(action="updated", sha=remote, previous=local)
+        else:
+            base_dir.mkdir(parents=True, exist_ok=True)
+            _git("clone", "-q", "--single-branch", "-b", branch, *_shallow_opts(), url, str(dest))
+            res.update(action="cloned", sha=_git("rev-parse", "HEAD", cwd=dest).strip())
+        res["ok"] = True
+    except Exception as e:
+        res.update(ok=False, action="error", error=str(e))
+    res["seconds"] = round(time.time() - t0, 3)
+    return res
+
+def select(repos, only):
+    if not only:
+        return list(repos)
+    wanted = set(only)
+    out = []
+    for spec in repos:
+        repo, _, name = parse_spec(spec)
+        if spec in wanted or repo in wanted or name in wanted:
+            out.append(spec)
+    return out
+
+def sync_all(repos=None, only=None, workers=None, base_dir=None, report=None):
+    specs = select(repos or REPOS, only)
+    t0 = time.time()
+    results = []
+    if specs:
+        with ThreadPoolExecutor(max_workers=min(workers or SYNC_WORKERS, len(specs))) as ex:
+            for fut in as_completed([ex.submit(sync_one, s, base_dir) for s in specs]):
+                r = fut.result()
+                results.append(r)
+                if report:
+                    report(r)
+    summary = {"repos": len(specs), "seconds": round(time.time() - t0, 3)}
+    for r in results:
+        summary[r["action"]] = summary.get(r["action"], 0) + 1
+    return results, summary
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Sincroniza los repos espejo en paralelo")
+    ap.add_argument("--only", action="append", help="owner/repo o nombre (repetible)")
+    ap.add_argument("--workers", type=int, default=SYNC_WORKERS)
+    ap.add_argument("--base-dir", default=str(BASE_DIR))
+    args = ap.parse_args()
+    if args.only and not select(REPOS, args.only):
+        print(json.dumps({"repos": 0, "skipped": args.only, "reason": "not configured"}))
+        sys.exit(0)
+    results, summary = sync_all(only=args.only, workers=args.workers, base_dir=Path(args.base_dir),
+                                report=lambda r: print(json.dumps(r), flush=True))
+    print("[sync] done", json.dumps(summary))
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
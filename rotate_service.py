@@ -2,41 +2,58 @@
 """
 rotate_service.py
 - Rotación determinista y reversible de archivos de texto en SOURCE/
-- Modos: left, right, up, down, binary (bitwise rotate)
+- Modos: left, right, perm (permutación sembrada), up, down, matrix_cw/ccw, binary_left/right
+- Tablas de traducción y streaming en rotation_engine.py
 - Crea rotated/, manifest.json con sha512 por archivo + hmac
 - Hace push a rama rotativa en GitHub/GitLab si config (opcional)
-- Corre en bucle eterno
+- Corre en bucle eterno, o un solo ciclo con --once / run_once() (webhook)
+- Con ROT_SHARD_WORKERS el ciclo se reparte en shards entre varios workers (shard_rotate.py)
+- Con ROT_GENERATIONS (por defecto) cada ciclo escribe rotated/gen-<ts>/, enlaza los archivos sin cambios
+  de la generación anterior y la publica con un único cambio del symlink rotated/current (generations.py)
+- Con ROT_ASSET_BUILD, antes de recorrer SOURCE se minifican/precomprimen los assets de ASSET_SRC
+  con fingerprint en el nombre (asset_build.py): se rotan, guardan y sirven menos bytes
+- Métricas por fase (metrics.py): METRICS_PORT / METRICS_FILE, METRICS_PROFILE_BUDGET
+- Importable sin efectos: ROT_KEY se exige en main() / run_once(), no al importar
 """
-import os, sys, time, json, hmac, hashlib, random, string, shutil, subprocess
+import os, sys, time, json, hmac, hashlib
 from pathlib import Path
+import metrics, generations
+import rotation_engine as engine
 
 BASE = Path(__file__).parent.parent.resolve()
 SOURCE = BASE / "source"
 ROTATED = BASE / "rotated"
 BACKUP = BASE / "backup"
 MANIFEST = ROTATED / "manifest.json"
+MERKLE_MANIFEST = ROTATED / "manifest.merkle.json"
+MANIFEST_BIN = ROTATED / "manifest.bin"
 
 ROT_KEY = os.environ.get("ROT_KEY")               # clave secreta (guardar en Vault)
 GIT_REMOTE = os.environ.get("GIT_REMOTE","origin")
 GIT_PUSH = os.environ.get("GIT_PUSH","false").lower() in ("1","true","yes")
 BRANCH_PREFIX = "rot-"
+GIT_PUSH_BATCH = int(os.environ.get("GIT_PUSH_BATCH", 1))  # ramas pendientes por push
 ROT_INTERVAL = int(os.environ.get("ROT_INTERVAL", 600))
-DEFAULT_MODE = os.environ.get("ROT_MODE","right")  # left/right/up/down/binary
+DEFAULT_MODE = os.environ.get("ROT_MODE","right")  # left/right/perm/up/down/matrix_cw/matrix_ccw/binary_left/binary_right
+ROT_MERKLE = os.environ.get("ROT_MERKLE","false").lower() in ("1","true","yes")  # escribir también manifest.merkle.json
+ROT_MANIFEST_BIN = os.environ.get("ROT_MANIFEST_BIN","false").lower() in ("1","true","yes")  # y manifest.bin
+ROT_GENERATIONS = os.environ.get("ROT_GENERATIONS","true").lower() in ("1","true","yes")  # rotated/gen-<ts>/
+ROT_ASSET_BUILD = os.environ.get("ROT_ASSET_BUILD","false").lower() in ("1","true","yes")  # asset_build.py -> SOURCE
+ROT_SHARD_WORKERS = os.environ.get("ROT_SHARD_WORKERS", "")  # "local:4" o URLs de shard_rotate.py worker
 
-# Charset: ASCII printable + newline + tab + emojis base
-BASE_CHARS = list((string.ascii_letters + string.digits + string.punctuation + " \n\t"))
-EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","🤖","🔥","✨","🌐","🔒"]
-CHARSET = []
-for c in BASE_CHARS + EMOJIS:
-    if c not in CHARSET:
-        CHARSET.append(c)
+# Charset: ASCII printable + newline + tab + emojis base (precalculado en rotation_engine)
+CHARSET = list(engine.CHARSETS["service"])
 
-if not ROT_KEY:
-    print("ERROR: define ROT_KEY en entorno", file=sys.stderr)
-    sys.exit(2)
+SUFFIX_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+def require_key():
+    if not ROT_KEY:
+        raise RuntimeError("define ROT_KEY en entorno")
+    return ROT_KEY
 
 def rand_suffix(n=6):
-    return ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(n))
+    import random
+    return ''.join(random.choice(SUFFIX_CHARS) for _ in range(n))
 
 def sha512_file(path: Path):
     h = hashlib.sha512()
@@ -49,73 +66,41 @@ def hmac_sign_bytes(b: bytes):
     return hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
 
 # ---------- ROTATION ALGORITHMS ----------
-# 1) Character cyclic shift (left/right by n)
+# 1) Character cyclic shift (left/right by n): tabla str.translate cacheada por n
 def char_shift(text: str, n: int):
-    # rotate characters in CHARSET mapping, leave other chars unchanged
-    mapping = {}
-    L = len(CHARSET)
-    for i, c in enumerate(CHARSET):
-        mapping[c] = CHARSET[(i + n) % L]
-    return ''.join(mapping.get(ch, ch) for ch in text)
+    return text.translate(engine.shift_tables(n)[0])
 
 # 2) Line rotation (up/down): rotate lines of a file
 def line_rotate(text: str, lines_up: int):
-    lines = text.splitlines(True)  # preserve newline chars
-    if not lines:
-        return text
-    n = lines_up % len(lines)
-    return ''.join(lines[n:] + lines[:n])
+    return engine.line_rotate(text, lines_up)
 
 # 3) Matrix rotate (90 degrees) — useful for "up/down" visual transforms (optional)
 def matrix_rotate_90(text: str, clockwise=True):
-    lines = [list(line.rstrip('\n')) for line in text.splitlines()]
-    if not lines: return text
-    maxw = max(len(r) for r in lines)
-    for r in lines:
-        while len(r) < maxw:
-            r.append(' ')
-    if clockwise:
-        rotated = list(zip(*lines[::-1]))
-    else:
-        rotated = list(zip(*lines))[::-1]
-    return '\n'.join(''.join(row).rstrip() for row in rotated) + '\n'
+    return engine.matrix_rotate_90(text, clockwise)
 
-# 4) Binary bitwise rotation for bytes
+# 4) Binary bitwise rotation for bytes (tablas de 256 bytes)
 def bytes_rotl(b: bytes, k: int):
-    out = bytearray()
-    k = k % 8
-    for byte in b:
-        out.append(((byte << k) & 0xFF) | (byte >> (8 - k)))
-    return bytes(out)
+    return engine.bytes_rotl(b, k)
 
 def bytes_rotr(b: bytes, k: int):
-    out = bytearray()
-    k = k % 8
-    for byte in b:
-        out.append((byte >> k) | ((byte << (8 - k)) & 0xFF))
-    return bytes(out)
+    return engine.bytes_rotr(b, k)
 
 # ---------- helpers ----------
 def is_text_file(path: Path):
-    try:
-        path.read_text(encoding='utf-8')
-        return True
-    except Exception:
-        return False
+    return engine.is_text(path)
 
-def git_push_rotated(branch_name: str, message: str):
+def git_push_rotated(branch_name: str, message: str, rotated_dir: Path = ROTATED):
+    # commit por plumbing (sin checkout) + push agrupado de las ramas pendientes
+    # siempre bajo rotated/ en el árbol, aunque rotated_dir sea rotated/gen-<ts>: las ramas son comparables
+    import subprocess, git_publish
     try:
-        subprocess.run(["git","checkout","-b",branch_name], cwd=str(BASE), check=True)
-        subprocess.run(["git","add", str(ROTATED)], cwd=str(BASE), check=True)
-        subprocess.run(["git","commit","-m",message], cwd=str(BASE), check=True)
-        subprocess.run(["git","push","-u", GIT_REMOTE, branch_name], cwd=str(BASE), check=True)
-        # return to main safely
-        try:
-            subprocess.run(["git","checkout","main"], cwd=str(BASE), check=True)
-        except subprocess.CalledProcessError:
-            subprocess.run(["git","checkout","master"], cwd=str(BASE), check=True)
+        git_publish.commit_rotation(BASE, rotated_dir, branch_name, message,
+                                    prefix=ROTATED.relative_to(BASE).as_posix())
+        pushed = git_publish.push_pending(BASE, GIT_REMOTE, GIT_PUSH_BATCH)
+        if pushed:
+            print("[rotate] pushed branches", " ".join(pushed))
     except subprocess.CalledProcessError as e:
-        print("Warning: git push failed:", e)
+        print("Warning: git push failed:", e, (e.stderr or "").strip())
 
 def ensure_dirs():
     SOURCE.mkdir(parents=True, exist_ok=True)
@@ -123,72 +108,221 @@ def ensure_dirs():
     BACKUP.mkdir(parents=True, exist_ok=True)
 
 def snapshot_backup():
+    import shutil
     ts = int(time.time()); dst = BACKUP / f"backup_{ts}"
     if not dst.exists():
         shutil.copytree(SOURCE, dst)
 
+def write_merkle_manifest(manifest: dict, path: Path = MERKLE_MANIFEST):
+    import merkle_manifest
+    prev = None
+    if MERKLE_MANIFEST.exists():
+        try:
+            prev = merkle_manifest.load(MERKLE_MANIFEST)  # re-firma incremental
+        except Exception:
+            prev = None
+    mm = merkle_manifest.from_manifest(manifest, ROT_KEY, prev)
+    merkle_manifest.write(mm, path)
+    return mm
+
 # ---------- Core rotation cycle ----------
-def rotate_file(in_path: Path, out_path: Path, mode: str, param: int = 1):
+def rotate_file(in_path: Path, out_path: Path, mode: str, param: int = 1, seed: str = None):
+    """Rota un archivo; devuelve (sha512 del rotado, binary, sha512 del origen)."""
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    if is_text_file(in_path):
-        text = in_path.read_text(encoding='utf-8', errors='ignore')
-        if mode == "right":
-            rotated = char_shift(text, param)
-        elif mode == "left":
-            rotated = char_shift(text, -param)
-        elif mode == "up":
-            rotated = line_rotate(text, param)
-        elif mode == "down":
-            rotated = line_rotate(text, -param)
-        elif mode == "matrix_cw":
-            rotated = matrix_rotate_90(text, clockwise=True)
-        elif mode == "matrix_ccw":
-            rotated = matrix_rotate_90(text, clockwise=False)
+    if mode in ("right", "left", "perm"):
+        # streaming con tabla precompilada; los binarios se copian
+        if mode == "perm":
+            table = engine.perm_tables(seed)[0]
         else:
-            rotated = text
-        out_path.write_text(rotated, encoding='utf-8')
+            table = engine.shift_tables(param if mode == "right" else -param)[0]
+        with metrics.timer("rotate", mode=mode):
+            digest, binary, src_digest = engine.rotate_path(in_path, out_path, table, with_src=True)
+    elif mode in ("binary_left", "binary_right"):
+        # binary: bit rotation; los archivos de texto se copian
+        binary = not engine.is_text(in_path)
+        table = engine.byte_tables(param)[0 if mode == "binary_left" else 1] if binary else None
+        sh = hashlib.sha512()
+        with metrics.timer("rotate", mode=mode):
+            digest = engine.bytes_stream(in_path, out_path, table, src_hash=sh)
+        src_digest = sh.hexdigest()
     else:
-        # binary: we use bit rotation
-        b = in_path.read_bytes()
-        if mode == "binary_left":
-            out_path.write_bytes(bytes_rotl(b, param))
-        elif mode == "binary_right":
-            out_path.write_bytes(bytes_rotr(b, param))
+        try:
+            with metrics.timer("read"):
+                text = engine.read_text(in_path)
+        except UnicodeDecodeError:
+            sh = hashlib.sha512()
+            with metrics.timer("write"):
+                digest, binary = engine.bytes_stream(in_path, out_path, src_hash=sh), True
+            src_digest = sh.hexdigest()
         else:
-            shutil.copy2(in_path, out_path)
+            src_digest = hashlib.sha512(text.encode("utf-8")).hexdigest()
+            with metrics.timer("rotate", mode=mode):
+                if mode == "up":
+                    rotated = line_rotate(text, param)
+                elif mode == "down":
+                    rotated = line_rotate(text, -param)
+                elif mode == "matrix_cw":
+                    rotated = matrix_rotate_90(text, clockwise=True)
+                elif mode == "matrix_ccw":
+                    rotated = matrix_rotate_90(text, clockwise=False)
+                else:
+                    rotated = text
+            with metrics.timer("write"):
+                digest, binary = engine.write_text(out_path, rotated), False
+    metrics.add_bytes("rotate", in_path.stat().st_size)
+    metrics.add_files("rotate")
+    return digest, binary, src_digest
 
-def rotate_cycle(mode: str = DEFAULT_MODE, param: int = 1):
-    ensure_dirs()
-    snapshot_backup()
+def new_seed():
+    return str(int(time.time())) + "-" + rand_suffix(8)
+
+def walk_source():
+    return [Path(root) / fname for root, _, files in os.walk(SOURCE) for fname in files]
+
+def rotate_paths(paths, mode: str, param: int, seed: str, out_dir: Path = None, prev=None, index=None):
+    """Rota cada ruta de SOURCE a out_dir (ROTATED por defecto); entradas del manifest en el mismo orden
+    (shard_rotate.py las reparte). Con prev (generations.reusable) los archivos sin cambios se enlazan;
+    index, si se pasa, recibe la entrada de .index.json de cada archivo."""
+    out_dir = out_dir or ROTATED
     entries = {}
-    seed = str(int(time.time())) + "-" + rand_suffix(8)
+    for in_path in paths:
+        rel = in_path.relative_to(SOURCE)
+        out_path = out_dir / rel
+        src_st = in_path.stat()
+        old = generations.try_link(prev, str(rel), src_st, out_path) if prev else None
+        if old:
+            digest, binary, src_digest = old[2], old[3], old[6]
+            metrics.add_files("link")
+            metrics.add_bytes("link", src_st.st_size)
+        else:
+            # dst puede ser ya un hardlink a la generación publicada (shard reasignado): abrirlo con "wb"
+            # truncaría el inode vivo; se escribe siempre en un inode nuevo
+            if out_path.is_symlink() or out_path.exists():
+                out_path.unlink()
+            # el sha512 sale de la propia escritura: no se vuelve a leer el archivo rotado
+            digest, binary, src_digest = rotate_file(in_path, out_path, mode, param, seed)
+        # ruta estable rotated/<rel> aunque se escriba en rotated/gen-<ts>/ (generations.entry_path la
+        # resuelve); src_sha512: unrotate.py salta las salidas que ya coinciden con el original
+        entries[str(rel)] = {"rotated": str((ROTATED / rel).relative_to(BASE)), "sha512": digest,
+                             "src_sha512": src_digest}
+        if binary:
+            entries[str(rel)]["binary"] = True
+        if index is not None:
+            index[str(rel)] = generations.index_entry(src_st, out_path, digest, binary, src_digest)
+    return entries
+
+def begin_generation(mode: str, param: int, seed: str):
+    """(directorio de salida, generación anterior reutilizable o None); sin ROT_GENERATIONS, (ROTATED, None)."""
+    if not ROT_GENERATIONS:
+        return ROTATED, None
+    prev = generations.reusable(generations.current(ROTATED), mode, param, seed)
+    return generations.new_generation(ROTATED), prev
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(".%s.%d.tmp" % (path.name, os.getpid()))
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+def publish_manifest(entries: dict, mode: str, param: int, seed: str, timestamp: int = None,
+                     gen: Path = None, index: dict = None):
+    """Firma y escribe el manifest (y merkle/bin/push según config); devuelve el manifest firmado.
+    Con gen, los manifests se escriben dentro de la generación y se publica con generations.publish."""
+    out_dir = gen or ROTATED
     # We include mode and param in manifest so unrotate knows what to do.
-    for root, _, files in os.walk(SOURCE):
-        for fname in files:
-            in_path = Path(root) / fname
-            rel = in_path.relative_to(SOURCE)
-            out_path = ROTATED / rel
-            rotate_file(in_path, out_path, mode, param)
-            entries[str(rel)] = {"rotated": str(out_path.relative_to(BASE)), "sha512": sha512_file(out_path)}
-    manifest = {"timestamp": int(time.time()), "seed": seed, "mode": mode, "param": param, "entries": entries}
-    b = json.dumps(manifest, sort_keys=True).encode('utf-8')
-    manifest_hmac = hmac_sign_bytes(b)
-    manifest["hmac"] = manifest_hmac
-    MANIFEST.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    manifest = {"timestamp": timestamp or int(time.time()), "seed": seed, "mode": mode, "param": param,
+                "entries": entries}
+    with metrics.timer("sign"):
+        b = json.dumps(manifest, sort_keys=True).encode('utf-8')
+        manifest_hmac = hmac_sign_bytes(b)
+        manifest["hmac"] = manifest_hmac
+        _write_atomic(out_dir / MANIFEST.name, json.dumps(manifest, indent=2))
+        if ROT_MERKLE:
+            write_merkle_manifest(manifest, out_dir / MERKLE_MANIFEST.name)
+        if ROT_MANIFEST_BIN:
+            import manifest_bin
+            manifest_bin.write(manifest, out_dir / MANIFEST_BIN.name, ROT_KEY)
+    if gen is not None:
+        with metrics.timer("publish"):
+            generations.write_index(gen, mode, param, seed, index or {})
+            generations.publish(ROTATED, gen)
+            removed = generations.gc(ROTATED)
+        if removed:
+            print("[rotate] removed generations", " ".join(removed))
     if GIT_PUSH:
         branch = BRANCH_PREFIX + str(int(time.time())) + "-" + rand_suffix(6)
-        git_push_rotated(branch, f"Auto-rotated {manifest['timestamp']} mode={mode}")
-        print("[rotate] pushed branch", branch)
+        with metrics.timer("push"):
+            git_push_rotated(branch, f"Auto-rotated {manifest['timestamp']} mode={mode}", out_dir)
+        print("[rotate] committed branch", branch)
     print("[rotate] completed mode", mode, "param", param, "hmac", manifest_hmac)
     return manifest
 
+def build_assets():
+    """Build de assets (asset_build.py) hacia SOURCE antes del recorrido; sin ROT_ASSET_BUILD no hace nada."""
+    if not ROT_ASSET_BUILD:
+        return None
+    import asset_build
+    with metrics.timer("assets"):
+        stats = asset_build.build(out=SOURCE)
+    metrics.add_files("assets", stats["written"])
+    print("[rotate] assets", json.dumps(stats))
+    return stats
+
+def rotate_cycle(mode: str = DEFAULT_MODE, param: int = 1):
+    ensure_dirs()
+    build_assets()
+    snapshot_backup()
+    seed = new_seed()
+    out_dir, prev = begin_generation(mode, param, seed)
+    with metrics.timer("walk"):
+        paths = walk_source()
+    index = {} if ROT_GENERATIONS else None
+    entries = rotate_paths(paths, mode, param, seed, out_dir, prev, index)
+    return publish_manifest(entries, mode, param, seed, gen=out_dir if ROT_GENERATIONS else None, index=index)
+
+def run_once(mode: str = DEFAULT_MODE, param: int = 1, keep_manifest: bool = False):
+    """Un solo ciclo de rotación serializado entre procesos (lock sobre rotated/.rotate.lock).
+    keep_manifest=True incluye el manifest completo en el resultado (supervisor.py lo reutiliza)."""
+    import fcntl
+    require_key()
+    ROTATED.mkdir(parents=True, exist_ok=True)
+    t0 = time.time()
+    with open(ROTATED / ".rotate.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        waited = time.time() - t0
+        with metrics.cycle("rotate_cycle"):
+            if ROT_SHARD_WORKERS:
+                # modo repartido: mismo manifest, rotado por shards en varios workers
+                import shard_rotate
+                manifest = shard_rotate.coordinate(mode, param, rs=sys.modules[__name__])[0]
+            else:
+                manifest = rotate_cycle(mode=mode, param=param)
+    res = {"hmac": manifest["hmac"], "timestamp": manifest["timestamp"], "mode": mode, "param": param,
+           "entries": len(manifest["entries"]), "lock_wait_s": round(waited, 3),
+           "seconds": round(time.time() - t0, 3)}
+    if keep_manifest:
+        res["manifest"] = manifest
+    return res
+
 # ---------- main loop ----------
-if __name__ == "__main__":
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        require_key()
+    except RuntimeError as e:
+        print("ERROR:", e, file=sys.stderr)
+        return 2
+    if "--once" in argv:
+        print(json.dumps(run_once(mode=DEFAULT_MODE, param=1)))
+        return 0
+    metrics.init("rotate")
     print("[rotate] service starting. ROT_INTERVAL:", ROT_INTERVAL, "DEFAULT_MODE:", DEFAULT_MODE)
     while True:
         try:
             # you may choose parameterization dynamically or per file
-            rotate_cycle(mode=DEFAULT_MODE, param=1)
+            run_once(mode=DEFAULT_MODE, param=1)
         except Exception as e:
             print("[rotate] error:", e)
         time.sleep(ROT_INTERVAL)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# rotation_engine.py
+"""
+Motor de rotación compartido (rotate_service.py, unrotate.py, Rotación.py, Rotate.py)
+- CHARSETs precalculados: "service" (14 emojis, rotate_service/unrotate) y "perm" (20 emojis, Rotación/Rotate)
+- Tablas str.translate compiladas una vez y cacheadas (LRU, ROT_TABLE_CACHE):
+    * shift_tables(n)     desplazamiento cíclico (modos right/left) y su inversa
+    * perm_tables(seed)   permutación sembrada (misma que build_map de Rotación.py) y su inversa
+    * byte_tables(k)      rotación de bits por byte (modos binary_*) con bytes.translate
+- rotate_path(): archivo a archivo en streaming (bloques de CHUNK caracteres), sin traducción de
+  saltos de línea, y con el sha512 del resultado calculado al escribir (no hace falta releerlo)
+- Si el archivo no es UTF-8 válido se copia tal cual (binario)
+- Opcionalmente hashea también los bytes del origen en la misma pasada (src_sha512 del manifest)
+- Import ligero: random y shutil solo se cargan al usarse (las CLI importan este módulo al arrancar)
+"""
+import os, codecs, string, hashlib
+from functools import lru_cache
+
+CHUNK = 1 << 20
+TABLE_CACHE = int(os.environ.get("ROT_TABLE_CACHE", 64))
+
+BASE_CHARS = string.ascii_letters + string.digits + string.punctuation + " \n\t"
+SERVICE_EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","🤖","🔥","✨","🌐","🔒"]
+PERM_EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","😇","🙂","🙃","😍","😘","😜","🤖","🔥","✨","🌐","🔒"]
+# orden de primera aparición sin duplicados (igual que el bucle "if c not in CHARSET" original)
+CHARSETS = {
+    "service": tuple(dict.fromkeys(list(BASE_CHARS) + SERVICE_EMOJIS)),
+    "perm": tuple(dict.fromkeys(list(BASE_CHARS) + PERM_EMOJIS)),
+}
+
+# ---------- tablas ----------
+@lru_cache(maxsize=TABLE_CACHE)
+def shift_tables(n: int, charset: str = "service"):
+    """(directa, inversa) para el desplazamiento CHARSET[i] -> CHARSET[i+n]."""
+    cs = CHARSETS[charset]
+    L = len(cs)
+    fwd = {ord(c): ord(cs[(i + n) % L]) for i, c in enumerate(cs)}
+    return fwd, {v: k for k, v in fwd.items()}
+
+@lru_cache(maxsize=TABLE_CACHE)
+def perm_tables(seed: str, charset: str = "perm"):
+    """(directa, inversa) de la permutación sembrada; una generación reciente no se recalcula."""
+    import random
+    cs = CHARSETS[charset]
+    perm = list(cs)
+    random.Random(seed).shuffle(perm)
+    fwd = {ord(cs[i]): ord(perm[i]) for i in range(len(cs))}
+    return fwd, {v: k for k, v in fwd.items()}
+
+def build_map(seed: str, charset: str = "perm") -> dict:
+    """Mapa carácter -> carácter (formato histórico de build_map)."""
+    return {chr(k): chr(v) for k, v in perm_tables(seed, charset)[0].items()}
+
+@lru_cache(maxsize=16)
+def byte_tables(k: int):
+    """(rotl, rotr) de k bits como tablas de 256 bytes para bytes.translate."""
+    k %= 8
+    rotl = bytes(((b << k) & 0xFF) | (b >> (8 - k)) for b in range(256))
+    rotr = bytes((b >> k) | ((b << (8 - k)) & 0xFF) for b in range(256))
+    return rotl, rotr
+
+def bytes_rotl(b: bytes, k: int) -> bytes:
+    return b.translate(byte_tables(k)[0])
+
+def bytes_rotr(b: bytes, k: int) -> bytes:
+    return b.translate(byte_tables(k)[1])
+
+# ---------- transformaciones de texto completo ----------
+def line_rotate(text: str, lines_up: int) -> str:
+    lines = text.splitlines(True)  # preserva los saltos de línea
+    if not lines:
+        return text
+    n = lines_up % len(lines)
+    return ''.join(lines[n:] + lines[:n])
+
+def matrix_rotate_90(text: str, clockwise=True) -> str:
+    lines = [line.rstrip('\n') for line in text.splitlines()]
+    if not lines:
+        return text
+    maxw = max(len(r) for r in lines)
+    lines = [r.ljust(maxw) for r in lines]
+    if clockwise:
+        rotated = zip(*lines[::-1])
+    else:
+        rotated = list(zip(*lines))[::-1]
+    return '\n'.join(''.join(row).rstrip() for row in rotated) + '\n'
+
+def read_text(path) -> str:
+    # newline="": sin traducir \r\n, el round-trip conserva los bytes
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+def write_text(path, text: str) -> str:
+    """Escribe y devuelve el sha512 de lo escrito."""
+    b = text.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(b)
+    return hashlib.sha512(b).hexdigest()
+
+# ---------- streaming ----------
+def translate_stream(src, dst, table, chunk: int = CHUNK, src_hash=None) -> str:
+    """src (UTF-8 estricto) -> dst traducido con table; devuelve el sha512 de dst.
+    src_hash (objeto hashlib), si se pasa, recibe los bytes de src.
+    Lanza UnicodeDecodeError si src no es texto."""
+    h = hashlib.sha512()
+    # bytes + decodificador incremental: sin traducir saltos de línea y con los bytes del origen a mano
+    dec = codecs.getincrementaldecoder("utf-8")()
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        while True:
+            raw = fi.read(chunk)
+            s = dec.decode(raw, final=not raw)
+            if src_hash is not None:
+                src_hash.update(raw)
+            if s:
+                b = s.translate(table).encode("utf-8")
+                fo.write(b)
+                h.update(b)
+            if not raw:
+                break
+    return h.hexdigest()
+
+def bytes_stream(src, dst, table=None, chunk: int = CHUNK, src_hash=None) -> str:
+    """Copia binaria (opcionalmente con bytes.translate) calculando el sha512 de dst."""
+    h = hashlib.sha512()
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        while True:
+            b = fi.read(chunk)
+            if not b:
+                break
+            if src_hash is not None:
+                src_hash.update(b)
+            if table is not None:
+                b = b.translate(table)
+            fo.write(b)
+            h.update(b)
+    import shutil
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+def rotate_path(src, dst, table, chunk: int = CHUNK, with_src: bool = False):
+    """Texto -> traducido con table; binario -> copia. Devuelve (sha512, binary),
+    o (sha512, binary, sha512 del origen) con with_src."""
+    sh = hashlib.sha512() if with_src else None
+    try:
+        out = translate_stream(src, dst, table, chunk, sh), False
+    except UnicodeDecodeError:
+        sh = hashlib.sha512() if with_src else None
+        out = bytes_stream(src, dst, None, chunk, sh), True
+    return out + (sh.hexdigest(),) if with_src else out
+
+def sha512_file(path, chunk: int = CHUNK) -> str:
+    h = hashlib.sha512()
+    buf = bytearray(chunk)
+    mv = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(mv[:n])
+    return h.hexdigest()
+
+def is_text(path, chunk: int = CHUNK) -> bool:
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            while f.read(chunk):
+                pass
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def cache_info():
+    return {"shift": shift_tables.cache_info()._asdict(), "perm": perm_tables.cache_info()._asdict(),
+            "bytes": byte_tables.cache_info()._asdict()}
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# scan_reports.py
+"""
+Base de reportes de análisis (Desinfección.py)
+- Un registro por archivo analizado (limpio o no) en SQLite WAL, como credential_store.py, en vez de
+  un report_<sha8>.json por archivo en la cuarentena
+- Clave completa: sha256 (sin colisiones de prefijo), ruta y hora; índices por hash, ruta, hora y
+  veredicto+hora: las búsquedas no recorren la tabla
+- ReportWriter junta los registros y los escribe en una transacción cada SCAN_BATCH registros o
+  SCAN_FLUSH_S segundos (y al cerrar): el coste por archivo es constante
+- El reporte completo (findings de process_file) se guarda como JSON en la columna report
+Uso: scan_reports.py query [--hash H] [--path P] [--verdict flagged|clean] [--since T] [--until T] [--limit N]
+     | export [mismos filtros] [-o archivo.jsonl] | import DIR (report_*.json antiguos) | stats
+     T: epoch o ISO 8601 (2024-05-01, 2024-05-01T12:00:00)
+"""
+import os, sys, json, time, sqlite3, threading
+from datetime import datetime
+
+SCAN_DB = os.environ.get("SCAN_DB", "scan_reports.db")
+SCAN_BATCH = int(os.environ.get("SCAN_BATCH", 200))        # registros por transacción
+SCAN_FLUSH_S = float(os.environ.get("SCAN_FLUSH_S", 5))    # antigüedad máxima de un lote sin escribir
+VERDICTS = ("clean", "flagged")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    path TEXT,
+    ts REAL NOT NULL,
+    verdict TEXT NOT NULL,
+    clamav INTEGER,
+    yara TEXT,
+    virustotal INTEGER,
+    quarantined_to TEXT,
+    report TEXT
+);
+CREATE INDEX IF NOT EXISTS scans_sha ON scans(sha256, ts);
+CREATE INDEX IF NOT EXISTS scans_path ON scans(path, ts);
+CREATE INDEX IF NOT EXISTS scans_ts ON scans(ts);
+CREATE INDEX IF NOT EXISTS scans_verdict ON scans(verdict, ts);
+"""
+
+INSERT = ("INSERT INTO scans(sha256, path, ts, verdict, clamav, yara, virustotal, quarantined_to, report) "
+          "VALUES (?,?,?,?,?,?,?,?,?)")
+COLUMNS = ("id", "sha256", "path", "ts", "verdict", "clamav", "yara", "virustotal", "quarantined_to", "report")
+
+def verdict(findings: dict) -> str:
+    return "flagged" if findings.get("clamav") or findings.get("yara") or findings.get("virustotal") else "clean"
+
+def parse_time(value):
+    """Epoch (número) o ISO 8601 -> epoch; None se queda en None."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+def row_for(findings: dict, path=None, ts=None):
+    return (findings["sha256"].lower(), path, float(ts or time.time()), verdict(findings),
+            int(bool(findings.get("clamav"))), findings.get("yara") or None, int(bool(findings.get("virustotal"))),
+            findings.get("quarantined_to"), json.dumps(findings, default=str))
+
+class ScanStore:
+    def __init__(self, path=SCAN_DB):
+        self.path = path
+        self._local = threading.local()  # una conexión por thread
+        db = self._db()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def insert_many(self, rows):
+        db = self._db()
+        with db:
+            db.executemany(INSERT, rows)
+        return len(rows)
+
+    def _where(self, sha256=None, path=None, verdict=None, since=None, until=None):
+        cond, args = [], []
+        if sha256:
+            sha256 = sha256.lower()
+            if len(sha256) == 64:
+                cond.append("sha256 = ?")
+                args.append(sha256)
+            else:
+                # prefijo (p. ej. el <sha8> de los report_*.json antiguos): rango sobre el índice
+                cond.append("sha256 >= ? AND sha256 < ?")
+                args += [sha256, sha256 + "g"]
+        if path:
+            cond.append("path = ?")
+            args.append(path)
+        if verdict:
+            cond.append("verdict = ?")
+            args.append(verdict)
+        if since is not None:
+            cond.append("ts >= ?")
+            args.append(since)
+        if until is not None:
+            cond.append("ts < ?")
+            args.append(until)
+        return (" WHERE " + " AND ".join(cond)) if cond else "", args
+
+    def query(self, limit=None, newest_first=True, **filters):
+        """Registros que cumplen los filtros (sha256/path/verdict/since/until), como dicts."""
+        where, args = self._where(**filters)
+        order = "DESC" if newest_first else "ASC"
+        sql = "SELECT %s FROM scans%s ORDER BY ts %s, id %s" % (", ".join(COLUMNS), where, order, order)
+        if limit:
+            sql += " LIMIT %d" % int(limit)
+        for r in self._db().execute(sql, args):
+            d = dict(r)
+            d["report"] = json.loads(d["report"]) if d["report"] else None
+            yield d
+
+    def latest(self, sha256):
+        """Último veredicto de un hash (o None): lo que haría falta para no reanalizar lo ya visto."""
+        return next(self.query(sha256=sha256, limit=1), None)
+
+    def stats(self):
+        db = self._db()
+        by = dict(db.execute("SELECT verdict, COUNT(*) FROM scans GROUP BY verdict").fetchall())
+        first, last, hashes = db.execute("SELECT MIN(ts), MAX(ts), COUNT(DISTINCT sha256) FROM scans").fetchone()
+        return {"scans": sum(by.values()), "by_verdict": by, "distinct_sha256": hashes,
+                "first": first, "last": last}
+
+class ReportWriter:
+    """Acumula registros y los escribe por lotes; usar con with (o llamar a close()) para no perder el último."""
+    def __init__(self, store: ScanStore, batch=SCAN_BATCH, flush_s=SCAN_FLUSH_S):
+        self.store, self.batch, self.flush_s = store, batch, flush_s
+        self._rows = []
+        self._since = None
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def add(self, findings: dict, path=None, ts=None):
+        with self._lock:
+            if not self._rows:
+                self._since = time.monotonic()
+            self._rows.append(row_for(findings, path, ts))
+            if len(self._rows) >= self.batch or time.monotonic() - self._since >= self.flush_s:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            rows, self._rows = self._rows, []
+            self.written += self.store.insert_many(rows)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def import_legacy(store: ScanStore, directory):
+    """Carga los report_*.json antiguos de la cuarentena (hora = mtime del archivo; la ruta original
+    no se guardaba)."""
+    n = skipped = 0
+    with ReportWriter(store) as w:
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith("report_") and name.endswith(".json")):
+                continue
+            full = os.path.join(directory, name)
+            try:
+                with open(full, encoding="utf-8") as f:
+                    findings = json.load(f)
+                w.add(findings, path=None, ts=os.path.getmtime(full))
+                n += 1
+            except (OSError, ValueError, KeyError):
+                skipped += 1
+    return {"imported": n, "skipped": skipped}
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Consulta y exportación de reportes de análisis")
+    ap.add_argument("--db", default=SCAN_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("query", "export"):
+        p = sub.add_parser(name)
+        p.add_argument("--hash", help="sha256 completo o prefijo")
+        p.add_argument("--path")
+        p.add_argument("--verdict", choices=VERDICTS)
+        p.add_argument("--since", help="epoch o ISO 8601")
+        p.add_argument("--until", help="epoch o ISO 8601")
+        p.add_argument("--limit", type=int, default=100 if name == "query" else None)
+    sub.choices["export"].add_argument("-o", "--out", help="archivo JSON lines (por defecto stdout)")
+    i = sub.add_parser("import")
+    i.add_argument("dir", help="directorio con report_*.json")
+    sub.add_parser("stats")
+    args = ap.parse_args(argv)
+
+    store = ScanStore(args.db)
+    if args.cmd == "import":
+        print(json.dumps(import_legacy(store, args.dir)))
+        return 0
+    if args.cmd == "stats":
+        print(json.dumps(store.stats(), indent=1))
+        return 0
+    try:
+        filters = {"sha256": args.hash, "path": args.path, "verdict": args.verdict,
+                   "since": parse_time(args.since), "until": parse_time(args.until)}
+    except ValueError as e:
+        print("ERROR: fecha inválida:", e, file=sys.stderr)
+        return 2
+    if args.cmd == "query":
+        t0 = time.perf_counter()
+        rows = list(store.query(limit=args.limit, **filters))
+        print(json.dumps({"results": rows, "count": len(rows),
+                          "ms": round((time.perf_counter() - t0) * 1000, 2)}, indent=1, default=str))
+        return 0 if rows else 1
+    # export: orden cronológico, una línea JSON por registro
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    n = 0
+    try:
+        for r in store.query(limit=args.limit, newest_first=False, **filters):
+            out.write(json.dumps(r, default=str) + "\n")
+            n += 1
+    finally:
+        if args.out:
+            out.close()
+    print("[scan_reports] exportados %d registros" % n, file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# scheduler.py
+"""
+Políticas de planificación adaptativa para supervisor.py
+- ChangeTracker: detecta cambios en SOURCE solo con stat (sin leer contenido) y acumula
+  archivos/bytes cambiados desde la última rotación
+- RotationTrigger: decide rotar cuando los cambios acumulados superan un umbral o el último
+  manifest supera la edad máxima; respeta un hueco mínimo proporcional al coste del último ciclo
+- FixedPolicy / BackoffPolicy: intervalo fijo, o intervalo que se duplica mientras no hay
+  cambios y vuelve al mínimo en cuanto los hay
+Cada decisión devuelve (segundos, motivo) para poder exponerla.
+"""
+import os, time
+
+ROT_CHANGE_FILES = int(os.environ.get("ROT_CHANGE_FILES", 1))          # archivos cambiados para rotar
+ROT_CHANGE_BYTES = int(os.environ.get("ROT_CHANGE_BYTES", 0))          # o bytes cambiados (0 = no se usa)
+ROT_MAX_AGE = int(os.environ.get("ROT_MAX_AGE", 3600))                 # rotar aunque no haya cambios
+ROT_MIN_INTERVAL = int(os.environ.get("ROT_MIN_INTERVAL", 30))         # hueco mínimo entre rotaciones
+ROT_MAX_DUTY = float(os.environ.get("ROT_MAX_DUTY", 0.5))              # fracción máxima del tiempo rotando
+
+class ChangeTracker:
+    def __init__(self, root):
+        self.root = str(root)
+        self.snapshot = None
+        self.pending_files = 0
+        self.pending_bytes = 0
+
+    def _scan(self):
+        out = {}
+        stack = [self.root]
+        while stack:
+            d = stack.pop()
+            try:
+                it = os.scandir(d)
+            except FileNotFoundError:
+                continue
+            with it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file(follow_symlinks=False):
+                        st = e.stat(follow_symlinks=False)
+                        out[e.path] = (st.st_mtime_ns, st.st_size)
+        return out
+
+    def poll(self, since_ns=None):
+        """Escanea y acumula; devuelve {files, bytes, pending_files, pending_bytes, scanned}.
+        En el primer escaneo solo cuenta lo modificado después de since_ns (mtime del último manifest)."""
+        cur = self._scan()
+        files = nbytes = 0
+        if self.snapshot is None:
+            if since_ns is not None:
+                for mtime, size in cur.values():
+                    if mtime > since_ns:
+                        files += 1
+                        nbytes += size
+        else:
+            for path, st in cur.items():
+                if self.snapshot.get(path) != st:
+                    files += 1
+                    nbytes += st[1]
+            files += sum(1 for path in self.snapshot if path not in cur)
+        self.snapshot = cur
+        self.pending_files += files
+        self.pending_bytes += nbytes
+        return {"files": files, "bytes": nbytes, "pending_files": self.pending_files,
+                "pending_bytes": self.pending_bytes, "scanned": len(cur)}
+
+    def reset(self):
+        self.pending_files = self.pending_bytes = 0
+
+class RotationTrigger:
+    def __init__(self, change_files=ROT_CHANGE_FILES, change_bytes=ROT_CHANGE_BYTES, max_age=ROT_MAX_AGE,
+                 min_interval=ROT_MIN_INTERVAL, max_duty=ROT_MAX_DUTY):
+        self.change_files, self.change_bytes, self.max_age = change_files, change_bytes, max_age
+        self.min_interval, self.max_duty = min_interval, max_duty
+        self.last_end = None        # time.time() del fin de la última rotación
+        self.last_cost = 0.0        # segundos que tardó
+
+    def rotated(self, seconds, at=None):
+        self.last_end = at or time.time()
+        self.last_cost = seconds
+
+    def min_gap(self):
+        # con max_duty=0.5 y un ciclo de 40s, al menos 40s de reposo entre rotaciones
+        duty_gap = self.last_cost * (1.0 / self.max_duty - 1.0) if self.max_duty > 0 else 0.0
+        return max(self.min_interval, duty_gap)
+
+    def decide(self, pending_files, pending_bytes, manifest_ts=None, now=None):
+        """(rotar_en_segundos | None, motivo)."""
+        now = now or time.time()
+        reason = None
+        if pending_files and pending_files >= self.change_files:
+            reason = "changed_files"
+        elif self.change_bytes and pending_bytes >= self.change_bytes:
+            reason = "changed_bytes"
+        else:
+            last = max(filter(None, (self.last_end, manifest_ts)), default=None)
+            if last is None or now - last >= self.max_age:
+                reason = "max_age"
+        if reason is None:
+            return None, "below_threshold"
+        if self.last_end is None:
+            return 0.0, reason
+        return max(0.0, self.last_end + self.min_gap() - now), reason
+
+class TriggeredPolicy:
+    """Solo corre cuando otra decisión la adelanta (rotate en modo adaptativo)."""
+    def next_delay(self, res):
+        return float("inf"), "await_trigger"
+
+class FixedPolicy:
+    def __init__(self, interval):
+        self.interval = interval
+
+    def next_delay(self, res):
+        return self.interval, "fixed"
+
+class BackoffPolicy:
+    def __init__(self, lo, hi, factor=2.0):
+        self.lo, self.hi, self.factor = lo, hi, factor
+        self.current = lo
+
+    def next_delay(self, res):
+        # res["changed"] lo rellena cada tarea; un fallo también vuelve al mínimo
+        if not res or res.get("changed") or res.get("ok") is False:
+            self.current = self.lo
+            return self.current, "activity"
+        self.current = min(self.hi, self.current * self.factor)
+        return self.current, "idle"
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# shard_rotate.py
+"""
+Rotación repartida en shards entre varios workers (procesos locales u otros hosts por HTTP)
+- El coordinador recorre SOURCE una vez y reparte las rutas relativas por hash (blake2b) en N shards
+- Cada worker rota su shard con la misma seed/modo/param (rotate_service.rotate_paths) y devuelve
+  un sub-manifest firmado con HMAC-SHA512(ROT_KEY)
+- El coordinador une las entradas en el orden del recorrido y firma con rotate_service.publish_manifest:
+  el manifest y su HMAC son idénticos a los de un rotate_cycle en un solo host con la misma seed/timestamp
+- Si un worker falla, no responde (ROT_SHARD_TIMEOUT) o devuelve un sub-manifest inválido, su shard se
+  reasigna a otro worker (ROT_SHARD_RETRIES); lo que quede sin rotar lo rota el propio coordinador
+- Protocolo HTTP: POST /rotate con el job en JSON (cabecera X-Shard-Auth = HMAC del cuerpo), GET /health
+Los hosts comparten SOURCE y rotated/ (NFS / volumen común): cada worker escribe directamente en la
+generación en curso (rotated/gen-<ts>/, ver generations.py) y enlaza lo que no cambió desde la anterior.
+Uso:
+  shard_rotate.py worker [--port 8701]
+  shard_rotate.py run [--workers local:4 | http://10.0.0.2:8701,http://10.0.0.3:8701] [--shards 8]
+  (o ROT_SHARD_WORKERS=... en rotate_service.py / supervisor.py)
+"""
+import os, sys, json, time, hmac, hashlib, queue, threading
+import metrics, generations
+
+ROT_SHARD_WORKERS = os.environ.get("ROT_SHARD_WORKERS", "local:%d" % min(8, os.cpu_count() or 1))
+ROT_SHARDS = int(os.environ.get("ROT_SHARDS", 0))               # 0 = 2 shards por worker
+ROT_SHARD_TIMEOUT = int(os.environ.get("ROT_SHARD_TIMEOUT", 600))  # segundos por shard
+ROT_SHARD_RETRIES = int(os.environ.get("ROT_SHARD_RETRIES", 2))    # reasignaciones por shard
+ROT_SHARD_PORT = int(os.environ.get("ROT_SHARD_PORT", 8701))
+
+_rs = None
+
+def rotator():
+    global _rs
+    if _rs is None:
+        import rotate_service
+        _rs = rotate_service
+    return _rs
+
+# ---------- reparto ----------
+def shard_of(rel: str, shards: int) -> int:
+    # estable entre hosts y ejecuciones (no depende de PYTHONHASHSEED)
+    return int.from_bytes(hashlib.blake2b(rel.encode("utf-8"), digest_size=8).digest(), "big") % shards
+
+def partition(rels, shards: int):
+    parts = [[] for _ in range(shards)]
+    for rel in rels:
+        parts[shard_of(rel, shards)].append(rel)
+    return parts
+
+def sign_bytes(b: bytes, key: str) -> str:
+    return hmac.new(key.encode("utf-8"), b, hashlib.sha512).hexdigest()
+
+def sign_sub(sub: dict, key: str) -> str:
+    return sign_bytes(json.dumps({k: v for k, v in sub.items() if k != "hmac"}, sort_keys=True).encode("utf-8"), key)
+
+# ---------- worker ----------
+def rotate_shard(job, rs=None):
+    """Rota las rutas del job; devuelve el sub-manifest {shard, entries, missing, files, seconds, hmac}."""
+    rs = rs or rotator()
+    key = rs.require_key()
+    t0 = time.time()
+    src = rs.SOURCE.resolve()
+    paths, missing = [], []
+    for rel in job["paths"]:
+        p = rs.SOURCE / rel
+        if not p.resolve().is_relative_to(src):
+            raise ValueError("path outside SOURCE: %s" % rel)
+        if p.is_file():
+            paths.append(p)
+        else:
+            missing.append(rel)  # borrado entre el recorrido y la rotación
+    out_dir, prev, index = rs.ROTATED, None, None
+    if job.get("gen"):
+        if "/" in job["gen"] or not job["gen"].startswith(generations.PREFIX):
+            raise ValueError("bad generation: %s" % job["gen"])
+        out_dir, index = rs.ROTATED / job["gen"], {}
+        if job.get("prev"):
+            prev = generations.reusable(rs.ROTATED / job["prev"], job["mode"], job["param"], job["seed"])
+    entries = rs.rotate_paths(paths, job["mode"], job["param"], job["seed"], out_dir, prev, index)
+    sub = {"shard": job["shard"], "seed": job["seed"], "entries": entries, "missing": missing, "index": index,
+           "files": len(entries), "seconds": round(time.time() - t0, 3), "host": os.uname().nodename}
+    sub["hmac"] = sign_sub(sub, key)
+    return sub
+
+def _warm():
+    rotator()
+
+def serve(port=ROT_SHARD_PORT, addr="0.0.0.0"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    key = rotator().require_key()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, obj):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self._reply(404, {"ok": False})
+            self._reply(200, {"ok": True, "pid": os.getpid()})
+
+        def do_POST(self):
+            if self.path != "/rotate":
+                return self._reply(404, {"ok": False})
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not hmac.compare_digest(sign_bytes(body, key), self.headers.get("X-Shard-Auth", "")):
+                return self._reply(403, {"ok": False, "error": "bad signature"})
+            try:
+                job = json.loads(body)
+                with metrics.timer("shard_rotate"):
+                    sub = rotate_shard(job)
+            except Exception as e:
+                return self._reply(500, {"ok": False, "error": str(e)})
+            print("[shard] rotated shard", job["shard"], "files", sub["files"], "in", sub["seconds"], "s")
+            self._reply(200, sub)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer((addr, int(port)), Handler)
+    print("[shard] worker listening on", port)
+    srv.serve_forever()
+
+class LocalWorker:
+    """Proceso local (spawn) que mantiene rotate_service importado entre ciclos."""
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+
+    def run(self, job, timeout):
+        import multiprocessing
+        if self.pool is None:
+            self.pool = multiprocessing.get_context("spawn").Pool(1, initializer=_warm)
+        try:
+            return self.pool.apply_async(rotate_shard, (job,)).get(timeout)
+        except BaseException:
+            self.close()  # proceso colgado o muerto: se recrea en el próximo ciclo
+            raise
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+class HttpWorker:
+    def __init__(self, url, key):
+        self.name = self.url = url.rstrip("/")
+        self.key = key
+
+    def run(self, job, timeout):
+        import urllib.request
+        body = json.dumps(job).encode("utf-8")
+        req = urllib.request.Request(self.url + "/rotate", data=body, headers={
+            "Content-Type": "application/json", "X-Shard-Auth": sign_bytes(body, self.key)})
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            return json.loads(r.read())
+
+    def close(self):
+        pass
+
+_workers = {}
+
+def get_workers(spec: str, key: str):
+    """"local:N" y/o URLs separadas por comas; los pools locales se reutilizan entre ciclos."""
+    if spec not in _workers:
+        out = []
+        for item in filter(None, (s.strip() for s in spec.split(","))):
+            if item.startswith("local"):
+                n = int(item.partition(":")[2] or 1)
+                out.extend(LocalWorker("local-%d" % i) for i in range(n))
+            else:
+                out.append(HttpWorker(item, key))
+        _workers[spec] = out
+    return _workers[spec]
+
+# ---------- coordinador ----------
+def check_sub(sub, job, key):
+    if not isinstance(sub, dict) or sub.get("shard") != job["shard"] or sub.get("seed") != job["seed"]:
+        raise ValueError("sub-manifest for another job")
+    if not hmac.compare_digest(sign_sub(sub, key), sub.get("hmac") or ""):
+        raise ValueError("sub-manifest hmac mismatch")
+    if set(sub["entries"]) | set(sub["missing"]) != set(job["paths"]):
+        raise ValueError("sub-manifest does not cover the shard")
+
+def run_shards(parts, base_job, workers, key, timeout=ROT_SHARD_TIMEOUT, retries=ROT_SHARD_RETRIES):
+    """Reparte los shards no vacíos entre los workers; devuelve ({shard: sub}, stats).
+    Un worker que falla sale del ciclo y su shard vuelve a la cola para otro."""
+    pending = queue.Queue()
+    for i, paths in enumerate(parts):
+        if paths:
+            pending.put((i, 0))
+    results, lock = {}, threading.Lock()
+    stats = {"shards": len(parts), "workers": len(workers), "reassigned": 0, "failed_workers": [],
+             "by_worker": {}}
+    reassigned = metrics.counter("shard_reassigned_total", "Shards reasignados tras un fallo de worker")
+
+    def loop(w):
+        while True:
+            try:
+                i, attempt = pending.get_nowait()
+            except queue.Empty:
+                return
+            job = dict(base_job, shard=i, paths=parts[i])
+            try:
+                with metrics.timer("shard", worker=w.name):
+                    sub = w.run(job, timeout)
+                check_sub(sub, job, key)
+            except Exception as e:
+                print("[shard] worker", w.name, "failed on shard", i, ":", repr(e))
+                w.close()
+                with lock:
+                    stats["failed_workers"].append(w.name)
+                    if attempt < retries:
+                        stats["reassigned"] += 1
+                        reassigned.inc()
+                        pending.put((i, attempt + 1))
+                return
+            with lock:
+                results[i] = sub
+                stats["by_worker"][w.name] = stats["by_worker"].get(w.name, 0) + 1
+
+    threads = [threading.Thread(target=loop, args=(w,), name="shard-%s" % w.name, daemon=True) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, stats
+
+def coordinate(mode=None, param=1, workers=None, shards=None, rs=None, timestamp=None):
+    """Un ciclo de rotación repartido; devuelve (manifest firmado, stats). No toma el lock de rotated/
+    (run_once lo hace); workers = spec "local:N,http://..." o lista de workers."""
+    rs = rs or rotator()
+    key = rs.require_key()
+    mode = mode or rs.DEFAULT_MODE
+    rs.ensure_dirs()
+    rs.build_assets()
+    rs.snapshot_backup()
+    seed = rs.new_seed()
+    prev = generations.current(rs.ROTATED) if rs.ROT_GENERATIONS else None
+    gen, _ = rs.begin_generation(mode, param, seed)
+    with metrics.timer("walk"):
+        rels = [str(p.relative_to(rs.SOURCE)) for p in rs.walk_source()]
+    if workers is None or isinstance(workers, str):
+        workers = get_workers(workers or rs.ROT_SHARD_WORKERS or ROT_SHARD_WORKERS, key)
+    shards = shards or ROT_SHARDS or 2 * max(1, len(workers))
+    parts = partition(rels, shards)
+    base_job = {"seed": seed, "mode": mode, "param": param}
+    if rs.ROT_GENERATIONS:
+        base_job.update(gen=gen.name, prev=prev.name if prev else None)
+    t0 = time.time()
+    subs, stats = run_shards(parts, base_job, workers, key)
+    # lo que ningún worker pudo rotar se rota aquí: el ciclo termina igual
+    local = [i for i, paths in enumerate(parts) if paths and i not in subs]
+    for i in local:
+        subs[i] = rotate_shard(dict(base_job, shard=i, paths=parts[i]), rs)
+    stats.update(coordinator_shards=local, seconds=round(time.time() - t0, 3))
+    merged, index = {}, {}
+    for sub in subs.values():
+        merged.update(sub["entries"])
+        index.update(sub.get("index") or {})
+    # mismo orden de entradas que el recorrido de un rotate_cycle en un solo host
+    entries = {rel: merged[rel] for rel in rels if rel in merged}
+    manifest = rs.publish_manifest(entries, mode, param, seed, timestamp,
+                                   gen=gen if rs.ROT_GENERATIONS else None, index=index)
+    print("[shard] %d shards on %d workers, reassigned %d, coordinator %d, %.2fs" % (
+        shards, len(workers), stats["reassigned"], len(local), stats["seconds"]))
+    return manifest, stats
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Rotación repartida en shards (coordinador / worker)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="servir POST /rotate para un coordinador")
+    w.add_argument("--port", type=int, default=ROT_SHARD_PORT)
+    r = sub.add_parser("run", help="un ciclo repartido (con el lock de rotated/)")
+    r.add_argument("--workers", default=ROT_SHARD_WORKERS)
+    r.add_argument("--shards", type=int, default=ROT_SHARDS)
+    r.add_argument("--mode")
+    r.add_argument("--param", type=int, default=1)
+    args = ap.parse_args(argv)
+    rs = rotator()
+    try:
+        rs.require_key()
+    except RuntimeError as e:
+        print("ERROR:", e, file=sys.stderr)
+        return 2
+    if args.cmd == "worker":
+        metrics.init("shard_worker")
+        serve(args.port)
+        return 0
+    import fcntl
+    rs.ROTATED.mkdir(parents=True, exist_ok=True)
+    with open(rs.ROTATED / ".rotate.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest, stats = coordinate(args.mode, args.param, args.workers, args.shards, rs)
+    stats.update(hmac=manifest["hmac"], entries=len(manifest["entries"]))
+    print(json.dumps(stats))
+    for w in _workers.get(args.workers, []):
+        w.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# supervisor.py
+"""
+Supervisor único para rotate / verify / repair / monitor (reemplaza los bucles while True por servicio)
+- Un solo runtime: cada módulo se importa una vez y los ciclos se planifican como tareas
+- Cachés compartidas:
+    * manifest parseado (por stat; el HMAC se valida una vez por versión)
+    * índice de hashes (path -> mtime/tamaño/inodo/ctime/sha512; solo se re-hashea lo que cambió)
+    * índice de mirrors para repair (se relee solo si cambia el directorio)
+- Coordinación: verify corre justo después de cada rotate; rotate y verify nunca se solapan;
+  una tarea nunca se solapa consigo misma
+- SUPERVISOR_ISOLATE="repair,monitor" ejecuta esas tareas en un proceso worker propio (persistente)
+- SUPERVISOR_SCHEDULE=adaptive (por defecto; ver scheduler.py): una tarea "watch" hace stat de SOURCE
+  y dispara rotate por umbral de cambios o edad máxima; verify y repair se espacian mientras no
+  hay cambios. SUPERVISOR_SCHEDULE=fixed mantiene los intervalos fijos.
+  Cada decisión se registra en el log, en métricas y en SUPERVISOR_STATUS (JSON) si se define.
+Env: SUPERVISOR_TASKS (rotate,verify,repair), ROT_INTERVAL, VERIFY_INTERVAL, REPAIR_INTERVAL,
+     MONITOR_INTERVAL, VERIFY_FULL_EVERY, REPAIR_SCRIPT, MONITOR_SCRIPT, WATCH_MIN/MAX, VERIFY_MIN/MAX,
+     REPAIR_MIN/MAX (+ ROT_CHANGE_FILES, ROT_CHANGE_BYTES, ROT_MAX_AGE, ROT_MIN_INTERVAL, ROT_MAX_DUTY)
+"""
+import os, sys, time, json, signal, threading, importlib.util
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import metrics, scheduler, generations
+
+HERE = Path(__file__).parent.resolve()
+TASKS = [t.strip() for t in os.environ.get("SUPERVISOR_TASKS", "rotate,verify,repair").split(",") if t.strip()]
+ISOLATE = {t.strip() for t in os.environ.get("SUPERVISOR_ISOLATE", "").split(",") if t.strip()}
+ROT_INTERVAL = int(os.environ.get("ROT_INTERVAL", 600))
+VERIFY_INTERVAL = int(os.environ.get("VERIFY_INTERVAL", 300))   # respaldo: verify ya corre tras cada rotate
+REPAIR_INTERVAL = int(os.environ.get("REPAIR_INTERVAL", 15))
+MONITOR_INTERVAL = int(os.environ.get("MONITOR_INTERVAL", 60))
+VERIFY_FULL_EVERY = int(os.environ.get("VERIFY_FULL_EVERY", 12))  # cada N verify se re-hashea todo
+# en el despliegue (Dokercompos.yml) el repair vive en ../repair; en el repo es Motori.py
+REPAIR_SCRIPT = os.environ.get("REPAIR_SCRIPT") or next(
+    (str(p) for p in (HERE / "Motori.py", HERE.parent / "repair" / "monitor_and_repair.py") if p.exists()), "")
+MONITOR_SCRIPT = os.environ.get("MONITOR_SCRIPT") or str(HERE / "Deimon.py")
+SCHEDULE = os.environ.get("SUPERVISOR_SCHEDULE", "adaptive")
+WATCH_MIN = int(os.environ.get("WATCH_MIN", 10))
+WATCH_MAX = int(os.environ.get("WATCH_MAX", 120))
+VERIFY_MIN = int(os.environ.get("VERIFY_MIN", 20))
+VERIFY_MAX = int(os.environ.get("VERIFY_MAX", 900))
+REPAIR_MIN = int(os.environ.get("REPAIR_MIN", 15))
+REPAIR_MAX = int(os.environ.get("REPAIR_MAX", 300))
+STATUS_FILE = os.environ.get("SUPERVISOR_STATUS")
+
+def load_script(path, name):
+    """Importa un script por ruta (los nombres de archivo del despliegue no son módulos importables)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None:
+        raise RuntimeError("cannot load %s" % path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # ctime no se puede fijar desde userspace (utime lo actualiza): un archivo alterado con el mtime
+    # restaurado no pasa por igual entre verificaciones completas; el inodo detecta reemplazos
+    return (st.st_mtime_ns, st.st_size, st.st_ino, st.st_ctime_ns)
+
+# ---------- cachés compartidas ----------
+class ManifestCache:
+    def __init__(self, path: Path, key: str):
+        self.path, self.key = Path(path), key
+        self.lock = threading.Lock()
+        self.stamp = self.manifest = self.root = None
+        self.hmac_ok = False
+
+    def put(self, manifest: dict):
+        # manifest recién firmado por rotate en este mismo runtime: no hace falta re-leerlo
+        with self.lock:
+            self.manifest, self.hmac_ok, self.stamp = manifest, True, _stamp(self.path)
+            self.root = generations.manifest_root(self.path)
+
+    def get(self):
+        """(manifest, hmac_ok, root); solo re-parsea y re-valida si el archivo cambió en disco.
+        root: generación de la que se leyó (generations.entry_path resuelve las entradas en ella)."""
+        import deep_verify
+        with self.lock:
+            stamp = _stamp(self.path)
+            if stamp is None:
+                self.stamp = self.manifest = self.root = None
+                return None, False, None
+            if stamp != self.stamp:
+                root = generations.manifest_root(self.path)
+                m = json.loads((root / self.path.name if root else self.path).read_text(encoding='utf-8'))
+                self.manifest, self.hmac_ok, self.stamp = m, deep_verify.hmac_ok(m, self.key), stamp
+                self.root = root
+                metrics.counter("manifest_parses_total", "Lecturas completas del manifest").inc()
+            return self.manifest, self.hmac_ok, self.root
+
+class HashIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.hits = self.misses = 0
+
+    def sha512(self, path) -> str:
+        import deep_verify
+        key = str(path)
+        stamp = _stamp(key)
+        if stamp is None:
+            raise FileNotFoundError(key)
+        with self.lock:
+            hit = self.data.get(key)
+        if hit and hit[0] == stamp:
+            self.hits += 1
+            return hit[1]
+        self.misses += 1
+        digest = deep_verify.sha512_file(key)
+        with self.lock:
+            self.data[key] = (stamp, digest)
+        return digest
+
+    def seed(self, path, digest):
+        stamp = _stamp(path)
+        if stamp is not None:
+            with self.lock:
+                self.data[str(path)] = (stamp, digest)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+class MirrorIndex:
+    def __init__(self, directory: Path):
+        self.dir = Path(directory)
+        self.stamp = None
+        self.names = []
+
+    def find(self, name):
+        stamp = _stamp(self.dir)
+        if stamp != self.stamp:
+            self.names = sorted(os.listdir(self.dir)) if stamp else []
+            self.stamp = stamp
+        for n in self.names:
+            if n.startswith(name):
+                return self.dir / n
+        return None
+
+# ---------- tareas ----------
+class Context:
+    """Estado compartido por las tareas de un mismo proceso (el supervisor o un worker aislado)."""
+    def __init__(self):
+        self.hashes = HashIndex()
+        self._manifests = None
+        self._mirrors = None
+        self.verify_runs = 0
+        self.last_verified = None
+        self.tracker = None
+        self.trigger = None
+
+    def manifests(self):
+        if self._manifests is None:
+            import rotate_service as rs
+            self._manifests = ManifestCache(rs.MANIFEST, rs.ROT_KEY)
+        return self._manifests
+
+    def mirrors(self, directory):
+        if self._mirrors is None:
+            self._mirrors = MirrorIndex(directory)
+        return self._mirrors
+
+def task_rotate(ctx):
+    import rotate_service as rs
+    return rs.run_once(mode=rs.DEFAULT_MODE, param=1, keep_manifest=True)
+
+def after_rotate(ctx, res):
+    import rotate_service as rs
+    manifest = res.pop("manifest", None)
+    if manifest is None:
+        return
+    ctx.manifests().put(manifest)
+    # rotate acaba de hashear cada archivo: el verify siguiente solo necesita stat
+    root = generations.current(rs.ROTATED)
+    for info in manifest["entries"].values():
+        ctx.hashes.seed(generations.entry_path(rs.BASE, info["rotated"], root), info["sha512"])
+
+def task_verify(ctx):
+    import rotate_service as rs
+    manifest, ok, root = ctx.manifests().get()
+    if manifest is None:
+        return {"ok": False, "reason": "manifest not found"}
+    if not ok:
+        metrics.counter("verify_failures_total", "Verificaciones fallidas").inc(reason="hmac mismatch")
+        return {"ok": False, "reason": "hmac mismatch"}
+    ctx.verify_runs += 1
+    full = VERIFY_FULL_EVERY > 0 and ctx.verify_runs % VERIFY_FULL_EVERY == 0
+    if full:
+        ctx.hashes.clear()
+    misses0 = ctx.hashes.misses
+    bad = []
+    for rel, info in manifest["entries"].items():
+        try:
+            if ctx.hashes.sha512(generations.entry_path(rs.BASE, info["rotated"], root)) != info["sha512"]:
+                bad.append({"entry": rel, "status": "mismatch"})
+        except FileNotFoundError:
+            bad.append({"entry": rel, "status": "missing"})
+    metrics.add_files("verify", len(manifest["entries"]))
+    if bad:
+        metrics.counter("verify_failures_total", "Verificaciones fallidas").inc(reason="entry mismatch")
+    rehashed = ctx.hashes.misses - misses0
+    new_version = manifest.get("hmac") != ctx.last_verified
+    ctx.last_verified = manifest.get("hmac")
+    return {"ok": not bad, "entries": len(manifest["entries"]), "rehashed": rehashed,
+            "full": full, "mismatches": bad[:20], "changed": bool(bad or rehashed or new_version)}
+
+def task_repair(ctx):
+    mod = load_script(REPAIR_SCRIPT, "repair_script")
+    changes = mod.verify(hashes=ctx.hashes, mirrors=ctx.mirrors(mod.MIRRORS))
+    return {"ok": True, "watched": len(mod.WATCH), "changed": bool(changes)}
+
+def task_watch(ctx):
+    import rotate_service as rs
+    if ctx.tracker is None:
+        ctx.tracker = scheduler.ChangeTracker(rs.SOURCE)
+        ctx.trigger = scheduler.RotationTrigger()
+    # cambios hechos mientras el supervisor estaba parado: lo modificado después del último manifest
+    since = os.stat(rs.MANIFEST).st_mtime_ns if rs.MANIFEST.exists() else None
+    res = ctx.tracker.poll(since_ns=since)
+    res.update(ok=True, changed=res["files"] > 0, manifest_mtime=since / 1e9 if since else None)
+    return res
+
+def task_monitor(ctx):
+    mod = load_script(MONITOR_SCRIPT, "monitor_script")
+    mod.poll_once()
+    return {"ok": True}
+
+TASK_FUNCS = {"rotate": task_rotate, "verify": task_verify, "repair": task_repair, "monitor": task_monitor,
+              "watch": task_watch}
+
+# ---------- worker aislado ----------
+_child_ctx = None
+
+def _child_init(path):
+    sys.path.insert(0, path)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _run_isolated(name):
+    # el Context vive en el worker entre llamadas: sus cachés se conservan
+    global _child_ctx
+    if _child_ctx is None:
+        _child_ctx = Context()
+    return TASK_FUNCS[name](_child_ctx)
+
+class Task:
+    def __init__(self, name, policy, then=(), group=None, isolate=False, start=0.0):
+        self.name, self.policy, self.then, self.group = name, policy, tuple(then), group
+        self.isolate = isolate
+        self.pool = None
+        self.next_at = start
+        self.running = False
+        self.runs = self.failures = 0
+        self.last = None
+        self.decision = None
+
+    def call(self, ctx):
+        if not self.isolate:
+            return TASK_FUNCS[self.name](ctx)
+        if self.pool is None:
+            import multiprocessing
+            self.pool = multiprocessing.get_context("spawn").Pool(1, initializer=_child_init, initargs=(str(HERE),))
+        return self.pool.apply(_run_isolated, (self.name,))
+
+class Supervisor:
+    def __init__(self, tasks):
+        self.tasks = {t.name: t for t in tasks}
+        self.ctx = Context()
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix="task")
+
+    def trigger(self, name):
+        with self.cond:
+            if name in self.tasks:
+                self.tasks[name].next_at = 0.0
+                self.cond.notify()
+
+    def _blocked(self, task):
+        return task.running or (task.group and any(t.running for t in self.tasks.values() if t.group == task.group))
+
+    def _execute(self, task):
+        t0 = time.perf_counter()
+        res = None
+        try:
+            with metrics.cycle(task.name):
+                res = task.call(self.ctx)
+            if task.name == "rotate":
+                after_rotate(self.ctx, res)
+        except Exception as e:
+            task.failures += 1
+            res = {"ok": False, "error": "%s: %s" % (type(e).__name__, e)}
+            metrics.counter("task_failures_total", "Tareas del supervisor con excepción").inc(task=task.name)
+        res = dict(res or {}, seconds=round(time.perf_counter() - t0, 3))
+        task.runs += 1
+        task.last = res
+        print("[supervisor]", task.name, json.dumps(res, default=str), flush=True)
+        with self.cond:
+            task.running = False
+            delay, reason = task.policy.next_delay(res)
+            self._decide(task, delay, reason)
+            if task.name == "rotate" and self.ctx.trigger:
+                self.ctx.trigger.rotated(res["seconds"])
+                if res.get("ok", True) is not False:
+                    self.ctx.tracker.reset()
+            if task.name == "watch" and "rotate" in self.tasks:
+                self._decide_rotation(res)
+            for name in task.then:
+                if name in self.tasks and res.get("ok", True) is not False:
+                    self.tasks[name].next_at = 0.0
+                    self._note(self.tasks[name], 0.0, "after_" + task.name)
+            self.cond.notify()
+        self._write_status()
+
+    def _decide_rotation(self, res):
+        rot = self.tasks["rotate"]
+        if rot.running:
+            return
+        delay, reason = self.ctx.trigger.decide(res["pending_files"], res["pending_bytes"], res.get("manifest_mtime"))
+        if delay is None:
+            return
+        at = time.monotonic() + delay
+        if at < rot.next_at:
+            rot.next_at = at
+            self._note(rot, delay, reason)
+
+    def _decide(self, task, delay, reason):
+        task.next_at = time.monotonic() + delay
+        self._note(task, delay, reason)
+
+    def _note(self, task, delay, reason):
+        finite = delay != float("inf")
+        task.decision = {"at": int(time.time()), "reason": reason, "delay_s": round(delay, 1) if finite else None}
+        metrics.counter("scheduler_decisions_total", "Decisiones del planificador").inc(task=task.name, reason=reason)
+        if finite:
+            metrics.gauge("task_delay_seconds", "Espera decidida hasta la próxima ejecución").set(delay, task=task.name)
+        if task.name != "watch" or reason != "idle":
+            print("[supervisor] schedule", task.name, reason, "in %.1fs" % delay if finite else "on trigger", flush=True)
+
+    def _write_status(self):
+        if not STATUS_FILE:
+            return
+        tmp = STATUS_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.status(), f, default=str, indent=2)
+        os.replace(tmp, STATUS_FILE)
+
+    def run(self, once=False):
+        """Bucle de planificación; once=True ejecuta cada tarea (y sus encadenadas) una vez y sale."""
+        pending = set(self.tasks) if once else None
+        with self.cond:
+            if once:
+                for t in self.tasks.values():
+                    t.next_at = 0.0
+            while not self.stopping:
+                now = time.monotonic()
+                for t in self.tasks.values():
+                    if once and t.name not in pending:
+                        continue
+                    if t.next_at <= now and not self._blocked(t):
+                        t.running = True
+                        if once:
+                            pending.discard(t.name)
+                        self.executor.submit(self._execute, t)
+                if once and not pending and not any(t.running for t in self.tasks.values()):
+                    break
+                waits = [t.next_at - now for t in self.tasks.values() if not t.running]
+                self.cond.wait(timeout=min(3600.0, max(0.05, min(waits))) if waits else None)
+        self.executor.shutdown(wait=True)
+        for t in self.tasks.values():
+            if t.pool:
+                t.pool.terminate()
+
+    def stop(self, *_):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+
+    def status(self):
+        now = time.monotonic()
+        out = {}
+        for t in self.tasks.values():
+            wait = t.next_at - now
+            out[t.name] = {"runs": t.runs, "failures": t.failures, "running": t.running, "isolated": t.isolate,
+                           "next_in_s": round(max(0.0, wait), 1) if not t.running and wait != float("inf") else None,
+                           "decision": t.decision, "last": t.last}
+        return out
+
+def policies(schedule=SCHEDULE):
+    if schedule == "fixed":
+        return {"rotate": scheduler.FixedPolicy(ROT_INTERVAL), "verify": scheduler.FixedPolicy(VERIFY_INTERVAL),
+                "repair": scheduler.FixedPolicy(REPAIR_INTERVAL), "monitor": scheduler.FixedPolicy(MONITOR_INTERVAL)}
+    return {"rotate": scheduler.TriggeredPolicy(), "watch": scheduler.BackoffPolicy(WATCH_MIN, WATCH_MAX),
+            "verify": scheduler.BackoffPolicy(VERIFY_MIN, VERIFY_MAX),
+            "repair": scheduler.BackoffPolicy(REPAIR_MIN, REPAIR_MAX),
+            "monitor": scheduler.FixedPolicy(MONITOR_INTERVAL)}
+
+def build(names=TASKS, isolate=ISOLATE, schedule=SCHEDULE):
+    pol = policies(schedule)
+    names = list(names)
+    if "rotate" in names and "watch" in pol:
+        names.insert(0, "watch")
+    tasks = []
+    for name in names:
+        if name not in TASK_FUNCS:
+            raise SystemExit("unknown task: %s" % name)
+        adaptive_rotate = name == "rotate" and "watch" in pol
+        tasks.append(Task(name, pol[name],
+                          then=("verify",) if name == "rotate" else (),
+                          group="rotated" if name in ("rotate", "verify") else None,
+                          isolate=name in isolate and name != "watch",
+                          # en modo adaptativo la primera rotación la decide watch
+                          start=float("inf") if adaptive_rotate else 0.0))
+    return Supervisor(tasks)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Supervisor de rotate/verify/repair/monitor en un solo proceso")
+    ap.add_argument("--tasks", default=",".join(TASKS))
+    ap.add_argument("--isolate", default=",".join(sorted(ISOLATE)), help="tareas a ejecutar en un proceso worker")
+    ap.add_argument("--once", action="store_true", help="una pasada de cada tarea y salir")
+    ap.add_argument("--schedule", choices=("adaptive", "fixed"), default=SCHEDULE)
+    args = ap.parse_args()
+    if "rotate" in args.tasks or "verify" in args.tasks:
+        if not os.environ.get("ROT_KEY"):
+            raise SystemExit("Define ROT_KEY")
+    sup = build([t for t in args.tasks.split(",") if t], {t for t in args.isolate.split(",") if t}, args.schedule)
+    signal.signal(signal.SIGTERM, sup.stop)
+    signal.signal(signal.SIGINT, sup.stop)
+    metrics.init("supervisor")
+    print("[supervisor] schedule:", args.schedule, "tasks:",
+          ", ".join(t.name + (" (isolated)" if t.isolate else "") for t in sup.tasks.values()), flush=True)
+    sup.run(once=args.once)
+    if args.once:
+        print(json.dumps(sup.status(), default=str, indent=2))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# test_merkle_manifest.py - re-firma incremental de merkle_manifest.py frente a una reconstrucción completa
+# Uso: python3 -m pytest tests/ | python3 -m unittest discover tests
+import sys, json, unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import merkle_manifest as mm
+
+KEY = "test-key"
+
+def info(n):
+    return {"rotated": "rotated/%s" % n, "sha512": "%0128x" % n}
+
+class IncrementalTest(unittest.TestCase):
+    def check(self, before: dict, after: dict):
+        prev = mm.from_manifest({"entries": before, "timestamp": 1}, KEY)
+        prev = json.loads(json.dumps(prev))  # como se lee de disco
+        inc = mm.from_manifest({"entries": after, "timestamp": 2}, KEY, prev)
+        full = mm.from_manifest({"entries": after, "timestamp": 2}, KEY)
+        self.assertEqual(inc["root"], full["root"])
+        self.assertEqual(dict(mm.iter_entries(inc["tree"])), after)
+        self.assertTrue(mm.verify_tree(inc, KEY))
+        for rel in after:
+            self.assertTrue(mm.verify_proof(mm.prove(inc, rel, {}), KEY), rel)
+        return inc
+
+    def test_nested_dir_becomes_file(self):
+        self.check({"a/b/c": info(1), "x": info(2)}, {"a": info(3), "x": info(2)})
+
+    def test_dir_becomes_file(self):
+        self.check({"a/b": info(1), "a/c": info(2)}, {"a": info(3)})
+
+    def test_file_becomes_dir(self):
+        self.check({"a": info(1), "x": info(2)}, {"a/b/c": info(3), "x": info(2)})
+
+    def test_file_becomes_dir_next_to_siblings(self):
+        self.check({"d/a": info(1), "d/b": info(2)}, {"d/a/inner": info(3), "d/b": info(2)})
+
+    def test_unchanged_entries_keep_root(self):
+        entries = {"d%d/f%d" % (i % 3, i): info(i) for i in range(20)}
+        prev = mm.from_manifest({"entries": entries}, KEY)
+        inc = self.check(entries, entries)
+        self.assertEqual(inc["root"], prev["root"])
+        self.assertEqual(mm.diff(prev, inc), {"added": [], "removed": [], "changed": []})
+
+    def test_tampered_previous_is_rebuilt(self):
+        entries = {"a/b": info(1), "c": info(2)}
+        prev = json.loads(json.dumps(mm.from_manifest({"entries": entries}, KEY)))
+        prev["tree"]["c"]["a"]["c"]["b"]["e"]["sha512"] = "f" * 128
+        inc = mm.from_manifest({"entries": entries}, KEY, prev)
+        self.assertEqual(inc["root"], mm.from_manifest({"entries": entries}, KEY)["root"])
+
+class ProofCacheTest(unittest.TestCase):
+    def test_cached_levels_match_audit_path(self):
+        for n in range(1, 40):
+            leaves = [mm._h(b"%d" % i) for i in range(n)]
+            levels = mm.tree_levels(leaves)
+            self.assertEqual(levels[-1][0], mm.mth(leaves))
+            for m in range(n):
+                self.assertEqual(mm.levels_path(m, levels), mm.audit_path(m, leaves))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# test_repo_sync.py - repo_sync.py contra repos bare locales (sin red)
+# Uso: python3 -m pytest tests/ | python3 -m unittest discover tests
+import os, sys, json, shutil, tempfile, unittest, subprocess
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent.parent
+GIT_ENV = {"GIT_AUTHOR_NAME": "test", "GIT_AUTHOR_EMAIL": "test@example.com",
+           "GIT_COMMITTER_NAME": "test", "GIT_COMMITTER_EMAIL": "test@example.com",
+           "GIT_CONFIG_GLOBAL": os.devnull, "GIT_CONFIG_NOSYSTEM": "1"}
+
+def git(*args, cwd=None):
+    r = subprocess.run(["git", *args], cwd=cwd, env=dict(os.environ, **GIT_ENV), capture_output=True, text=True)
+    if r.returncode != 0:
+        raise AssertionError("git %s: %s" % (" ".join(args), r.stderr))
+    return r.stdout.strip()
+
+class RepoSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="repo_sync_test_"))
+        self.mirrors = self.tmp / "mirrors"
+        self.bare = {}
+        for name in ("alpha", "beta"):
+            bare = self.tmp / "remotes" / (name + ".git")
+            git("init", "-q", "--bare", "-b", "main", str(bare))
+            work = self.tmp / "work" / name
+            git("clone", "-q", str(bare), str(work))
+            git("checkout", "-q", "-b", "main", cwd=work)
+            self.bare[name] = bare
+            self.commit(name, "v1")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def commit(self, name, text):
+        work = self.tmp / "work" / name
+        (work / "file.txt").write_text(text)
+        git("add", "file.txt", cwd=work)
+        git("commit", "-q", "-m", text, cwd=work)
+        git("push", "-q", "origin", "main", cwd=work)
+        return git("rev-parse", "HEAD", cwd=work)
+
+    def sync(self, *args):
+        env = dict(os.environ, **GIT_ENV)
+        env.update(SYNC_BASE_DIR=str(self.mirrors), SYNC_BRANCH="main", SYNC_WORKERS="2",
+                   SYNC_REPOS=",".join(str(self.bare[n]) for n in ("alpha", "beta")))
+        r = subprocess.run([sys.executable, str(HERE / "repo_sync.py"), *args], env=env,
+                           capture_output=True, text=True, timeout=120)
+        lines = [json.loads(l) for l in r.stdout.splitlines() if l.startswith("{")]
+        return r.returncode, {Path(x["repo"]).stem: x for x in lines if "repo" in x}
+
+    def head(self, name):
+        return git("rev-parse", "HEAD", cwd=self.mirrors / name)
+
+    def test_clone_then_skip_unchanged_and_fetch_changed(self):
+        rc, res = self.sync()
+        self.assertEqual(rc, 0)
+        self.assertEqual({n: r["action"] for n, r in res.items()}, {"alpha": "cloned", "beta": "cloned"})
+
+        sha = self.commit("beta", "v2")
+        rc, res = self.sync()
+        self.assertEqual(rc, 0)
+        self.assertEqual(res["alpha"]["action"], "unchanged")
+        self.assertEqual(res["beta"]["action"], "updated")
+        self.assertEqual(res["beta"]["sha"], sha)
+        self.assertEqual(self.head("beta"), sha)
+        self.assertEqual((self.mirrors / "beta" / "file.txt").read_text(), "v2")
+
+    def test_only_syncs_selected_repo(self):
+        self.sync()
+        before_alpha = self.head("alpha")
+        self.commit("alpha", "v2")
+        sha = self.commit("beta", "v2")
+        rc, res = self.sync("--only", "beta")
+        self.assertEqual(rc, 0)
+        self.assertEqual(list(res), ["beta"])
+        self.assertEqual(res["beta"]["action"], "updated")
+        self.assertEqual(self.head("beta"), sha)
+        self.assertEqual(self.head("alpha"), before_alpha)  # cambió en el remoto, pero no se pidió
+
+    def test_only_unknown_repo_is_skipped(self):
+        rc, res = self.sync("--only", "gamma")
+        self.assertEqual(rc, 0)
+        self.assertEqual(res, {})
+        self.assertFalse(self.mirrors.exists())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,123 +2,217 @@
 """
 unrotate.py
 - Lee rotated/manifest.json
-- Verifica HMAC (ROT_KEY) y aplica el inverso del modo usado
+- Verifica HMAC (ROT_KEY) y aplica el inverso del modo usado (tablas de rotation_engine.py)
+- Entradas marcadas "binary" (o que no son UTF-8) se copian / des-rotan como bytes
 - Crea unrotated_out/ con los archivos originales
+- Importable: load_manifest() / unrotate() sin efectos al importar (Server.py y Desroyado.py
+  lo llaman en proceso); como script, main()
+- Restauración selectiva (--include GLOB / --prefix DIR) y en paralelo (UNROTATE_WORKERS, pool de
+  threads o --processes); las salidas cuyo sha512 ya es el src_sha512 del manifest no se reescriben
+  y cada archivo se escribe en un temporal y se publica con os.replace
+Uso: unrotate.py [--include GLOB]... [--prefix DIR]... [--workers N] [--processes] [--force] [--out DIR] [--quiet]
 """
-import os, json, hmac, hashlib, shutil
+import os, sys, json, time, hmac, hashlib
 from pathlib import Path
 
 BASE = Path(__file__).parent.parent.resolve()
 ROTATED = BASE / "rotated"
 MANIFEST = ROTATED / "manifest.json"
+MANIFEST_BIN = ROTATED / "manifest.bin"
+USE_BIN = os.environ.get("ROT_MANIFEST_BIN","false").lower() in ("1","true","yes")
 OUT = BASE / "unrotated_out"
 ROT_KEY = os.environ.get("ROT_KEY")
-if not ROT_KEY:
-    raise SystemExit("Define ROT_KEY in environment")
+UNROTATE_WORKERS = int(os.environ.get("UNROTATE_WORKERS", min(8, os.cpu_count() or 1)))
+UNROTATE_PROCESSES = os.environ.get("UNROTATE_PROCESSES","false").lower() in ("1","true","yes")
+UNROTATE_PROGRESS = float(os.environ.get("UNROTATE_PROGRESS", 2))  # segundos entre líneas de progreso
 
-# charset / emojis must align with rotate_service.py
-import string, random
-BASE_CHARS = list((string.ascii_letters + string.digits + string.punctuation + " \n\t"))
-EMOJIS = ["😀","😁","😂","😃","😄","😅","😆","😉","😊","🤖","🔥","✨","🌐","🔒"]
-CHARSET = []
-for c in BASE_CHARS + EMOJIS:
-    if c not in CHARSET:
-        CHARSET.append(c)
+# charset / tablas compartidas con rotate_service.py
+import rotation_engine as engine, generations
+CHARSET = list(engine.CHARSETS["service"])
 
-def hmac_check(manifest_dict):
+def hmac_check(manifest_dict, key=None):
+    key = key or ROT_KEY
     h = manifest_dict.pop("hmac", None)
     b = json.dumps(manifest_dict, sort_keys=True).encode('utf-8')
-    calc = hmac.new(ROT_KEY.encode('utf-8'), b, hashlib.sha512).hexdigest()
+    calc = hmac.new(key.encode('utf-8'), b, hashlib.sha512).hexdigest()
     manifest_dict["hmac"] = h
     return calc == h
 
-def build_shift_map(n):
-    L = len(CHARSET)
-    mapping = {CHARSET[(i + n) % L]: CHARSET[i] for i in range(L)}
-    return mapping
-
 def invert_line_rotate(text, lines_up):
     # inverse of rotating lines up by n is rotating down by n
-    lines = text.splitlines(True)
-    if not lines: return text
-    n = (-lines_up) % len(lines)
-    return ''.join(lines[n:] + lines[:n])
-
-def matrix_rotate_90_ccw(text):
-    # inverse of clockwise rotate is counterclockwise
-    lines = [list(line.rstrip('\n')) for line in text.splitlines()]
-    if not lines: return text
-    maxw = max(len(r) for r in lines)
-    for r in lines:
-        while len(r) < maxw:
-            r.append(' ')
-    rotated = list(zip(*lines))[::-1]
-    return '\n'.join(''.join(row).rstrip() for row in rotated) + '\n'
+    return engine.line_rotate(text, -lines_up)
 
-def bytes_rotr(b: bytes, k: int):
-    out = bytearray()
-    k = k % 8
-    for byte in b:
-        out.append((byte >> k) | ((byte << (8 - k)) & 0xFF))
-    return bytes(out)
+def unrotate_entry(rotated_path, out_path, mode, param, seed=None, binary=None):
+    """Aplica el inverso de `mode` y devuelve el sha512 de lo escrito;
+    binary=None (manifests antiguos) lo deduce del contenido."""
+    if mode in ("right", "left", "perm"):
+        if binary:
+            return engine.bytes_stream(rotated_path, out_path)
+        if mode == "perm":
+            inv = engine.perm_tables(seed)[1]
+        else:
+            inv = engine.shift_tables(param if mode == "right" else -param)[1]
+        return engine.rotate_path(rotated_path, out_path, inv)[0]
+    if binary is None:
+        binary = not engine.is_text(rotated_path)
+    if mode in ("binary_left", "binary_right"):
+        # solo los binarios se rotaron por bits; el texto se copió
+        table = None
+        if binary:
+            table = engine.byte_tables(param)[1 if mode == "binary_left" else 0]
+        return engine.bytes_stream(rotated_path, out_path, table)
+    if binary or mode not in ("up", "down", "matrix_cw", "matrix_ccw"):
+        return engine.bytes_stream(rotated_path, out_path)
+    txt = engine.read_text(rotated_path)
+    if mode == "up":
+        original = invert_line_rotate(txt, param)
+    elif mode == "down":
+        original = invert_line_rotate(txt, -param)
+    elif mode == "matrix_cw":
+        # inverse of clockwise rotate is counterclockwise
+        original = engine.matrix_rotate_90(txt, clockwise=False)
+    else:
+        original = engine.matrix_rotate_90(txt, clockwise=True)
+    return engine.write_text(out_path, original)
 
-def bytes_rotl(b: bytes, k: int):
-    out = bytearray()
-    k = k % 8
-    for byte in b:
-        out.append(((byte << k) & 0xFF) | (byte >> (8 - k)))
-    return bytes(out)
+def restore_one(job):
+    """Restaura una entrada de forma atómica; devuelve (rel, estado, bytes, error).
+    Estados: restored, skipped (la salida ya es el original), mismatch (el resultado no es el
+    src_sha512 registrado; p. ej. modos matrix), copied (fallback) y error."""
+    rel, rotated_path, out_path, mode, param, seed, binary, src_sha, skip = job
+    out_path = Path(out_path)
+    tmp = out_path.with_name(".%s.%d.tmp" % (out_path.name, os.getpid()))
+    try:
+        if skip and src_sha and out_path.is_file() and engine.sha512_file(out_path) == src_sha:
+            return rel, "skipped", 0, None
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            digest = unrotate_entry(rotated_path, tmp, mode, param, seed, binary)
+            state = "restored" if not src_sha or digest == src_sha else "mismatch"
+        except Exception:
+            import shutil
+            shutil.copy2(rotated_path, tmp)
+            state = "copied"
+        os.replace(tmp, out_path)
+        return rel, state, out_path.stat().st_size, None
+    except Exception as e:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return rel, "error", 0, str(e)
 
-if not MANIFEST.exists():
-    print("manifest not found:", MANIFEST); exit(1)
+def select(entries, include=None, prefix=None):
+    """(rel, info) que pasan los filtros: algún glob de include (fnmatch sobre la ruta relativa)
+    y algún prefijo de subárbol; sin filtros, todas."""
+    import fnmatch
+    prefixes = [p.strip("/") for p in prefix or []]
+    for rel, info in entries.items():
+        if prefixes and not any(rel == p or rel.startswith(p + "/") for p in prefixes):
+            continue
+        if include and not any(fnmatch.fnmatchcase(rel, g) for g in include):
+            continue
+        yield rel, info
 
-m = json.loads(MANIFEST.read_text())
-if not hmac_check(m.copy()):
-    print("manifest HMAC invalid - abort"); exit(2)
+def load_manifest(key=None, gen_root=None):
+    """Manifest verificado (dict o BinManifest), leído desde gen_root si se indica (la generación
+    con la que luego se resuelven sus entradas, ver unrotate()).
+    FileNotFoundError si no existe; ValueError si el HMAC no cuadra."""
+    key = key or ROT_KEY
+    if not key:
+        raise ValueError("Define ROT_KEY in environment")
+    manifest_bin_path = Path(gen_root) / MANIFEST_BIN.name if gen_root else MANIFEST_BIN
+    manifest_path = Path(gen_root) / MANIFEST.name if gen_root else MANIFEST
+    if USE_BIN and manifest_bin_path.exists():
+        # lectura perezosa: solo se decodifica cada entrada al recorrerla
+        import manifest_bin
+        m = manifest_bin.BinManifest(manifest_bin_path)
+        if not m.verify(key):
+            raise ValueError("manifest.bin HMAC invalid - abort")
+        return m
+    if not manifest_path.exists():
+        raise FileNotFoundError(str(MANIFEST))
+    m = json.loads(manifest_path.read_text())
+    if not hmac_check(m.copy(), key):
+        raise ValueError("manifest HMAC invalid - abort")
+    return m
 
-mode = m.get("mode","right")
-param = int(m.get("param",1))
-OUT.mkdir(parents=True, exist_ok=True)
+def unrotate(m=None, out: Path = OUT, verbose=True, include=None, prefix=None, workers=None,
+             processes=None, skip_identical=True, gen_root=None):
+    """Restaura en out las entradas de m (por defecto el manifest verificado) que pasan los filtros.
+    gen_root: generación de m (generations.manifest_root); por defecto la publicada ahora.
+    Devuelve {selected, restored, skipped, mismatch, copied, error, bytes, seconds, mb_s}."""
+    if gen_root is None:
+        gen_root = generations.manifest_root(MANIFEST)
+    if m is None:
+        m = load_manifest(gen_root=gen_root)
+    mode = m.get("mode","right")
+    param = int(m.get("param",1))
+    seed = m.get("seed")
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    jobs = [(rel, str(generations.entry_path(BASE, info["rotated"], gen_root)), str(out / rel), mode, param, seed, info.get("binary"),
+             info.get("src_sha512"), skip_identical) for rel, info in select(m["entries"], include, prefix)]
+    workers = workers or UNROTATE_WORKERS
+    processes = UNROTATE_PROCESSES if processes is None else processes
+    stats = {"selected": len(jobs), "restored": 0, "skipped": 0, "mismatch": 0, "copied": 0, "error": 0, "bytes": 0}
+    t0 = last = time.time()
+    done = 0
+    def report(res):
+        nonlocal done, last
+        rel, state, nbytes, err = res
+        done += 1
+        stats[state] += 1
+        stats["bytes"] += nbytes
+        if verbose and state != "skipped":
+            print(state, rel, *([err] if err else []))
+        now = time.time()
+        if verbose and now - last >= UNROTATE_PROGRESS:
+            last = now
+            print("[unrotate] %d/%d files, %.1f MB, %.1f MB/s" % (
+                done, len(jobs), stats["bytes"] / 1e6, stats["bytes"] / 1e6 / (now - t0)), file=sys.stderr)
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            report(restore_one(job))
+    else:
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+        pool_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool_cls(max_workers=workers) as ex:
+            for res in ex.map(restore_one, jobs, chunksize=16 if processes else 1):
+                report(res)
+    stats["seconds"] = round(time.time() - t0, 3)
+    stats["mb_s"] = round(stats["bytes"] / 1e6 / stats["seconds"], 2) if stats["seconds"] else 0.0
+    return stats
 
-for rel, info in m["entries"].items():
-    rotated_path = BASE / info["rotated"]
-    out_path = OUT / rel
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Restaura unrotated_out/ desde el manifest verificado")
+    ap.add_argument("--include", action="append", help="glob sobre la ruta relativa (repetible)")
+    ap.add_argument("--prefix", action="append", help="subárbol a restaurar (repetible)")
+    ap.add_argument("--workers", type=int, default=UNROTATE_WORKERS)
+    ap.add_argument("--processes", action="store_true", default=UNROTATE_PROCESSES,
+                    help="pool de procesos en vez de threads")
+    ap.add_argument("--force", action="store_true", help="reescribir aunque la salida ya sea el original")
+    ap.add_argument("--out", default=str(OUT))
+    ap.add_argument("--quiet", action="store_true", help="sin una línea por archivo")
+    args = ap.parse_args(argv)
+    if not ROT_KEY:
+        raise SystemExit("Define ROT_KEY in environment")
+    gen_root = generations.manifest_root(MANIFEST)
     try:
-        # assume text
-        txt = rotated_path.read_text(encoding='utf-8', errors='ignore')
-        if mode == "right":
-            # inverse is left shift by same param
-            mapping = build_shift_map(-param)
-            original = ''.join(mapping.get(ch, ch) for ch in txt)
-            out_path.write_text(original, encoding='utf-8')
-        elif mode == "left":
-            mapping = build_shift_map(param)
-            original = ''.join(mapping.get(ch, ch) for ch in txt)
-            out_path.write_text(original, encoding='utf-8')
-        elif mode == "up":
-            original = invert_line_rotate(txt, param)
-            out_path.write_text(original, encoding='utf-8')
-        elif mode == "down":
-            original = invert_line_rotate(txt, -param)
-            out_path.write_text(original, encoding='utf-8')
-        elif mode == "matrix_cw":
-            original = matrix_rotate_90_ccw(txt)
-            out_path.write_text(original, encoding='utf-8')
-        elif mode == "matrix_ccw":
-            # inverse of ccw is cw
-            # reuse rotate_service algorithm? simple approach: rotate cw (not implemented here)
-            out_path.write_text(txt, encoding='utf-8')
-        elif mode == "binary_left":
-            b = rotated_path.read_bytes()
-            out_path.write_bytes(bytes_rotr(b, param))
-        elif mode == "binary_right":
-            b = rotated_path.read_bytes()
-            out_path.write_bytes(bytes_rotl(b, param))
-        else:
-            # unknown: copy
-            shutil.copy2(rotated_path, out_path)
-    except Exception:
-        shutil.copy2(rotated_path, out_path)
-    print("restored", rel)
-print("unrotate complete -> out dir:", OUT)
+        m = load_manifest(gen_root=gen_root)
+    except FileNotFoundError:
+        print("manifest not found:", MANIFEST)
+        return 1
+    except ValueError as e:
+        print(e)
+        return 2
+    stats = unrotate(m, Path(args.out), verbose=not args.quiet, include=args.include, prefix=args.prefix,
+                     workers=args.workers, processes=args.processes, skip_identical=not args.force,
+                     gen_root=gen_root)
+    print("unrotate complete -> out dir:", args.out)
+    print(json.dumps(stats))
+    return 1 if stats["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())